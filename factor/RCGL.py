@@ -14,6 +14,7 @@ sys.path.append('..')
 import func.process as pro
 import func.net as net
 import func.draw as draw
+import func.store as store
 
 
 class RCGL(nn.Module):
@@ -156,9 +157,11 @@ model = RCGL("gcn", "ts_un", 1, device, num).to(device)
 criterion = torch.nn.MSELoss().to(device)
 optimizer = torch.optim.Adam(model.parameters(), lr=lr)
 
-train_pred, train_true, test_pred, test_true = [], [], [], []
+metric_train = net.StreamMetric(device, len(train_loader.dataset))
+metric_test = net.StreamMetric(device, len(test_loader.dataset))
 for epoch in range(epochs):
     loss_train_all, loss_test_all = 0, 0
+    metric_train.reset(), metric_test.reset()
     for item_train, (x_train, y_train, _) in enumerate(train_loader):
         x_train, y_train = x_train.to(device), y_train.to(device)
 
@@ -169,14 +172,7 @@ for epoch in range(epochs):
         optimizer.step()
         loss_train_all = loss_train_all + loss_train.item()
 
-        train_pred_one = output_train.detach().cpu().numpy()
-        train_true_one = y_train.detach().cpu().numpy()
-        if item_train == 0:
-            train_pred = train_pred_one
-            train_true = train_true_one
-        else:
-            train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-            train_true = np.concatenate((train_true, train_true_one), axis=0)
+        metric_train.update(y_train, output_train)
 
     for item_test, (x_test, y_test, _) in enumerate(test_loader):
         x_test, y_test = x_test.to(device), y_test.to(device)
@@ -185,47 +181,22 @@ for epoch in range(epochs):
         loss_test = criterion(output_test, y_test)
         loss_test_all = loss_test_all + loss_test.item()
 
-        test_pred_one = output_test.detach().cpu().numpy()
-        test_true_one = y_test.detach().cpu().numpy()
-        if item_test == 0:
-            test_pred = test_pred_one
-            test_true = test_true_one
-        else:
-            test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-            test_true = np.concatenate((test_true, test_true_one), axis=0)
-
-    rmse_train = net.cal_rmse_one_arr(train_true, train_pred)
-    rmse_test = net.cal_rmse_one_arr(test_true, test_pred)
-    r2_train = net.cal_r2_one_arr(train_true, train_pred)
-    r2_test = net.cal_r2_one_arr(test_true, test_pred)
-    # r2_train = r2_score(train_true, train_pred)
-    # r2_test = r2_score(test_true, test_pred)
+        metric_test.update(y_test, output_test)
+
+    rmse_train, r2_train = metric_train.result()
+    rmse_test, r2_test = metric_test.result()
     print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.8f}  R2_Test: {:.8f}".
           format(epoch, rmse_train, rmse_test, r2_train, r2_test))
 
-train_error = train_pred - train_true
-test_error = test_pred - test_true
-
-e_m_train, e_m_test = np.mean(train_error), np.mean(test_error)
-e_std_train, e_std_test = np.std(train_error), np.std(test_error)
+e_m_train, e_std_train = metric_train.error()
+e_m_test, e_std_test = metric_test.error()
 
+# one run per num in the results store of save_ad, all num exported as csv
 if save_txt:
-    info_txt_ad = osp.join(save_ad, "RCGL_result_{}_{}.txt".format(name, m))
-    info_df_ad = osp.join(save_ad, "RCGL_result_{}_{}.csv".format(name, m))
-    f = open(info_txt_ad, 'a')
-    if osp.getsize(info_txt_ad) == 0:
-        f.write("num r2 rmse e_m e_std sm_scale epoch name m_train m_test\n")
-    f.write(str(num) + "  ")
-    f.write(str(round(r2_test, 4)) + "  ")
-    f.write(str(round(rmse_test, 4)) + "  ")
-    f.write(str(round(e_m_test, 4)) + "  ")
-    f.write(str(round(e_std_test, 4)) + "  ")
-    f.write(str(sm_scale) + "  ")
-    f.write(str(epochs) + "  ")
-    f.write(str(name) + "  ")
-    f.write(str(m_train) + "  ")
-    f.write(str(m_test) + "  ")
-
-    f.write("\n")
-    f.close()
+    db_ad = store.get_db(save_ad)
+    store.save_run(db_ad, "RCGL", sm_scale, name, m_train, m_test, {"num": num, "epochs": epochs},
+                   {"r2_test": r2_test, "rmse_test": rmse_test, "e_mean": e_m_test, "e_std": e_std_test})
+    info_df = store.pivot_runs(db_ad, "num", ["RCGL"], ("r2_test", "rmse_test", "e_mean", "e_std"),
+                               sm_scale=sm_scale, name=name, m_train=m_train)
+    info_df.to_csv(osp.join(save_ad, "RCGL_result_{}_{}_{}.csv".format(sm_scale, name, m)))
 
@@ -13,6 +13,7 @@ sys.path.append('..')
 import func.process as pro
 import func.net as net
 import func.draw as draw
+import func.store as store
 
 
 device = "cuda:1" if torch.cuda.is_available() else "cpu"
@@ -72,9 +73,11 @@ criterion = torch.nn.MSELoss().to(device)
 optimizer = torch.optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)
 
 train_loss, test_loss = [], []
-train_pred, train_true, test_pred, test_true = [], [], [], []
+metric_train = net.StreamMetric(device, len(train_loader.dataset))
+metric_test = net.StreamMetric(device, len(test_loader.dataset))
 for epoch in range(epochs):
     loss_train_all, loss_test_all = 0, 0
+    metric_train.reset(), metric_test.reset()
     for item_train, (x_train, y_train, _) in enumerate(train_loader):
         x_train, y_train = x_train.to(device), y_train.to(device)
 
@@ -85,14 +88,7 @@ for epoch in range(epochs):
         optimizer.step()
         loss_train_all = loss_train_all + loss_train.item()
 
-        train_pred_one = output_train.detach().cpu().numpy()
-        train_true_one = y_train.detach().cpu().numpy()
-        if item_train == 0:
-            train_pred = train_pred_one
-            train_true = train_true_one
-        else:
-            train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-            train_true = np.concatenate((train_true, train_true_one), axis=0)
+        metric_train.update(y_train, output_train)
 
     for item_test, (x_test, y_test, _) in enumerate(test_loader):
         x_test, y_test = x_test.to(device), y_test.to(device)
@@ -101,26 +97,18 @@ for epoch in range(epochs):
         loss_test = criterion(output_test, y_test)
         loss_test_all = loss_test_all + loss_test.item()
 
-        test_pred_one = output_test.detach().cpu().numpy()
-        test_true_one = y_test.detach().cpu().numpy()
-        if item_test == 0:
-            test_pred = test_pred_one
-            test_true = test_true_one
-        else:
-            test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-            test_true = np.concatenate((test_true, test_true_one), axis=0)
+        metric_test.update(y_test, output_test)
 
     train_loss.append(loss_train_all / len(train_loader))
     test_loss.append(loss_test_all / len(test_loader))
 
-    rmse_train = net.cal_rmse_one_arr(train_true, train_pred)
+    rmse_train, r2_train = metric_train.result()
     if np.isnan(rmse_train):
         break
-    rmse_test = net.cal_rmse_one_arr(test_true, test_pred)
-    r2_train = net.cal_r2_one_arr(train_true, train_pred)
-    r2_test = net.cal_r2_one_arr(test_true, test_pred)
-    e_m_train, e_std_train = net.error_metric(train_true, train_pred)
-    e_m_test, e_std_test = net.error_metric(test_true, test_pred)
+    rmse_test, r2_test = metric_test.result()
+    e_m_train, e_std_train = metric_train.error()
+    e_m_test, e_std_test = metric_test.error()
+    e_m_train, e_m_test = -e_m_train, -e_m_test                # true - pred, as net.error_metric
     print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.4f}  R2_Test: {:.4f}  Me_Train: {:.4f}"
           "  Me_Test: {:.4f}  St_Train: {:.4f}  St_Test: {:.4f}".
           format(epoch, rmse_train, rmse_test, r2_train, r2_test, e_m_train, e_m_test, e_std_train, e_std_test))
@@ -130,26 +118,16 @@ if save_np:
     np.save(osp.join(save_ad, "loss_train_{}_{}.npy".format(gnn_style, adm_style)), train_loss)
     np.save(osp.join(save_ad, "loss_test_{}_{}.npy".format(gnn_style, adm_style)), test_loss)
 
+# one run per (gnn_style, adm_style, k) in the results store of save_ad, all k exported as csv
 if save_txt:
-    info_txt_ad = osp.join(save_ad, "adm_result.txt")
-    info_df_ad = osp.join(save_ad, "adm_result.csv")
-    f = open(info_txt_ad, 'a')
-    if osp.getsize(info_txt_ad) == 0:
-        f.write("gnn_style adm_style k r2 rmse e_mean e_std sm_scale m_train m_test name\n")
-    f.write(str(gnn_style) + "  ")
-    f.write(str(adm_style) + "  ")
-    f.write(str(k) + "  ")
-    f.write(str(round(r2_test, 4)) + "  ")
-    f.write(str(round(rmse_test, 4)) + "  ")
-    f.write(str(round(e_m_test, 4)) + "  ")
-    f.write(str(round(e_std_test, 4)) + "  ")
-    f.write(str(sm_scale) + "  ")
-    f.write(str(m_train) + "  ")
-    f.write(str(m_test) + "  ")
-    f.write(str(name) + "  ")
-
-    f.write("\n")
-    f.close()
+    db_ad = store.get_db(save_ad)
+    store.save_run(db_ad, "EQG", sm_scale, name, m_train, m_test,
+                   {"gnn_style": gnn_style, "adm_style": adm_style, "k": k, "epochs": epochs},
+                   {"r2_test": r2_test, "rmse_test": rmse_test, "e_mean": e_m_test, "e_std": e_std_test})
+    info_df = store.pivot_runs(db_ad, "k", ["EQG"], ("r2_test", "rmse_test", "e_mean", "e_std"),
+                               sm_scale=sm_scale, name=name, m_train=m_train, gnn_style=gnn_style,
+                               adm_style=adm_style)
+    info_df.to_csv(osp.join(save_ad, "adm_result_{}_{}_{}_{}.csv".format(gnn_style, adm_style, sm_scale, m)))
 
 print()
 plt.show()
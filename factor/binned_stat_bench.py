@@ -0,0 +1,89 @@
+"""
+Check of the vectorized binned statistics (output.binned_stat, draw.error_fea_mean) against the former greedy
+implementation of draw.error_fea_mean, on random features and on features tied with the bin edges
+mean, std and count of every non-empty bin must be the same, the time of both is printed
+"""
+import numpy as np
+import time
+import sys
+sys.path.append('..')
+import func.output as out
+import func.draw as draw
+
+
+# the former implementation of draw.error_fea_mean (values deleted from the head of sorted lists), kept here for
+# comparison, std and count of each bin are recorded as well
+def error_fea_mean_greedy(error_, fea_, bins=60):
+    idx_sort = np.argsort(fea_)
+    error, fea = error_[idx_sort].tolist(), fea_[idx_sort].tolist()
+    fea_min, fea_max = np.min(fea_), np.max(fea_)
+    fea_bins = np.linspace(fea_min, fea_max, bins)
+    error_mean, error_std, count, fea_mean = [], [], [], []
+    for i in range(bins - 1):
+        left, right = fea_bins[i], fea_bins[i + 1]
+        e_in = []
+        while len(error) != 0:
+            error_j, fea_j = error[0], fea[0]
+            if (fea_j >= left) & (fea_j <= right):
+                e_in.append(error_j)
+                del error[0]
+                del fea[0]
+            else:
+                break
+        e_in = np.array(e_in)
+        if e_in.shape[0] == 0:
+            continue
+        else:
+            error_mean.append(np.mean(e_in))
+            error_std.append(np.std(e_in))
+            count.append(e_in.shape[0])
+            fea_mean.append((left + right) / 2)
+    return np.array(error_mean), np.array(error_std), np.array(count), np.array(fea_mean)
+
+
+def get_data(style, num, bins):
+    error = np.random.normal(0, 0.3, num)
+    if style == "random":
+        fea = np.random.uniform(-10, 40, num)
+    elif style == "integer":                        # integer features, all on the bin edges
+        fea = np.random.randint(0, bins, num).astype(float)
+    elif style == "edge":                           # features drawn from the (float) bin edges
+        edges = np.linspace(-1.3, 7.9, bins)
+        fea = edges[np.random.randint(0, bins, num)]
+        fea[:2] = edges[0], edges[-1]
+    elif style == "gap":                            # empty bins in the middle
+        fea = np.concatenate((np.random.uniform(0, 1, num // 2), np.random.uniform(9, 10, num - num // 2)))
+    else:
+        raise TypeError("Unknown type of data style!")
+    return error, fea
+
+
+nums = [1000, 20000, 100000]
+bins = 60                                          # number of bin edges, as draw.error_fea_mean
+styles = ["random", "integer", "edge", "gap"]
+
+np.random.seed(100)
+for style in styles:
+    for num in nums:
+        error, fea = get_data(style, num, bins)
+
+        t_begin = time.time()
+        mean_old, std_old, count_old, mid_old = error_fea_mean_greedy(error, fea, bins)
+        t_old = time.time() - t_begin
+
+        t_begin = time.time()
+        stat = out.binned_stat(error, fea, bins - 1)
+        t_new = time.time() - t_begin
+        stat = stat[stat["count"] > 0]
+        mean_new, mid_new = draw.error_fea_mean(error, fea, bins)
+
+        assert np.array_equal(stat["count"].values, count_old), "count differs ({}, {})".format(style, num)
+        assert np.allclose(stat["mean"].values, mean_old, rtol=1e-10, atol=1e-12), "mean differs ({}, {})".format(
+            style, num)
+        assert np.allclose(stat["std"].values, std_old, rtol=1e-10, atol=1e-12), "std differs ({}, {})".format(
+            style, num)
+        assert np.allclose(stat["mid"].values, mid_old), "mid differs ({}, {})".format(style, num)
+        assert np.allclose(mean_new, mean_old, rtol=1e-10, atol=1e-12) and np.allclose(mid_new, mid_old)
+        print("{:>8} n = {:>6}: {} bins, greedy {:.4f}s, binned_stat {:.4f}s, {:.1f}x".format(
+            style, num, count_old.shape[0], t_old, t_new, t_old / max(t_new, 1e-9)))
+print("mean, std and count are the same")
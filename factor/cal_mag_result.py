@@ -1,11 +1,13 @@
 """
 calculate the estimated results of operation, for all models
+the latest run of each model is read from the results store (func/store.py)
 """
 import numpy as np
 import os.path as osp
 import sys
 sys.path.append("..")
 import func.net as net
+import func.output as out
 
 
 def ran(true, pred, v_min, v_max, style):
@@ -37,28 +39,23 @@ save_fig = True
 read and calculate estimated results
 """
 # MagInfoNet
-pred_MaI = np.load(osp.join(re_ad, "MagInf", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_MaI = np.load(osp.join(re_ad, "MagInf", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_MaI, true_MaI, _, _ = out.read_npy(osp.join(re_ad, "MagInf"), sm_scale, name, m_train, m_test)
 error_MaI = pred_MaI - true_MaI
 
 # EQGraphNet
-pred_EQG = np.load(osp.join(re_ad, "EQGraphNet", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_EQG = np.load(osp.join(re_ad, "EQGraphNet", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_EQG, true_EQG, _, _ = out.read_npy(osp.join(re_ad, "EQGraphNet"), sm_scale, name, m_train, m_test)
 error_EQG = pred_EQG - true_EQG
 
 # MagNet
-pred_Mag = np.load(osp.join(re_ad, "MagNet", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_Mag = np.load(osp.join(re_ad, "MagNet", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_Mag, true_Mag, _, _ = out.read_npy(osp.join(re_ad, "MagNet"), sm_scale, name, m_train, m_test)
 error_Mag = pred_Mag - true_Mag
 
 # CREIME
-pred_CRE = np.load(osp.join(re_ad, "CREIME", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_CRE = np.load(osp.join(re_ad, "CREIME", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_CRE, true_CRE, _, _ = out.read_npy(osp.join(re_ad, "CREIME"), sm_scale, name, m_train, m_test)
 error_CRE = pred_CRE - true_CRE
 
 # ConvNetQuake_INGV
-pred_COI = np.load(osp.join(re_ad, "ConvNetQuake_INGV", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_COI = np.load(osp.join(re_ad, "ConvNetQuake_INGV", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_COI, true_COI, _, _ = out.read_npy(osp.join(re_ad, "ConvNetQuake_INGV"), sm_scale, name, m_train, m_test)
 error_COI = pred_COI - true_COI
 
 # print the metrics results
@@ -0,0 +1,70 @@
+"""
+Throughput of detection-gated magnitude estimation (func/cascade.py) vs. running EqDetect and EQGraphNet on all windows
+the stream mixes noise (chunk1) and earthquakes (chunk2) of the testing sets, in a random order
+"""
+import torch
+import numpy as np
+import os.path as osp
+from torch.utils.data import DataLoader
+import sys
+sys.path.append('..')
+import func.process as pro
+import func.net as net
+import func.cascade as cas
+
+
+device = "cuda:1" if torch.cuda.is_available() else "cpu"
+batch_size = 256
+adm_style = "ts_un"
+gnn_style = "gcn"
+k = 1
+train_ratio = 0.75
+thre = 0.5
+eq_ratios = [0.05, 0.2, 0.5]                # ratio of earthquakes in the stream
+re_ad_detect = "../result/eq_detect/EqDetect"
+re_ad_mag = "../result/mag_predict/EQGraphNet"
+
+m_no, m_eq = 200000, 200000
+m_no_train, m_eq_train = int(m_no * train_ratio), int(m_eq * train_ratio)
+m_no_test, m_eq_test = m_no - m_no_train, m_eq - m_eq_train
+name_no, name_eq = "chunk1", "chunk2"
+root_no = "/home/chenziwei2021/standford_dataset/{}".format(name_no)
+root_eq = "/home/chenziwei2021/standford_dataset/{}".format(name_eq)
+
+idx_train_no, idx_test_no = pro.get_train_or_test_idx(m_no, m_no_train)
+no_test = pro.Chunk(m_no, False, m_no_train, idx_test_no, root_no, name_no)
+idx_train_eq, idx_test_eq = pro.get_train_or_test_idx(m_eq, m_eq_train)
+eq_test = pro.Chunk(m_eq, False, m_eq_train, idx_test_eq, root_eq, name_eq)
+mag_eq = eq_test.df["source_magnitude"].values.reshape(-1).astype(float)
+
+detector = net.EqDetect(gnn_style, adm_style, k, device).to(device)
+detector.load_state_dict(torch.load(osp.join(re_ad_detect, "model_{}_{}_{}_{}.pkl".format(
+    m_no_train, m_no_test, m_eq_train, m_eq_test)), map_location=device))
+estimator = net.EQGraphNet(gnn_style, adm_style, k, device).to(device)
+estimator.load_state_dict(torch.load(osp.join(re_ad_mag, "model_ml_{}_{}_{}.pkl".format(
+    name_eq, m_eq_train, m_eq_test)), map_location=device))
+cascade = cas.Cascade(detector, estimator, device, thre, batch_size)
+
+np.random.seed(100)
+for eq_ratio in eq_ratios:
+    num_eq = min(int(m_no_test * eq_ratio / (1 - eq_ratio)), m_eq_test)
+    idx_eq = np.random.choice(m_eq_test, num_eq, replace=False)
+    data = torch.cat((no_test.data, eq_test.data[idx_eq]), dim=0)
+    label = np.concatenate((np.ones(m_no_test), np.zeros(num_eq)))             # noise is labelled as 1
+    mag = np.concatenate((np.full(m_no_test, np.nan), mag_eq[idx_eq]))
+    order = np.random.permutation(data.shape[0])
+    data, label, mag = data[order], label[order], mag[order]
+    loader = DataLoader(pro.SelfData(data, torch.from_numpy(label).float()), batch_size=batch_size, shuffle=False)
+
+    p_both, mag_both, info_both = cas.run_both(detector, estimator, loader, device)
+    p_cas, mag_cas, info_cas = cascade.run(loader)
+
+    is_eq = label == 0
+    found = p_cas < thre
+    mae_both = np.mean(np.abs(mag_both[is_eq & found] - mag[is_eq & found]))
+    mae_cas = np.mean(np.abs(mag_cas[is_eq & found] - mag[is_eq & found]))
+    print("earthquake ratio = {:.2f}, recall = {:.4f}, false alarm = {:.4f}, MAE both = {:.4f}, cascade = {:.4f}".
+          format(eq_ratio, np.mean(found[is_eq]), np.mean(found[~is_eq]), mae_both, mae_cas))
+    cas.print_info(info_both)
+    cas.print_info(info_cas)
+    print("speedup = {:.2f}x".format(info_both["time"] / info_cas["time"]))
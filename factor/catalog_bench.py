@@ -0,0 +1,89 @@
+"""
+Check of the deduplication of catalogs (catalog.dedupe) on hand-made cases and against a brute-force comparison of
+all pairs, on random catalogs of several providers with repeated reports and aftershocks
+"""
+import numpy as np
+import pandas as pd
+import time
+import sys
+sys.path.append('..')
+import func.catalog as cat
+import func.spatial as spatial
+
+
+def get_df(rows):
+    df = pd.DataFrame(rows, columns=["time", "latitude", "longitude", "source"])
+    df["time"] = pd.to_datetime(df["time"], unit="s", utc=True)
+    df["source"] = df["source"].astype("category")
+    return df
+
+
+# all pairs of reports from different providers, groups by union-find, all reports of the first provider are kept
+def dedupe_brute(df, client_list, dt=5, dr=20):
+    df = df.sort_values("time", kind="stable").reset_index(drop=True)
+    t = df["time"].values.astype("datetime64[ns]").astype(np.int64) / 1e9
+    lat, lon, source = df["latitude"].values, df["longitude"].values, df["source"].astype(str).values
+    parent = list(range(df.shape[0]))
+
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for i in range(df.shape[0]):
+        for j in range(i + 1, df.shape[0]):
+            if source[i] != source[j] and abs(t[j] - t[i]) <= dt and \
+                    spatial.haversine(lat[i], lon[i], lat[j], lon[j]) <= dr:
+                parent[find(j)] = find(i)
+    group = np.array([find(i) for i in range(df.shape[0])])
+    rank = np.array([client_list.index(one) for one in source])
+    best = {g: rank[group == g].min() for g in np.unique(group)}
+    keep = np.array([rank[i] == best[group[i]] for i in range(df.shape[0])], dtype=bool)
+    return df[keep].reset_index(drop=True)
+
+
+client_list = ["INGV", "IRIS", "EMSC"]
+cases = {
+    # the same event of two providers, with another event reported between them
+    "interleaved": ([(0, 40, 15, "INGV"), (1, 41, 16, "IRIS"), (2, 40.01, 15, "IRIS")], [0, 1]),
+    # an aftershock 2 s and 3 km after the main shock, reported by the same provider
+    "same provider": ([(0, 40, 15, "INGV"), (2, 40.02, 15.02, "INGV")], [0, 1]),
+    # both shocks reported by both providers
+    "both providers": ([(0, 40, 15, "INGV"), (0.5, 40, 15, "IRIS"), (2, 40.02, 15.02, "INGV"),
+                        (2.5, 40.02, 15.02, "IRIS")], [0, 2]),
+    # a report of the second provider close to two events of the first one
+    "chain": ([(0, 40, 15, "INGV"), (2, 40.01, 15.01, "IRIS"), (4, 40.02, 15.02, "INGV")], [0, 2]),
+}
+for key, (rows, expect) in cases.items():
+    df = get_df(rows)
+    result = cat.dedupe(df, client_list)
+    assert result["time"].tolist() == df["time"].iloc[expect].tolist(), "{} is wrong".format(key)
+    assert result.equals(dedupe_brute(df, client_list)), "{} differs from the brute force".format(key)
+    print("{:>14}: {} reports, {} events".format(key, df.shape[0], result.shape[0]))
+
+nums = [500, 3000]
+np.random.seed(100)
+for num in nums:
+    t = np.random.uniform(0, num * 4, num)
+    lat, lon = np.random.uniform(40, 41, num), np.random.uniform(15, 16, num)
+    source = np.random.choice(client_list, num)
+    # repeated reports of other providers, and aftershocks of the same provider
+    repeat = np.random.choice(num, num // 2, replace=False)
+    after = np.random.choice(num, num // 5, replace=False)
+    rows = list(zip(t, lat, lon, source))
+    rows += [(t[i] + np.random.uniform(0, 3), lat[i] + np.random.normal(0, 0.02), lon[i] + np.random.normal(0, 0.02),
+              np.random.choice([one for one in client_list if one != source[i]])) for i in repeat]
+    rows += [(t[i] + np.random.uniform(0, 5), lat[i] + np.random.normal(0, 0.05), lon[i] + np.random.normal(0, 0.05),
+              source[i]) for i in after]
+    df = get_df(rows)
+
+    t_begin = time.time()
+    result = cat.dedupe(df, client_list)
+    t_new = time.time() - t_begin
+    t_begin = time.time()
+    result_brute = dedupe_brute(df, client_list)
+    t_brute = time.time() - t_begin
+    assert result.equals(result_brute), "dedupe differs from the brute force (n = {})".format(df.shape[0])
+    print("{} reports: {} events, dedupe {:.3f}s, brute force {:.3f}s".format(df.shape[0], result.shape[0], t_new,
+                                                                             t_brute))
+print("dedupe is right")
@@ -0,0 +1,167 @@
+"""
+Check of the concurrent downloader (func/download.py) against a local stand-in of an FDSN dataselect service
+two stand-ins answer the bulk queries with random miniSEED after a fixed latency, some stations have no data (204), some
+fail (500) and some only have the Z channel, on the first stand-in (the other channels are taken from the second one) or
+on both (the job fails), jobs are downloaded sequentially and concurrently, the statuses, the providers, the manifest
+(resuming) and the time are checked, together with the number of http connections opened by obspy (one per request,
+and those of the service discovery of each new Client)
+"""
+import io
+import os.path as osp
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+import numpy as np
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from obspy import Stream, Trace, UTCDateTime
+import sys
+sys.path.append('..')
+import func.download as dl
+
+WADL = """<?xml version="1.0" encoding="UTF-8"?>
+<application xmlns="http://wadl.dev.java.net/2009/02">
+  <resources base="http://{}:{}/fdsnws/dataselect/1/">
+    <resource path="query" id="query">
+      <method name="GET">
+        <request>
+          <param name="network" style="query" type="xs:string"/>
+          <param name="station" style="query" type="xs:string"/>
+          <param name="location" style="query" type="xs:string"/>
+          <param name="channel" style="query" type="xs:string"/>
+          <param name="starttime" style="query" type="xs:dateTime"/>
+          <param name="endtime" style="query" type="xs:dateTime"/>
+        </request>
+      </method>
+      <method name="POST"/>
+    </resource>
+  </resources>
+</application>
+"""
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def reply(self, code, body=b"", content_type="application/vnd.fdsn.mseed"):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/fdsnws/dataselect/1/application.wadl"):
+            host, port = self.server.server_address
+            self.reply(200, WADL.format(host, port).encode(), "application/xml")
+        else:
+            self.reply(404, b"", "text/plain")
+
+    # bulk query, one line of "net sta loc chan begin end" for each channel
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        lines = [line.split() for line in body.splitlines() if len(line.split()) == 6]
+        if len(lines) == 0:
+            self.reply(400, b"", "text/plain")
+            return
+        sta = lines[0][1]
+        if sta in self.server.fail:
+            self.reply(500, b"internal error", "text/plain")
+            return
+        if sta in self.server.nodata:
+            self.reply(204)
+            return
+        st = Stream()
+        for net, sta, _, chan, begin, end in lines:
+            if sta in self.server.partial and not chan.endswith("Z"):
+                continue
+            begin, end = UTCDateTime(begin), UTCDateTime(end)
+            npts = int((end - begin) * self.server.sampling_rate)
+            st.append(Trace(np.random.randint(-1000, 1000, npts).astype(np.int32),
+                            header={"network": net, "station": sta, "location": "", "channel": chan,
+                                    "starttime": begin, "sampling_rate": self.server.sampling_rate}))
+        if len(st) == 0:
+            self.reply(204)
+            return
+        buf = io.BytesIO()
+        st.write(buf, format="MSEED")
+        self.reply(200, buf.getvalue())
+
+
+def start_server(latency, nodata, fail, partial, sampling_rate=20):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.latency, server.sampling_rate = latency, sampling_rate
+    server.nodata, server.fail, server.partial = set(nodata), set(fail), set(partial)
+    server.connections, server.requests = 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def save(job, st):
+    for chan in job["chans"]:
+        if len(st.select(channel=chan)) == 0:
+            return "rejected"
+    return "done"
+
+
+num_sta = 40
+latency = 0.2                       # s of each request of the stand-in
+limits_all = [1, 8]                 # concurrent requests
+time_begin, time_end = "2016-10-30T06:40:18", "2016-10-30T06:45:18"
+
+warnings.simplefilter("ignore")          # the stand-in has no station service, responses are not attached
+np.random.seed(100)
+stations = ["S{:03d}".format(i) for i in range(num_sta)]
+nodata, fail = stations[:3], stations[3:5]
+partial_first, partial_both = stations[5:8], stations[8:10]        # only the Z channel on the first / both stand-ins
+servers = [start_server(latency, nodata, fail, partial_first + partial_both),
+           start_server(latency, nodata, fail, partial_both)]
+sources = ["http://{}:{}".format(*server.server_address) for server in servers]
+server = servers[0]
+jobs = [dl.get_job("XX", sta, ["HHE", "HHN", "HHZ"], time_begin, time_end) for sta in stations]
+
+dir_tmp = tempfile.mkdtemp()
+try:
+    for limit in limits_all:
+        manifest_ad = osp.join(dir_tmp, "manifest_{}.jsonl".format(limit))
+        limits = {source: limit for source in sources}
+        downloader = dl.Downloader(sources, manifest_ad, limits, {"timeout": 30})
+        connections = sum(one.connections for one in servers)
+        requests = sum(one.requests for one in servers)
+        t_begin = time.time()
+        status = downloader.run(jobs, save, verbose=False)
+        duration = time.time() - t_begin
+        records = dl.Manifest(manifest_ad).records
+        for sta in stations:
+            key = dl.get_job_key(dl.get_job("XX", sta, ["HHE"], time_begin, time_end))
+            expect = "nodata" if sta in nodata else "failed" if sta in fail + partial_both else "done"
+            assert status[key] == expect, "{} is {}, {} is expected".format(key, status[key], expect)
+            if sta in partial_first:
+                assert records[key]["source"] == ",".join(sources), "{} is not taken from both stand-ins".format(key)
+            if sta in partial_both:
+                assert records[key]["missing"] == ["HHE", "HHN"], "missing channels of {} are wrong".format(key)
+        print("{} concurrent requests: {} jobs in {:.2f}s ({:.1f} jobs/s), {} requests, {} http connections".format(
+            limit, len(jobs), duration, len(jobs) / duration, sum(one.requests for one in servers) - requests,
+            sum(one.connections for one in servers) - connections))
+
+        # finished jobs are skipped when run again, the failed ones (errors, or only some channels) are tried again
+        status = dl.Downloader(sources, manifest_ad, limits, {"timeout": 30}).run(jobs, save, verbose=False)
+        assert sorted(status.keys()) == sorted("XX.{}.HH".format(sta) for sta in fail + partial_both), \
+            "resuming is wrong"
+finally:
+    for server in servers:
+        server.shutdown()
+    shutil.rmtree(dir_tmp)
+print("statuses and resuming are right")
@@ -2,7 +2,6 @@
 Analyse the effect of earthquake characteristics in earthquake information
 """
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import os.path as osp
@@ -10,6 +9,7 @@ from matplotlib.ticker import FuncFormatter
 import sys
 sys.path.append('..')
 import func.output as out
+import func.process as pro
 import func.draw as draw
 
 
@@ -48,25 +48,11 @@ def tran_fea(fea_):
 
 
 def read_snr(df, style):
-    snr = df.snr_db.values
-    num = snr.shape[0]
-    snr_all = []
-    for i in range(num):
-        snr_one = snr[i][1:-1]
-        snr_one_ = snr_one.split(' ')
-        num_full = snr_one_.count('')
-        idx = 0
-        while idx < num_full:  # 除去空格
-            snr_one_.remove('')
-            idx = idx + 1
-        snr_one_ = np.array([float(snr_one_[0]), float(snr_one_[1]), float(snr_one_[2])])
-        if style == "mean":  # 以平均值作为标签label
-            snr_one_mean = np.mean(snr_one_)
-            snr_all.append(snr_one_mean)
-        else:
-            raise TypeError("Unknown type of style")
-    snr_all = np.array(snr_all)
-    return snr_all
+    snr = pro.read_snr(df)
+    if style == "mean":  # 以平均值作为标签label
+        return np.mean(snr, axis=1)
+    else:
+        raise TypeError("Unknown type of style")
 
 
 # ["snr_db", "source_distance_km", "source_depth_km", "source_magnitude"]
@@ -105,8 +91,11 @@ Data preparation
 pos, true, trace, pred_MaI, pred_EQG, _, _, _ = out.read_sm(
     sm_list, re_ad, name, m_train, m_test)
 
-df = pd.read_csv(osp.join(root, name + ".csv"))
-df = out.select_trace(trace, df, re_ad, name, m)
+if fea_name == "snr_db":
+    df = pro.read_meta(root, name, ["snr_db_e", "snr_db_n", "snr_db_z"])
+else:
+    df = pro.read_meta(root, name, [fea_name])
+df = out.select_trace(trace, df)
 
 if fea_name == "snr_db":
     fea = read_snr(df, style="mean")
@@ -163,6 +152,10 @@ elif model == "MagInfoNet":
 else:
     raise TypeError("Unknown type of model! Must be 'EQGraphNet' or 'MagInfoNet'!")
 
+# mean, std, count and quantiles of errors in each bin of feature
+stat = out.binned_stat(error, fea, bins)
+print(stat.to_string(index=False))
+
 # fig_cb = draw.color_bar(np.array([1, 2]), np.array([1, 2]), "核密度", (60, 12), fo_si, la, cmax)
 # fig_error_fea = draw.error_fea(error, fea, (15, 36), fo_si, fo_ti_si, cmax, x_name, True, y_lim, la, model, v_max)
 fig_fea_dist = dist(fea, 40, 8, (15, 7), fo_si, fo_ti_si, x_name, y_name, la)
@@ -172,6 +165,7 @@ if save_fig:
     # fig_cb.savefig(osp.join(g_ad, "cb.png"))
     # fig_error_fea.savefig(osp.join(g_ad, model, "error_fea_{}.png".format(fig_name)))
     fig_fea_dist.savefig(osp.join(g_ad, "dist_{}.png".format(fig_name)))
+    stat.to_csv(osp.join(g_ad, "error_stat_{}_{}.csv".format(model, fig_name)), index=False)
 
 print()
 plt.show()
@@ -13,6 +13,7 @@ import sys
 sys.path.append("..")
 import func.process as pro
 import func.net as net
+import func.store as store
 
 
 gnn_style, model_style, sm_scale, device = sys.argv[1], int(sys.argv[2]), sys.argv[3], sys.argv[4]
@@ -74,12 +75,14 @@ if model_style == 0:
     EQG = net.EQGraphNet(gnn_style, "ts_un", 1, device).to(device)
     optimizer = torch.optim.Adam(EQG.parameters(), lr=lr, weight_decay=weight_decay)
 
-    train_pred, train_true, test_pred, test_true = [], [], [], []
+    metric_train = net.StreamMetric(device, len(train_loader.dataset))
+    metric_test = net.StreamMetric(device, len(test_loader.dataset))
     train_trace, test_trace = [], []
     train_pos, test_pos = [], []
     train_loss, test_loss = [], []
     for epoch in range(epochs):
         loss_train_all, loss_test_all = 0, 0
+        metric_train.reset(), metric_test.reset()
         for item_train, (x_train, y_train, _) in enumerate(tqdm(train_loader)):
             x_train, y_train = x_train.to(device), y_train.to(device)
 
@@ -90,14 +93,7 @@ if model_style == 0:
             optimizer.step()
             loss_train_all = loss_train_all + loss_train.item()
 
-            train_pred_one = output_train.detach().cpu().numpy()
-            train_true_one = y_train.detach().cpu().numpy()
-            if item_train == 0:
-                train_pred = train_pred_one
-                train_true = train_true_one
-            else:
-                train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-                train_true = np.concatenate((train_true, train_true_one), axis=0)
+            metric_train.update(y_train, output_train)
 
         for item_test, (x_test, y_test, _) in enumerate(tqdm(test_loader)):
             x_test, y_test = x_test.to(device), y_test.to(device)
@@ -106,52 +102,30 @@ if model_style == 0:
             loss_test = criterion(output_test, y_test)
             loss_test_all = loss_test_all + loss_test.item()
 
-            test_pred_one = output_test.detach().cpu().numpy()
-            test_true_one = y_test.detach().cpu().numpy()
-            if item_test == 0:
-                test_pred = test_pred_one
-                test_true = test_true_one
-            else:
-                test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-                test_true = np.concatenate((test_true, test_true_one), axis=0)
-
-        rmse_train = net.cal_rmse_one_arr(train_true, train_pred)
-        rmse_test = net.cal_rmse_one_arr(test_true, test_pred)
-        r2_train = net.cal_r2_one_arr(train_true, train_pred)
-        r2_test = net.cal_r2_one_arr(test_true, test_pred)
+            metric_test.update(y_test, output_test)
+
+        rmse_train, r2_train = metric_train.result()
+        rmse_test, r2_test = metric_test.result()
         print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.8f}  R2_Test: {:.8f}".
               format(epoch, rmse_train, rmse_test, r2_train, r2_test))
         print()
         if (0.91 < r2_test and sm_scale == "ml") or (0.855 < r2_test and sm_scale == "md"):
             break
 
-    error = test_pred - test_true
-    e_mean, e_std = np.mean(error), np.std(error)
+    e_mean, e_std = metric_test.error()
 
     if save_model:
         torch.save(EQG.state_dict(),
                    osp.join(save_ad, "EQG_{}_{}_{}_{}_{}.pkl".format(gnn_style, sm_scale, name, m_train, m_test)))
 
+    # one run per gnn_style in the results store of save_ad, all gnn_style exported as csv
     if save_txt:
-        info_txt_ad = osp.join(save_ad, "EQG_result_{}_{}_{}.txt".format(sm_scale, name, m))
-        info_df_ad = osp.join(save_ad, "EQG_result_{}_{}_{}.csv".format(sm_scale, name, m))
-        f = open(info_txt_ad, 'a')
-        if osp.getsize(info_txt_ad) == 0:
-            f.write("gnn_style r2 rmse e_mean e_std\n")
-        f.write(str(gnn_style) + "  ")
-        f.write(str(np.round(r2_test, 4)) + "  ")
-        f.write(str(np.round(rmse_test, 4)) + "  ")
-        f.write(str(np.round(e_mean, 4)) + "  ")
-        f.write(str(np.round(e_std, 4)) + "  ")
-
-        f.write("\n")
-        f.close()
-
-        info = np.loadtxt(info_txt_ad, dtype=str)
-        columns = info[0, :].tolist()
-        values = info[1:, :]
-        info_df = pd.DataFrame(values, columns=columns)
-        info_df.to_csv(info_df_ad)
+        db_ad = store.get_db(save_ad)
+        store.save_run(db_ad, "EQG", sm_scale, name, m_train, m_test, {"gnn_style": gnn_style, "epochs": epochs},
+                       {"r2_test": r2_test, "rmse_test": rmse_test, "e_mean": e_mean, "e_std": e_std})
+        info_df = store.pivot_runs(db_ad, "gnn_style", ["EQG"], ("r2_test", "rmse_test", "e_mean", "e_std"),
+                                   sm_scale=sm_scale, name=name, m_train=m_train)
+        info_df.to_csv(osp.join(save_ad, "EQG_result_{}_{}_{}.csv".format(sm_scale, name, m)))
 
 # train MagInfoNet
 elif model_style == 1:
@@ -175,9 +149,11 @@ elif model_style == 1:
     MaI = net.MagInfoNet(gnn_style, "ts_un", 1, device).to(device)
     optimizer = torch.optim.Adam(MaI.parameters(), lr=lr, weight_decay=weight_decay)
 
-    train_pred, train_true, test_pred, test_true = [], [], [], []
+    metric_train = net.StreamMetric(device, len(train_loader.dataset))
+    metric_test = net.StreamMetric(device, len(test_loader.dataset))
     for epoch in range(epochs):
         loss_train_all, loss_test_all = 0, 0
+        metric_train.reset(), metric_test.reset()
         for item_train, (x_train, y_train, ps_at_train, p_t_train, _) in enumerate(train_loader):
             x_train, y_train = x_train.to(device), y_train.to(device)
             ps_at_train, p_t_train = ps_at_train.to(device), p_t_train.to(device)
@@ -189,14 +165,7 @@ elif model_style == 1:
             optimizer.step()
             loss_train_all = loss_train_all + loss_train.item()
 
-            train_pred_one = output_train.detach().cpu().numpy()
-            train_true_one = y_train.detach().cpu().numpy()
-            if item_train == 0:
-                train_pred = train_pred_one
-                train_true = train_true_one
-            else:
-                train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-                train_true = np.concatenate((train_true, train_true_one), axis=0)
+            metric_train.update(y_train, output_train)
 
         for item_test, (x_test, y_test, ps_at_test, p_t_test, _) in enumerate(test_loader):
             x_test, y_test = x_test.to(device), y_test.to(device)
@@ -206,51 +175,29 @@ elif model_style == 1:
             loss_test = criterion(output_test, y_test)
             loss_test_all = loss_test_all + loss_test.item()
 
-            test_pred_one = output_test.detach().cpu().numpy()
-            test_true_one = y_test.detach().cpu().numpy()
-            if item_test == 0:
-                test_pred = test_pred_one
-                test_true = test_true_one
-            else:
-                test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-                test_true = np.concatenate((test_true, test_true_one), axis=0)
-
-        rmse_train = net.cal_rmse_one_arr(train_true, train_pred)
-        rmse_test = net.cal_rmse_one_arr(test_true, test_pred)
-        r2_train = net.cal_r2_one_arr(train_true, train_pred)
-        r2_test = net.cal_r2_one_arr(test_true, test_pred)
+            metric_test.update(y_test, output_test)
+
+        rmse_train, r2_train = metric_train.result()
+        rmse_test, r2_test = metric_test.result()
         print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.8f}  R2_Test: {:.8f}".
               format(epoch, rmse_train, rmse_test, r2_train, r2_test))
         print()
         if (0.88 < r2_test and sm_scale == "ml") or (0.82 < r2_test and sm_scale == "md"):
             break
 
-    error = test_pred - test_true
-    e_mean, e_std = np.mean(error), np.std(error)
+    e_mean, e_std = metric_test.error()
 
     if save_model:
         torch.save(MaI.state_dict(),
                    osp.join(save_ad, "MaI_{}_{}_{}_{}_{}.pkl".format(gnn_style, sm_scale, name, m_train, m_test)))
 
+    # one run per gnn_style in the results store of save_ad, all gnn_style exported as csv
     if save_txt:
-        info_txt_ad = osp.join(save_ad, "MaI_result_{}_{}_{}.txt".format(sm_scale, name, m))
-        info_df_ad = osp.join(save_ad, "MaI_result_{}_{}_{}.csv".format(sm_scale, name, m))
-        f = open(info_txt_ad, 'a')
-        if osp.getsize(info_txt_ad) == 0:
-            f.write("gnn_style r2 rmse e_mean e_std\n")
-        f.write(str(gnn_style) + "  ")
-        f.write(str(np.round(r2_test, 4)) + "  ")
-        f.write(str(np.round(rmse_test, 4)) + "  ")
-        f.write(str(np.round(e_mean, 4)) + "  ")
-        f.write(str(np.round(e_std, 4)) + "  ")
-
-        f.write("\n")
-        f.close()
-
-        info = np.loadtxt(info_txt_ad, dtype=str)
-        columns = info[0, :].tolist()
-        values = info[1:, :]
-        info_df = pd.DataFrame(values, columns=columns)
-        info_df.to_csv(info_df_ad)
+        db_ad = store.get_db(save_ad)
+        store.save_run(db_ad, "MaI", sm_scale, name, m_train, m_test, {"gnn_style": gnn_style, "epochs": epochs},
+                       {"r2_test": r2_test, "rmse_test": rmse_test, "e_mean": e_mean, "e_std": e_std})
+        info_df = store.pivot_runs(db_ad, "gnn_style", ["MaI"], ("r2_test", "rmse_test", "e_mean", "e_std"),
+                                   sm_scale=sm_scale, name=name, m_train=m_train)
+        info_df.to_csv(osp.join(save_ad, "MaI_result_{}_{}_{}.csv".format(sm_scale, name, m)))
 
 print()
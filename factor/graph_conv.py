@@ -5,54 +5,21 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 import os.path as osp
-from pygsp import graphs
-from tqdm import tqdm
 from matplotlib.ticker import FuncFormatter
 
 import sys
 sys.path.append('..')
 import func.process as pro
 import func.net as net
+import func.gft as gft
 
 
 def find_min_snr(df, data):
-    snr = df['snr_db'].values.reshape(-1)
-    snr_max, index, j = -float('inf'), 0, 0
-    for i in range(len(snr)):
-        snr_one = snr[i][1:-1].split(' ')
-        num_full = snr_one.count('')
-        idx = 0
-        while idx < num_full:  # 除去空格
-            snr_one.remove('')
-            idx = idx + 1
-        snr_one = np.array(snr_one).astype(float)
-
-        if np.max(snr_one) > snr_max:
-            index = i
-            j = np.argmax(snr_one)
-            snr_max = np.max(snr_one)
+    snr = pro.read_snr(df)
+    index, j = np.unravel_index(np.nanargmax(snr), snr.shape)
     return data[index, j, :].numpy()
 
 
-def get_u(ad, a):
-    u_ad = osp.join(ad, "u.npy")
-    if not osp.exists(u_ad):
-        g = graphs.Graph(a)
-        u = g.U
-        np.save(u_ad, u)
-    else:
-        u = np.load(u_ad)
-    return u.transpose()
-
-def graph_conv(x, a, num):
-    d = np.diag(np.sum(a, axis=1))      # degree matrix
-    d_norm = np.power(d, 0.5)
-    x = x.reshape(-1, 1)
-    for _ in tqdm(range(num)):
-        x = np.dot(np.dot(np.dot(d_norm, a), d_norm), x)
-    return x.reshape(-1)
-
-
 def get_noise_one(x, ratio):
     e = np.mean(np.square(x))
     e_n = e / ratio
@@ -61,12 +28,6 @@ def get_noise_one(x, ratio):
     return n
 
 
-def gft(u, x):
-    x = x.reshape(-1, 1)
-    x_gft = np.dot(u, x)
-    return x_gft.reshape(-1)
-
-
 def thousands(x, pos):
     return '%1.0f' % (x * 1e-4)
 
@@ -79,8 +40,8 @@ def compare(x, x_n, num, y_lim, fig_si, fo_si):
         word = "无图卷积，"
     else:
         word = "{}次图卷积，".format(num)
-    ax.plot(gft(u, graph_conv(x, a, num)), label=word + "地震信号", alpha=alpha)
-    ax.plot(gft(u, graph_conv(x_n, a, num)), label=word + "加噪信号", alpha=alpha)
+    ax.plot(gft.gft(gft.graph_conv(x, a, num), a), label=word + "地震信号", alpha=alpha)
+    ax.plot(gft.gft(gft.graph_conv(x_n, a, num), a), label=word + "加噪信号", alpha=alpha)
     # ax.xaxis.set_major_formatter(formatter)
     ax.yaxis.set_major_formatter(formatter)
     ax.patch.set_facecolor('grey')
@@ -141,8 +102,7 @@ x = find_min_snr(df, eq_data)       # earthquake signal
 n = get_noise_one(x, 10)            # noise
 x_n = x + n                         # noisy signal
 length = x.shape[0]              # length of earthquake signal
-a = net.ts_un(length, 1)            # adjacency matrix
-u = get_u(re_ad, a)           # gft matrix
+a = gft.to_sparse(net.ts_un(length, 1))       # adjacency matrix, the GFT of which is the DCT
 
 y_lim = (-100 * 1e3, 125 * 1e3)
 
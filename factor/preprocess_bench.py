@@ -0,0 +1,70 @@
+"""
+Benchmark of batched preprocessing (func/preprocess.py) vs. obspy trace by trace, as process() of reality_get_data.py
+resample() is checked first against Trace.resample on odd / even lengths of input and output, and upsampling
+"""
+import numpy as np
+import time
+from obspy import Trace, Stream, UTCDateTime
+import sys
+sys.path.append('..')
+import func.preprocess as pre
+
+
+# (npts, fs, fs_new) of the checks of resample: even, odd npts, odd output, upsampling (even and odd)
+cases = [(7200, 20, 5 / 6), (7201, 20, 5 / 6), (1000, 20, 4.62), (1001, 20, 50), (999, 20, 100), (6001, 100, 33)]
+nums = [90, 600]                    # number of traces (3 channels of stations)
+fs = 20                             # sampling rate of raw traces
+fs_new = 5 / 6
+duration = 7200                     # s
+shift = 60                          # s, raw traces begin before or after time_begin by up to shift
+
+np.random.seed(100)
+for npts, fs_one, fs_new_one in cases:
+    data = np.cumsum(np.random.randn(4, npts), axis=1)
+    x_batch = pre.resample(data, fs_one, fs_new_one)
+    x_obspy = []
+    for i in range(data.shape[0]):
+        tr = Trace(data=data[i].copy(), header={"sampling_rate": fs_one})
+        tr.resample(fs_new_one)
+        x_obspy.append(tr.data)
+    x_obspy = np.array(x_obspy)
+    if x_batch.shape != x_obspy.shape:
+        raise ValueError("Lengths of resample and Trace.resample are not the same, {} and {}!".format(
+            x_batch.shape[-1], x_obspy.shape[-1]))
+    err = np.abs(x_batch - x_obspy).max() / np.abs(x_obspy).max()
+    if err > 1e-10:
+        raise ValueError("Results of resample and Trace.resample are not the same, relative error {:.2e}!".format(err))
+    print("resample {} samples from {} Hz to {:.4g} Hz:  {} samples  relative error = {:.1e}".format(
+        npts, fs_one, fs_new_one, x_batch.shape[-1], err))
+
+time_begin = UTCDateTime(2019, 12, 9, 5)
+time_end = time_begin + duration
+for num in nums:
+    npts = (duration + 2 * shift) * fs
+    data = np.cumsum(np.random.randn(num, npts), axis=1).astype(np.float32)
+    starts = np.random.randint(-shift * fs, shift * fs, num)
+    traces = [Trace(data=data[i], header={"sampling_rate": fs, "starttime": time_begin - starts[i] / fs})
+              for i in range(num)]
+
+    t_begin = time.time()
+    x_obspy = []
+    for tr in traces:
+        st = Stream([tr.copy()])
+        st.resample(fs_new)
+        st = st.trim(time_begin, time_end, pad=True, fill_value=0)
+        st.detrend("demean")
+        st.detrend("linear")
+        x_obspy.append(st.traces[0].data)
+    t_obspy = time.time() - t_begin
+    x_obspy, _ = pre.stack(x_obspy)
+
+    t_begin = time.time()
+    x_batch = pre.process_traces(traces, time_begin, time_end, fs_new)
+    t_batch = time.time() - t_begin
+
+    err = np.abs(x_batch[:, :x_obspy.shape[1]] - x_obspy).max() / np.abs(x_obspy).max()
+    if err > 1e-4:
+        raise ValueError("Results of batched preprocessing and obspy are not the same, relative error {:.2e}!".
+                         format(err))
+    print("{} traces of {} samples:  obspy = {:.3f}s  batch = {:.3f}s  speedup = {:.1f}x  relative error = {:.1e}".
+          format(num, npts, t_obspy, t_batch, t_obspy / t_batch, err))
@@ -2,13 +2,18 @@
 获取地震信号（真实）
 """
 from obspy.core.utcdatetime import UTCDateTime
-from obspy.clients.fdsn import Client
+from obspy import Stream
 from datetime import timedelta
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 import os
 import os.path as osp
+import sys
+sys.path.append("..")
+import func.download as dl
+import func.preprocess as pre
+import func.spatial as spatial
 
 
 def x_plot(st_e, st_n, st_z, title):
@@ -41,40 +46,38 @@ def judge(st):
             return True
 
 
-def get_signal(net, sta, chan, time_begin, time_end):
-    # print(net, sta, chan)
-    trace = osp.join(dir_data, net + "." + sta + "." + chan)
-    if os.path.exists(trace):
-        print(net, sta, chan, " downloaded already")
-        return None, trace
-    try:
-        st = client1.get_waveforms(
-            network=net, station=sta, location=False, channel=chan, starttime=time_begin,
-            endtime=time_end, attach_response=True)
-        # st.merge(method=1, fill_value="interpolate")
-        # st_length = st.traces[0].data.shape[0]
-        st.resample(5 / 6)
-        st = st.trim(time_begin, time_end, pad=True, fill_value=0)
-        st.detrend("demean")
-        st.detrend("linear")
-        print(net, sta, chan, " have been downloaded")
-        return st, trace
-    except:
-        try:
-            st = client2.get_waveforms(
-                network=net, station=sta, location=False, channel=chan, starttime=time_begin,
-                endtime=time_end, attach_response=True)
-            # st.merge(method=1, fill_value="interpolate")
-            # st_length = st.traces[0].data.shape[0]
-            st.resample(5 / 6)
-            st = st.trim(time_begin, time_end, pad=True, fill_value=0)
-            st.detrend("demean")
-            st.detrend("linear")
-            print(net, sta, chan, " have been downloaded")
-            return st, trace
-        except:
+# resample, trim and detrend the three channels together (func/preprocess.py), one Stream per channel
+def process(traces, time_begin, time_end, fs=5 / 6):
+    x = pre.process_traces(traces, time_begin, time_end, fs)
+    sts = []
+    for tr, x_one in zip(traces, x):
+        tr = tr.copy()
+        tr.data = x_one.astype(np.float32)
+        tr.stats.sampling_rate = fs
+        tr.stats.starttime = time_begin
+        sts.append(Stream([tr]))
+    return sts
+
+
+# called by the downloader for each station, when its three channels have been downloaded
+def save(job, st):
+    net, sta = job["net"], job["sta"]
+    time_begin, time_end = UTCDateTime(job["time_begin"]), UTCDateTime(job["time_end"])
+    traces = []
+    for chan in job["chans"]:
+        st_one = st.select(channel=chan)
+        if len(st_one) == 0:
             print(net, sta, chan, " doesn't exist")
-            return None, trace
+            return "rejected"
+        traces.append(st_one.merge(method=1, fill_value=0).traces[0])
+    sts = process(traces, time_begin, time_end)
+    if not (judge(sts[0]) & judge(sts[1]) & judge(sts[2])):
+        print(net, sta, job["chans"][0][:2], " 不满足要求")
+        return "rejected"
+    for st_one, chan in zip(sts, job["chans"]):
+        st_one.write(filename=osp.join(dir_data, net + "." + sta + "." + chan), format="SAC")
+    x_plot(sts[0], sts[1], sts[2], "{}_{}_{}".format(net, sta, job["chans"][0]))
+    return "done"
 
 
 """
@@ -86,10 +89,9 @@ time_start = "2019-12-09T05:19:33.940000Z"          # 地震发生时刻（从ev
 year, mon, day, hour = get_time_start(time_start)
 
 station_file = "reality_data/station.dat"
-source1 = "INGV"
-client1 = Client(source1)
-source2 = "IRIS"
-client2 = Client(source2)
+sources = ["INGV", "IRIS"]
+limits = {"INGV": 4, "IRIS": 4}             # concurrent requests of each provider
+radius = None               # km, only the stations within radius of the event are downloaded, all stations if None
 dir_data = "reality_data/{}_{}_{}".format(year, mon, day)
 
 if not os.path.exists(dir_data):
@@ -99,22 +101,28 @@ time_origin = UTCDateTime(year, mon, day) + timedelta(seconds=(hour * 3600))
 time_begin = time_origin - timedelta(seconds=0)          # 地震信号，开始采集时刻（地震开始时）
 time_end = time_origin + timedelta(seconds=7200)         # 地震信号，终止采集时刻（地震开始后，2个小时）
 
-f = open(station_file, "r")
-for station in f:
-    sta_lo, sta_la, net, sta, chan, elev = station.split()
-    chan_e, chan_n, chan_z = chan[:2] + "E", chan[:2] + "N", chan[:2] + "Z"
-    st_e, trace_e = get_signal(net, sta, chan_e, time_begin, time_end)
-    st_n, trace_n = get_signal(net, sta, chan_n, time_begin, time_end)
-    st_z, trace_z = get_signal(net, sta, chan_z, time_begin, time_end)
-    if judge(st_e) & judge(st_n) & (judge(st_z)):
-        st_e.write(filename=trace_e, format="SAC")
-        st_n.write(filename=trace_n, format="SAC")
-        st_z.write(filename=trace_z, format="SAC")
-        x_plot(st_e, st_n, st_z, "{}_{}_{}".format(net, sta, chan))
-    else:
-        print(net, sta, chan, " 不满足要求")
+# pick stations of the event by the spatial index
+stations = spatial.read_station_dat(station_file)
+if radius is None:
+    idx_sta = np.arange(stations["sta"].shape[0])
+else:
+    event = event_info[event_info["Time"] == time_start].iloc[0]
+    index_sta = spatial.GeoIndex(stations["lat"], stations["lon"])
+    idx_sta, dist_sta = spatial.pick_stations(index_sta, event["Latitude"], event["Longitude"], radius=radius)
+    print("{} stations within {} km".format(idx_sta.shape[0], radius))
+
+jobs = []
+for i in idx_sta:
+    net, sta, chan = stations["net"][i], stations["sta"][i], stations["chan"][i]
+    chans = [chan[:2] + "E", chan[:2] + "N", chan[:2] + "Z"]
+    if all([os.path.exists(osp.join(dir_data, net + "." + sta + "." + one)) for one in chans]):
+        print(net, sta, chan, " downloaded already")
+        continue
+    jobs.append(dl.get_job(net, sta, chans, str(time_begin), str(time_end)))
 
-f.close()
+# stations are downloaded concurrently, the finished ones are recorded in the manifest and skipped when run again
+downloader = dl.Downloader(sources, osp.join(dir_data, "manifest.jsonl"), limits)
+downloader.run(jobs, save)
 
 
 print()
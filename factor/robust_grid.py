@@ -0,0 +1,80 @@
+"""
+Anti-Noise performance of all models, for a grid of SNR and noise types in one run
+the noisy batches are generated from the clean testing batch on the fly, see func/evaluate.py
+"""
+import torch
+import numpy as np
+import os
+import os.path as osp
+import sys
+sys.path.append('..')
+import func.process as pro
+import func.evaluate as eva
+
+
+snrs = [-5, -1, 1, 5, 10, 15, 20]
+noise_styles = ["gau", "nat"]       # 'gau': Gaussian white noise, 'nat': natural noise of chunk1
+device = "cuda:1" if torch.cuda.is_available() else "cpu"
+batch_size = 64
+train_ratio = 0.75
+m = 200000
+sm_scale = "ml"
+random = False
+save_txt = True
+re_ad = "../result/mag_predict"
+save_ad = {"gau": "../factor/robust_result", "nat": "../factor/robust_natural_result"}
+for save_ad_one in save_ad.values():
+    if not(osp.exists(save_ad_one)):
+        os.makedirs(save_ad_one)
+
+"""
+Selection of noise and earthquake signals
+"""
+m_train = int(m * train_ratio)       # number of training samples
+m_test = m - m_train                 # number of testing samples
+name_no = "chunk1"
+root_no = "/home/chenziwei2021/standford_dataset/{}".format(name_no)
+name_eq = "chunk2"
+root_eq = "/home/chenziwei2021/standford_dataset/{}".format(name_eq)
+
+if not random:
+    np.random.seed(100)
+    torch.manual_seed(100)
+idx_train, idx_test = pro.get_train_or_test_idx(m, m_train)
+
+Eq_train = pro.Chunk(m, True, m_train, idx_train, root_eq, name_eq, pro.META_EVAL)
+Eq_test = pro.Chunk(m, False, m_train, idx_test, root_eq, name_eq, pro.META_EVAL)
+df_train, df_test = Eq_train.df, Eq_test.df
+x_train, x_test = Eq_train.data.float(), Eq_test.data.float()
+sm_train = torch.from_numpy(df_train["source_magnitude"].values.reshape(-1)).float()
+sm_test = torch.from_numpy(df_test["source_magnitude"].values.reshape(-1)).float()
+
+# Select samples according to Magnitude Type
+data_train, sm_train, df_train, _ = pro.remain_sm_scale(x_train, df_train, sm_train, sm_scale)
+data_test, sm_test, df_test, _ = pro.remain_sm_scale(x_test, df_test, sm_test, sm_scale)
+_, ps_at_test, _, p_t_test = pro.get_mai_data(df_train, df_test)
+
+# get natural noise, only the testing part is needed
+n_test = None
+if "nat" in noise_styles:
+    No_test = pro.Chunk(m, False, m_train, idx_test, root_no, name_no, [])
+    n_test = No_test.data.float()
+
+test_loader = eva.get_loader(batch_size, data_test, df_test, sm_test, ps_at_test, p_t_test, n_test)
+
+"""
+Evaluate all models on every (noise, snr)
+"""
+models = eva.load_models(eva.MODELS.keys(), re_ad, sm_scale, name_eq, m_train, m_test, device)
+grid = eva.evaluate_grid(models, test_loader, snrs, noise_styles, device)
+print(grid.to_string(index=False))
+
+"""
+save robust result
+"""
+if save_txt:
+    grid.to_csv(osp.join(save_ad["gau"], "robust_grid_{}_{}_{}.csv".format(sm_scale, name_eq, m)), index=False)
+    # tables of each noise type, named apart from the robust_mag_result csv of robust.py and robust_natural.py
+    for noise_style in noise_styles:
+        table = eva.grid_to_table(grid, noise_style)
+        table.to_csv(osp.join(save_ad[noise_style], "robust_grid_result_{}_{}_{}.csv".format(sm_scale, name_eq, m)))
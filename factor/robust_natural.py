@@ -13,13 +13,7 @@ import sys
 sys.path.append('..')
 import func.process as pro
 import func.net as net
-
-
-def sort_values(values):
-    idx = values[:, 0].astype(int)
-    idx_sort = np.argsort(idx)
-    values_sort = values[idx_sort, :]
-    return values_sort
+import func.store as store
 
 
 def get_noise_one_natural(x, n, snr):
@@ -34,15 +28,7 @@ def get_noise_one_natural(x, n, snr):
     return n_
 
 
-def get_noise_natural(x, n, snr, path, sm_scale, train, save=False):
-    if train:
-        save_path = osp.join(path, "x_n_{}_{}_train.npy".format(sm_scale, snr))
-    else:
-        save_path = osp.join(path, "x_n_{}_{}_test.npy".format(sm_scale, snr))
-    if osp.exists(save_path):
-        x_n = np.load(save_path)
-        return torch.from_numpy(x_n).float()
-
+def get_noise_natural(x, n, snr):
     if torch.is_tensor(x):
         x = x.numpy()
     if torch.is_tensor(n):
@@ -59,8 +45,6 @@ def get_noise_natural(x, n, snr, path, sm_scale, train, save=False):
         n_one = np.concatenate((n_one_1, n_one_2, n_one_3), axis=0)
         n_one = np.expand_dims(n_one, axis=0)
         x_n[i, :, :] = x_n[i, :, :] + n_one
-    if save:
-        np.save(save_path, x_n)
     return torch.from_numpy(x_n).float()
 
 
@@ -91,8 +75,8 @@ if not random:
     np.random.seed(100)
 idx_train, idx_test = pro.get_train_or_test_idx(m, m_train)
 
-Eq_train = pro.Chunk(m, True, m_train, idx_train, root_eq, name_eq)
-Eq_test = pro.Chunk(m, False, m_train, idx_test, root_eq, name_eq)
+Eq_train = pro.Chunk(m, True, m_train, idx_train, root_eq, name_eq, pro.META_EVAL)
+Eq_test = pro.Chunk(m, False, m_train, idx_test, root_eq, name_eq, pro.META_EVAL)
 df_train, df_test = Eq_train.df, Eq_test.df
 x_train, x_test = Eq_train.data.float(), Eq_test.data.float()
 sm_train = torch.from_numpy(df_train["source_magnitude"].values.reshape(-1)).float()
@@ -103,12 +87,12 @@ data_train, sm_train, df_train, _ = pro.remain_sm_scale(x_train, df_train, sm_tr
 data_test, sm_test, df_test, _ = pro.remain_sm_scale(x_test, df_test, sm_test, sm_scale)
 
 # get natural noise
-No_train = pro.Chunk(m, True, m_train, idx_train, root_no, name_no)
-No_test = pro.Chunk(m, False, m_train, idx_test, root_no, name_no)
+No_train = pro.Chunk(m, True, m_train, idx_train, root_no, name_no, [])
+No_test = pro.Chunk(m, False, m_train, idx_test, root_no, name_no, [])
 n_train, n_test = No_train.data.float(), No_test.data.float()
 
-data_n_train = get_noise_natural(data_train, n_train, snr, save_ad, sm_scale, True)
-data_n_test = get_noise_natural(data_test, n_test, snr, save_ad, sm_scale, False)
+data_n_train = get_noise_natural(data_train, n_train, snr)
+data_n_test = get_noise_natural(data_test, n_test, snr)
 
 test_dataset = pro.SelfData(data_n_test, sm_test)
 test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=True)
@@ -291,35 +275,16 @@ print("MaI: RMSE_Test: {:.4f}  R2_Test: {:.4f}".format(rmse_MaI, r2_MaI))
 """
 save robust result
 """
+# one run per model in the results store of save_ad, all snr exported as csv (one row per snr)
 if save_txt:
-    info_txt_ad = osp.join(save_ad, "robust_mag_result_{}_{}_{}.txt".format(sm_scale, name_eq, m))
-    info_df_ad = osp.join(save_ad, "robust_mag_result_{}_{}_{}.csv".format(sm_scale, name_eq, m))
-    f = open(info_txt_ad, 'a')
-    if osp.getsize(info_txt_ad) == 0:
-        f.write("snr r2_MaI r2_EQG r2_Mag r2_CRE r2_COI rmse_MaI rmse_EQG rmse_Mag rmse_CRE rmse_COI\n")
-    f.write(str(snr) + "  ")
-    f.write(str(round(r2_MaI, 4)) + "  ")
-    f.write(str(round(r2_EQG, 4)) + "  ")
-    f.write(str(round(r2_Mag, 4)) + "  ")
-    f.write(str(round(r2_CRE, 4)) + "  ")
-    f.write(str(round(r2_COI, 4)) + "  ")
-    f.write(str(round(rmse_MaI, 4)) + "  ")
-    f.write(str(round(rmse_EQG, 4)) + "  ")
-    f.write(str(round(rmse_Mag, 4)) + "  ")
-    f.write(str(round(rmse_CRE, 4)) + "  ")
-    f.write(str(round(rmse_COI, 4)) + "  ")
-
-    f.write("\n")
-    f.close()
-
-    info = np.loadtxt(info_txt_ad, dtype=str)
-    columns = info[0, :]
-    values = info[1:, :]
-    values_sort = sort_values(values)
-    info = np.vstack([columns.reshape(1, -1), values_sort])
-    np.savetxt(info_txt_ad, info, fmt='%s')
-    info_df = pd.DataFrame(values_sort, columns=columns)
-    info_df.to_csv(info_df_ad)
+    db_ad = store.get_db(save_ad)
+    metric = {"MaI": (rmse_MaI, r2_MaI), "EQG": (rmse_EQG, r2_EQG), "Mag": (rmse_Mag, r2_Mag),
+              "CRE": (rmse_CRE, r2_CRE), "COI": (rmse_COI, r2_COI)}
+    store.save_runs(db_ad, {style: {"r2_test": r2, "rmse_test": rmse} for style, (rmse, r2) in metric.items()},
+                    sm_scale, name_eq, m_train, m_test, {"test": "robust_natural", "snr": snr})
+    info_df = store.pivot_runs(db_ad, "snr", list(metric.keys()), test="robust_natural", sm_scale=sm_scale,
+                               name=name_eq, m_train=m_train)
+    info_df.to_csv(osp.join(save_ad, "robust_mag_result_{}_{}_{}.csv".format(sm_scale, name_eq, m)))
 
 # idx = 1
 # plt.figure()
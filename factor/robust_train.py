@@ -13,13 +13,7 @@ import sys
 sys.path.append('..')
 import func.process as pro
 import func.net as net
-
-
-def sort_values(values):
-    idx = values[:, 0].astype(int)
-    idx_sort = np.argsort(idx)
-    values_sort = values[idx_sort, :]
-    return values_sort
+import func.store as store
 
 
 def get_noise_one_natural(x, n, snr):
@@ -124,9 +118,11 @@ print("\nEQGraphNet, training {}".format("-" * 30))
 EQG = net.EQGraphNet("gcn", "ts_un", 1, device).to(device)
 optimizer = torch.optim.Adam(EQG.parameters(), lr=0.0005, weight_decay=0.0005)
 
-train_pred, train_true, test_pred, test_true = [], [], [], []
+metric_train = net.StreamMetric(device, len(train_loader.dataset))
+metric_test = net.StreamMetric(device, len(test_loader.dataset))
 for epoch in range(epochs):
     loss_train_all, loss_test_all = 0, 0
+    metric_train.reset(), metric_test.reset()
     for item_train, (x_train, y_train, _) in enumerate(train_loader):
         x_train, y_train = x_train.to(device), y_train.to(device)
 
@@ -137,14 +133,7 @@ for epoch in range(epochs):
         optimizer.step()
         loss_train_all = loss_train_all + loss_train.item()
 
-        train_pred_one = output_train.detach().cpu().numpy()
-        train_true_one = y_train.detach().cpu().numpy()
-        if item_train == 0:
-            train_pred = train_pred_one
-            train_true = train_true_one
-        else:
-            train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-            train_true = np.concatenate((train_true, train_true_one), axis=0)
+        metric_train.update(y_train, output_train)
 
     for item_test, (x_test, y_test, _) in enumerate(test_loader):
         x_test, y_test = x_test.to(device), y_test.to(device)
@@ -153,19 +142,10 @@ for epoch in range(epochs):
         loss_test = criterion(output_test, y_test)
         loss_test_all = loss_test_all + loss_test.item()
 
-        test_pred_one = output_test.detach().cpu().numpy()
-        test_true_one = y_test.detach().cpu().numpy()
-        if item_test == 0:
-            test_pred = test_pred_one
-            test_true = test_true_one
-        else:
-            test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-            test_true = np.concatenate((test_true, test_true_one), axis=0)
+        metric_test.update(y_test, output_test)
 
-    rmse_train_EQG = net.cal_rmse_one_arr(train_true, train_pred)
-    rmse_test_EQG = net.cal_rmse_one_arr(test_true, test_pred)
-    r2_train_EQG = net.cal_r2_one_arr(train_true, train_pred)
-    r2_test_EQG = net.cal_r2_one_arr(test_true, test_pred)
+    rmse_train_EQG, r2_train_EQG = metric_train.result()
+    rmse_test_EQG, r2_test_EQG = metric_test.result()
     print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.8f}  R2_Test: {:.8f}".
           format(epoch, rmse_train_EQG, rmse_test_EQG, r2_train_EQG, r2_test_EQG))
 
@@ -177,9 +157,11 @@ print("\nMagNet, training {}".format("-" * 30))
 Mag = net.MagNet().to(device)
 optimizer = torch.optim.Adam(Mag.parameters(), lr=0.0005, weight_decay=0.0005)
 
-train_pred, train_true, test_pred, test_true = [], [], [], []
+metric_train = net.StreamMetric(device, len(train_loader.dataset))
+metric_test = net.StreamMetric(device, len(test_loader.dataset))
 for epoch in range(epochs):
     loss_train_all, loss_test_all = 0, 0
+    metric_train.reset(), metric_test.reset()
     for item_train, (x_train, y_train, _) in enumerate(train_loader):
         x_train, y_train = x_train.to(device), y_train.to(device)
 
@@ -190,14 +172,7 @@ for epoch in range(epochs):
         optimizer.step()
         loss_train_all = loss_train_all + loss_train.item()
 
-        train_pred_one = output_train.detach().cpu().numpy()
-        train_true_one = y_train.detach().cpu().numpy()
-        if item_train == 0:
-            train_pred = train_pred_one
-            train_true = train_true_one
-        else:
-            train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-            train_true = np.concatenate((train_true, train_true_one), axis=0)
+        metric_train.update(y_train, output_train)
 
     for item_test, (x_test, y_test, _) in enumerate(test_loader):
         x_test, y_test = x_test.to(device), y_test.to(device)
@@ -206,19 +181,10 @@ for epoch in range(epochs):
         loss_test = criterion(output_test, y_test)
         loss_test_all = loss_test_all + loss_test.item()
 
-        test_pred_one = output_test.detach().cpu().numpy()
-        test_true_one = y_test.detach().cpu().numpy()
-        if item_test == 0:
-            test_pred = test_pred_one
-            test_true = test_true_one
-        else:
-            test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-            test_true = np.concatenate((test_true, test_true_one), axis=0)
+        metric_test.update(y_test, output_test)
 
-    rmse_train_Mag = net.cal_rmse_one_arr(train_true, train_pred)
-    rmse_test_Mag = net.cal_rmse_one_arr(test_true, test_pred)
-    r2_train_Mag = net.cal_r2_one_arr(train_true, train_pred)
-    r2_test_Mag = net.cal_r2_one_arr(test_true, test_pred)
+    rmse_train_Mag, r2_train_Mag = metric_train.result()
+    rmse_test_Mag, r2_test_Mag = metric_test.result()
     print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.8f}  R2_Test: {:.8f}".
           format(epoch, rmse_train_Mag, rmse_test_Mag, r2_train_Mag, r2_test_Mag))
 
@@ -229,9 +195,11 @@ print("\nConvNetQuake_INGV, training {}".format("-" * 30))
 CNQI = net.ConvNetQuakeINGV().to(device)
 optimizer = torch.optim.Adam(CNQI.parameters(), lr=0.0005, weight_decay=0.0005)
 
-train_pred, train_true, test_pred, test_true = [], [], [], []
+metric_train = net.StreamMetric(device, len(train_loader.dataset))
+metric_test = net.StreamMetric(device, len(test_loader.dataset))
 for epoch in range(epochs):
     loss_train_all, loss_test_all = 0, 0
+    metric_train.reset(), metric_test.reset()
     for item_train, (x_train, y_train, _) in enumerate(train_loader):
         x_train, y_train = x_train.to(device), y_train.to(device)
 
@@ -242,14 +210,7 @@ for epoch in range(epochs):
         optimizer.step()
         loss_train_all = loss_train_all + loss_train.item()
 
-        train_pred_one = output_train.detach().cpu().numpy()
-        train_true_one = y_train.detach().cpu().numpy()
-        if item_train == 0:
-            train_pred = train_pred_one
-            train_true = train_true_one
-        else:
-            train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-            train_true = np.concatenate((train_true, train_true_one), axis=0)
+        metric_train.update(y_train, output_train)
 
     for item_test, (x_test, y_test, _) in enumerate(test_loader):
         x_test, y_test = x_test.to(device), y_test.to(device)
@@ -258,19 +219,10 @@ for epoch in range(epochs):
         loss_test = criterion(output_test, y_test)
         loss_test_all = loss_test_all + loss_test.item()
 
-        test_pred_one = output_test.detach().cpu().numpy()
-        test_true_one = y_test.detach().cpu().numpy()
-        if item_test == 0:
-            test_pred = test_pred_one
-            test_true = test_true_one
-        else:
-            test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-            test_true = np.concatenate((test_true, test_true_one), axis=0)
+        metric_test.update(y_test, output_test)
 
-    rmse_train_CNQI = net.cal_rmse_one_arr(train_true, train_pred)
-    rmse_test_CNQI = net.cal_rmse_one_arr(test_true, test_pred)
-    r2_train_CNQI = net.cal_r2_one_arr(train_true, train_pred)
-    r2_test_CNQI = net.cal_r2_one_arr(test_true, test_pred)
+    rmse_train_CNQI, r2_train_CNQI = metric_train.result()
+    rmse_test_CNQI, r2_test_CNQI = metric_test.result()
     print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.8f}  R2_Test: {:.8f}".
           format(epoch, rmse_train_CNQI, rmse_test_CNQI, r2_train_CNQI, r2_test_CNQI))
 
@@ -317,9 +269,11 @@ print("\nCREIME, training {}".format("-" * 30))
 CRE = net.CREIME().to(device)
 optimizer = torch.optim.Adam(CRE.parameters(), lr=0.0005, weight_decay=0.0005)
 
-train_pred, train_true, test_pred, test_true = [], [], [], []
+metric_train = net.StreamMetric(device, len(train_loader_CRE.dataset))
+metric_test = net.StreamMetric(device, len(test_loader_CRE.dataset))
 for epoch in range(epochs):
     loss_train_all, loss_test_all = 0, 0
+    metric_train.reset(), metric_test.reset()
     for item_train, (x_train, y_train, sm_train, _) in enumerate(train_loader_CRE):
         x_train, y_train = x_train.to(device), y_train.to(device)
 
@@ -330,14 +284,7 @@ for epoch in range(epochs):
         optimizer.step()
         loss_train_all = loss_train_all + loss_train.item()
 
-        train_pred_one = cal_mag(output_train).detach().cpu().numpy()
-        train_true_one = sm_train.detach().cpu().numpy()
-        if item_train == 0:
-            train_pred = train_pred_one
-            train_true = train_true_one
-        else:
-            train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-            train_true = np.concatenate((train_true, train_true_one), axis=0)
+        metric_train.update(sm_train, cal_mag(output_train))
 
     for item_test, (x_test, y_test, sm_test, _) in enumerate(test_loader_CRE):
         x_test, y_test = x_test.to(device), y_test.to(device)
@@ -346,53 +293,30 @@ for epoch in range(epochs):
         loss_test = criterion(output_test, y_test)
         loss_test_all = loss_test_all + loss_test.item()
 
-        test_pred_one = cal_mag(output_test).detach().cpu().numpy()
-        test_true_one = sm_test.detach().cpu().numpy()
-        if item_test == 0:
-            test_pred = test_pred_one
-            test_true = test_true_one
-        else:
-            test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-            test_true = np.concatenate((test_true, test_true_one), axis=0)
+        metric_test.update(sm_test, cal_mag(output_test))
 
-    rmse_train_CRE = net.cal_rmse_one_arr(train_true, train_pred)
-    rmse_test_CRE = net.cal_rmse_one_arr(test_true, test_pred)
-    r2_train_CRE = net.cal_r2_one_arr(train_true, train_pred)
-    r2_test_CRE = net.cal_r2_one_arr(test_true, test_pred)
+    rmse_train_CRE, r2_train_CRE = metric_train.result()
+    rmse_test_CRE, r2_test_CRE = metric_test.result()
     print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.8f}  R2_Test: {:.8f}".
           format(epoch, rmse_train_CRE, rmse_test_CRE, r2_train_CRE, r2_test_CRE))
 
 """
 save robust result
 """
+# one run per model in the results store of save_ad, all snr exported as csv (one row per snr)
 if save_txt:
-    info_txt_ad = osp.join(save_ad, "robust_train_result_{}_{}_{}.txt".format(sm_scale, name_eq, m))
-    info_df_ad = osp.join(save_ad, "robust_train_result_{}_{}_{}.csv".format(sm_scale, name_eq, m))
-    f = open(info_txt_ad, 'a')
-    if osp.getsize(info_txt_ad) == 0:
-        f.write("snr r2_EQG r2_MagNet r2_CREIME r2_CNQI rmse_EQG rmse_MagNet rmse_CREIME rmse_CNQI\n")
-    f.write(str(snr) + "  ")
-
-    f.write(str(round(r2_test_EQG, 4)) + "  ")
-    f.write(str(round(r2_test_Mag, 4)) + "  ")
-    f.write(str(round(r2_test_CRE, 4)) + "  ")
-    f.write(str(round(r2_test_CNQI, 4)) + "  ")
-    f.write(str(round(rmse_test_EQG, 4)) + "  ")
-    f.write(str(round(rmse_test_Mag, 4)) + "  ")
-    f.write(str(round(rmse_test_CRE, 4)) + "  ")
-    f.write(str(round(rmse_test_CNQI, 4)) + "  ")
-
-    f.write("\n")
-    f.close()
-
-    info = np.loadtxt(info_txt_ad, dtype=str)
-    columns = info[0, :]
-    values = info[1:, :]
-    values_sort = sort_values(values)
-    info = np.vstack([columns.reshape(1, -1), values_sort])
-    np.savetxt(info_txt_ad, info, fmt='%s')
-    info_df = pd.DataFrame(values_sort, columns=columns)
-    info_df.to_csv(info_df_ad)
+    db_ad = store.get_db(save_ad)
+    metrics = {"EQG": (r2_test_EQG, r2_train_EQG, rmse_test_EQG, rmse_train_EQG),
+               "MagNet": (r2_test_Mag, r2_train_Mag, rmse_test_Mag, rmse_train_Mag),
+               "CREIME": (r2_test_CRE, r2_train_CRE, rmse_test_CRE, rmse_train_CRE),
+               "CNQI": (r2_test_CNQI, r2_train_CNQI, rmse_test_CNQI, rmse_train_CNQI)}
+    metrics = {style: dict(zip(["r2_test", "r2_train", "rmse_test", "rmse_train"], one))
+               for style, one in metrics.items()}
+    store.save_runs(db_ad, metrics, sm_scale, name_eq, m_train, m_test,
+                    {"test": "robust_train", "snr": snr, "epochs": epochs, "batch_size": batch_size})
+    info_df = store.pivot_runs(db_ad, "snr", list(metrics.keys()), test="robust_train", sm_scale=sm_scale,
+                               name=name_eq, m_train=m_train)
+    info_df.to_csv(osp.join(save_ad, "robust_train_result_{}_{}_{}.csv".format(sm_scale, name_eq, m)))
 
 
 print()
@@ -0,0 +1,60 @@
+"""
+Benchmark of the spatial index (func/spatial.py) vs. linear scans, for stations and events
+"""
+import numpy as np
+import time
+import sys
+sys.path.append('..')
+import func.spatial as spatial
+
+
+nums = [100000, 1000000]            # number of events
+num_query = 1000
+k = 10
+radius = 50                         # km
+box = (40, 42, 12, 14)              # lat_min, lat_max, lon_min, lon_max
+
+np.random.seed(100)
+for num in nums:
+    lat, lon = np.random.uniform(35, 45, num), np.random.uniform(10, 20, num)
+    q_lat, q_lon = np.random.uniform(35, 45, num_query), np.random.uniform(10, 20, num_query)
+
+    t_begin = time.time()
+    index = spatial.GeoIndex(lat, lon)
+    t_build = time.time() - t_begin
+
+    # nearest-k
+    t_begin = time.time()
+    _, idx_tree = index.nearest(q_lat, q_lon, k)
+    t_tree = time.time() - t_begin
+    t_begin = time.time()
+    idx_scan = np.array([np.argsort(spatial.haversine(q_lat[i], q_lon[i], lat, lon))[:k] for i in range(num_query)])
+    t_scan = time.time() - t_begin
+    if not np.array_equal(np.sort(idx_tree, axis=1), np.sort(idx_scan, axis=1)):
+        raise ValueError("Results of the spatial index and the linear scan are not the same!")
+    print("{} events, {} queries, nearest {}:  index = {:.3f}s (build {:.3f}s)  scan = {:.3f}s  speedup = {:.0f}x".
+          format(num, num_query, k, t_tree, t_build, t_scan, t_scan / t_tree))
+
+    # within radius
+    t_begin = time.time()
+    idx_tree = index.within(q_lat, q_lon, radius)
+    t_tree = time.time() - t_begin
+    t_begin = time.time()
+    idx_scan = [np.argwhere(spatial.haversine(q_lat[i], q_lon[i], lat, lon) <= radius).reshape(-1) for i in range(num_query)]
+    t_scan = time.time() - t_begin
+    print("{} events, {} queries, within {} km:  index = {:.3f}s  scan = {:.3f}s  speedup = {:.0f}x".
+          format(num, num_query, radius, t_tree, t_scan, t_scan / t_tree))
+
+    # bounding box
+    t_begin = time.time()
+    for _ in range(num_query):
+        idx_tree = index.box(*box)
+    t_tree = time.time() - t_begin
+    t_begin = time.time()
+    for _ in range(num_query):
+        idx_scan = np.argwhere((lat >= box[0]) & (lat <= box[1]) & (lon >= box[2]) & (lon <= box[3])).reshape(-1)
+    t_scan = time.time() - t_begin
+    if not np.array_equal(idx_tree, idx_scan):
+        raise ValueError("Results of the spatial index and the linear scan are not the same!")
+    print("{} events, {} queries, box:  index = {:.3f}s  scan = {:.3f}s  speedup = {:.0f}x".
+          format(num, num_query, t_tree, t_scan, t_scan / t_tree))
@@ -0,0 +1,67 @@
+"""
+Benchmark of incremental inference on sliding windows (func/stream.py) vs. recomputing every window
+the trained checkpoint of EQGraphNet is used, as the reuse of gnn stages depends on the trained edge weights, if it is
+not found, fresh weights with random edge weights stand in for it, fresh models (uniform edge weights) of weighted and
+unweighted gnn styles are run as well, so the results are always compared
+EqDetect is not run, only its cnn1 can be reused, so StreamNet passes its windows to the model directly
+"""
+import torch
+import os.path as osp
+import time
+import warnings
+import sys
+sys.path.append('..')
+import func.net as net
+import func.stream as stream
+
+
+device = "cuda:1" if torch.cuda.is_available() else "cpu"
+adm_style = "ts_un"
+k = 1
+# (model, gnn_style, checkpoint), fresh weights if checkpoint is None
+models = [("EQGraphNet", "gcn", "../result/mag_predict/EQGraphNet/model_ml_chunk2_150000_50000.pkl"),
+          ("EQGraphNet", "gcn", None), ("EQGraphNet", "unimp", None), ("EQGraphNet", "gin", None)]
+hops = [128, 512, 1024, 4096]        # samples, a hop of 2^m reuses the first m stages at most
+num_sta = 16                         # stations streamed together
+duration = 30000                     # samples of continuous data
+repeat = 3                           # the shortest time of the repeats is taken
+
+torch.manual_seed(100)
+x = torch.randn(num_sta, 3, duration).to(device)
+for style, gnn_style, model_ad in models:
+    model = getattr(net, style)(gnn_style, adm_style, k, device).to(device)
+    weights = "fresh"
+    if model_ad is not None and osp.exists(model_ad):
+        model.load_state_dict(torch.load(model_ad, map_location=device))
+        weights = "trained"
+    elif model_ad is not None:
+        # trained edge weights are not uniform
+        print("{} doesn't exist, random edge weights are used".format(model_ad))
+        with torch.no_grad():
+            for s in range(1, 11):
+                ew = getattr(model, "ew{}".format(s))
+                ew.copy_(torch.rand_like(ew) + 0.5)
+        weights = "random edge weights"
+    model.eval()
+    for hop in hops:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            tool = stream.StreamNet(model, hop)
+        t_full, t_stream = [], []
+        for _ in range(repeat):
+            t_begin = time.time()
+            out_full = stream.run_full(model, x, hop)
+            t_full.append(time.time() - t_begin)
+            t_begin = time.time()
+            out_stream = tool.run(x)
+            t_stream.append(time.time() - t_begin)
+        t_full, t_stream = min(t_full), min(t_stream)
+
+        err = (out_stream - out_full).abs().max().item()
+        if err > 1e-4:
+            raise ValueError("Results of incremental and full inference are not the same, error {:.2e}!".format(err))
+        reused = 0 if tool.full else tool.num_stage
+        print("{} ({}, {}), hop = {}, {} stages reused, {} windows of {} stations:  full = {:.3f}s  incremental = "
+              "{:.3f}s  speedup = {:.2f}x  max error = {:.1e}".format(style, gnn_style, weights, hop, reused,
+                                                                      out_full.shape[1], num_sta, t_full, t_stream,
+                                                                      t_full / t_stream, err))
@@ -0,0 +1,39 @@
+"""
+Benchmark of aligning trace names across results, searching one by one vs. hash join (func/output.py)
+"""
+import numpy as np
+import time
+import sys
+sys.path.append('..')
+import func.output as out
+
+
+# the former implementation of output.judge_idx, kept here for comparison
+def search_idx(trace_ref, trace):
+    idx = []
+    for trace_i in trace:
+        idx.append(np.argwhere(trace_ref == trace_i).reshape(-1)[0])
+    return np.array(idx)
+
+
+nums = [50000, 200000]
+num_model = 5                       # number of results aligned to the first one
+num_search = 2000                   # searching one by one is too slow, time a part of it and extrapolate
+
+np.random.seed(100)
+for num in nums:
+    trace = np.array(["T{:07d}_EV".format(i) for i in range(num)], dtype=object)
+    trace_models = [trace[np.random.permutation(num)] for _ in range(num_model)]
+
+    t_begin = time.time()
+    idx_all = out.judge_idx(trace, *trace_models)
+    t_join = time.time() - t_begin
+
+    t_begin = time.time()
+    idx_search = search_idx(trace_models[0], trace[:num_search])
+    t_search = (time.time() - t_begin) * num / num_search * num_model
+
+    if not np.array_equal(idx_search, idx_all[1][:num_search]):
+        raise ValueError("Results of hash join and searching are not the same!")
+    print("{} traces x {} models:  hash join = {:.3f}s  searching = {:.1f}s (extrapolated)  speedup = {:.0f}x".
+          format(num, num_model, t_join, t_search, t_search / t_join))
@@ -8,12 +8,12 @@ import matplotlib.pyplot as plt
 import os
 import os.path as osp
 from torch.utils.data import DataLoader
-from sklearn.manifold import TSNE
 import sys
 sys.path.append('..')
 import func.process as pro
 import func.net as net
 import func.draw as draw
+import func.reduce as red
 from func.net import EQGraphNet
 
 
@@ -27,17 +27,62 @@ def tran_ew(*args):
     return tuple(outs)
 
 
+def to_np(x):
+    if torch.is_tensor(x):
+        return x.detach().cpu().numpy()
+    return np.asarray(x)
+
+
+# mean weight of the edges starting from each node, scatter-mean by bincount
 def edge(ei, ew):
-    ew, ei = ew.detach().cpu().numpy(), ei.detach().cpu().numpy()
-    num_nodes = np.unique(ei[0, :]).shape[0]
-    ed = []
-    for i in range(num_nodes):
-        idx = np.argwhere(ei[0, :] == i).reshape(-1)
-        # a_ws = np.mean(np.abs(e_w[idx]))
-        ed_i = np.mean(ew[idx])
-        ed.append(ed_i)
-    ed = np.array(ed)
-    return ed
+    ew, ei = to_np(ew).reshape(-1), to_np(ei)
+    num_nodes = int(ei[0, :].max()) + 1
+    ew_sum = np.bincount(ei[0, :], weights=ew, minlength=num_nodes)
+    ew_num = np.bincount(ei[0, :], minlength=num_nodes)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return ew_sum / ew_num
+
+
+# per-node edge weights of all gnn layers in one pass, the nodes of layer l are shifted by the nodes of former layers
+# eis, ews: lists of edge_index / edge_weight, return DataFrame (layer, node, weight)
+def edge_layers(eis, ews):
+    eis, ews = [to_np(ei) for ei in eis], [to_np(ew).reshape(-1) for ew in ews]
+    num_nodes = [int(ei[0, :].max()) + 1 for ei in eis]
+    offset = np.concatenate([[0], np.cumsum(num_nodes)[:-1]])
+    src = np.concatenate([ei[0, :] + offset[i] for i, ei in enumerate(eis)])
+    ew = np.concatenate(ews)
+    ew_sum = np.bincount(src, weights=ew, minlength=sum(num_nodes))
+    ew_num = np.bincount(src, minlength=sum(num_nodes))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = ew_sum / ew_num
+    layer = np.repeat(np.arange(1, len(eis) + 1), num_nodes)
+    node = np.concatenate([np.arange(n) for n in num_nodes])
+    return pd.DataFrame({"layer": layer, "node": node, "weight": weight})
+
+
+def get_ei_ew(model, num_layer=10):
+    eis = [getattr(model, "ei{}".format(i)) for i in range(1, num_layer + 1)]
+    ews = [getattr(model, "ew{}".format(i)) for i in range(1, num_layer + 1)]
+    return eis, ews
+
+
+# compare the learned edge weights of several checkpoints of EQGraphNet, edge_index is the same for all checkpoints,
+# so only ew1 ~ ew10 are read from each state_dict, return DataFrame (ckpt, layer, node, weight)
+def edge_ckpt(model, ckpt_ads, num_layer=10):
+    eis, _ = get_ei_ew(model, num_layer)
+    eds = []
+    for ckpt_ad in ckpt_ads:
+        state = torch.load(ckpt_ad, map_location="cpu")
+        ed = edge_layers(eis, [state["ew{}".format(i)] for i in range(1, num_layer + 1)])
+        ed.insert(0, "ckpt", osp.basename(ckpt_ad))
+        eds.append(ed)
+    return pd.concat(eds, ignore_index=True)
+
+
+# importance of each layer: mean and std of the per-node weights
+def layer_importance(ed):
+    keys = ["ckpt", "layer"] if "ckpt" in ed.columns else ["layer"]
+    return ed.groupby(keys)["weight"].agg(["mean", "std", "min", "max"]).reset_index()
 
 
 device = "cuda:1" if torch.cuda.is_available() else "cpu"
@@ -49,6 +94,7 @@ train_ratio = 0.75
 m = 200000                           # number of samples
 sm_scale = "ml"                     # operation scale
 random = False
+analyse_edge = False
 re_ad = "../result/mag_predict/EQGraphNet"
 save_ad = "xai_result"
 
@@ -86,25 +132,17 @@ data_test, sm_test, df_test, _ = pro.remain_sm_scale(data_test, df_test, sm_test
 # test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=True)
 
 """
-Layers
+Layers, learned edge weights of all gnn layers (and of all checkpoints in ckpt_ads)
 """
-# model = EQGraphNet(gnn_style, adm_style, k, device).to(device)
-# model.load_state_dict(torch.load(osp.join(re_ad, "model_{}_{}_{}_{}.pkl".format(sm_scale, name, m_train, m_test))))
-#
-# c1, c2, c3, c4, c5, c6, c7, c8, c9, c10, c11 = model.cnn1, model.cnn2, model.cnn3, model.cnn4, model.cnn5, model.cnn6, \
-#                                                model.cnn7, model.cnn8, model.cnn9, model.cnn10, model.cnn11
-# g1, g2, g3, g4, g5, g6, g7, g8, g9, g10 = model.gnn1, model.gnn2, model.gnn3, model.gnn4, model.gnn5, model.gnn6, \
-#                                           model.gnn7, model.gnn8, model.gnn9, model.gnn10
-# ei1, ei2, ei3, ei4, ei5, ei6, ei7, ei8, ei9, ei10 = model.ei1, model.ei2, model.ei3, model.ei4, model.ei5, model.ei6, \
-#                                                     model.ei7, model.ei8, model.ei9, model.ei10
-# ew1, ew2, ew3, ew4, ew5, ew6, ew7, ew8, ew9, ew10 = model.ew1, model.ew2, model.ew3, model.ew4, model.ew5, model.ew6, \
-#                                                     model.ew7, model.ew8, model.ew9, model.ew10
-# linear, relu = model.linear, model.relu
-#
-# ew1 = edge(ei1, ew1)
-#
-# plt.figure()
-# plt.plot(ew1)
+if analyse_edge:
+    model = EQGraphNet(gnn_style, adm_style, k, device).to(device)
+    ckpt_ads = [osp.join(re_ad, "model_{}_{}_{}_{}.pkl".format(sm_scale, name, m_train, m_test))]
+    ed = edge_ckpt(model, ckpt_ads)
+    print(layer_importance(ed).to_string(index=False))
+
+    ed_1 = ed[(ed["ckpt"] == osp.basename(ckpt_ads[0])) & (ed["layer"] == 1)]
+    plt.figure()
+    plt.plot(ed_1["node"].values, ed_1["weight"].values)
 
 """
 Decomposition
@@ -115,9 +153,8 @@ if osp.exists(s_ad):
 else:
     s_train, s_test = data_train.numpy(), data_test.numpy()
     s = np.concatenate((s_train, s_test), axis=0)
-    s = s.reshape(s.shape[0], -1)
-    tsne = TSNE(n_components=2)
-    s_dc = tsne.fit_transform(s)
+    s_dc, info = red.reduce(s, "tsne", 2)
+    red.print_info(info)
     np.save(s_ad, s_dc)
 
 plt.figure()
@@ -13,6 +13,7 @@ sys.path.append('..')
 import func.process as pro
 import func.net as net
 import func.draw as draw
+import func.store as store
 
 
 device = "cuda:1" if torch.cuda.is_available() else "cpu"
@@ -86,12 +87,13 @@ else:
 criterion = torch.nn.MSELoss().to(device)
 optimizer = torch.optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)
 
-train_pred, train_true, test_pred, test_true = [], [], [], []
-train_trace, test_trace = [], []
-train_pos, test_pos = [], []
+metric_train = net.StreamMetric(device, len(train_loader.dataset), save_np)
+metric_test = net.StreamMetric(device, len(test_loader.dataset), save_np)
 train_loss, test_loss = [], []
 for epoch in range(epochs):
     loss_train_all, loss_test_all = 0, 0
+    metric_train.reset(), metric_test.reset()
+    train_trace, train_pos, test_trace, test_pos = [], [], [], []
     for item_train, (x_train, y_train, pos_train, trace_train, _) in enumerate(train_loader):
         x_train, y_train = x_train.to(device), y_train.to(device)
 
@@ -102,20 +104,10 @@ for epoch in range(epochs):
         optimizer.step()
         loss_train_all = loss_train_all + loss_train.item()
 
-        train_pred_one = output_train.detach().cpu().numpy()
-        train_true_one = y_train.detach().cpu().numpy()
-        train_trace_one = np.array([trace_train]).reshape(-1, 1)
-        train_pos_one = pos_train.numpy()
-        if item_train == 0:
-            train_pred = train_pred_one
-            train_true = train_true_one
-            train_trace = train_trace_one
-            train_pos = train_pos_one
-        else:
-            train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-            train_true = np.concatenate((train_true, train_true_one), axis=0)
-            train_trace = np.concatenate((train_trace, train_trace_one), axis=0)
-            train_pos = np.concatenate((train_pos, train_pos_one), axis=0)
+        metric_train.update(y_train, output_train)
+        if save_np:
+            train_trace.append(np.array([trace_train]).reshape(-1, 1))
+            train_pos.append(pos_train.numpy())
 
     for item_test, (x_test, y_test, pos_test, trace_test, _) in enumerate(test_loader):
         x_test, y_test = x_test.to(device), y_test.to(device)
@@ -124,25 +116,13 @@ for epoch in range(epochs):
         loss_test = criterion(output_test, y_test)
         loss_test_all = loss_test_all + loss_test.item()
 
-        test_pred_one = output_test.detach().cpu().numpy()
-        test_true_one = y_test.detach().cpu().numpy()
-        test_trace_one = np.array([trace_test]).reshape(-1, 1)
-        test_pos_one = pos_test.numpy()
-        if item_test == 0:
-            test_pred = test_pred_one
-            test_true = test_true_one
-            test_trace = test_trace_one
-            test_pos = test_pos_one
-        else:
-            test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-            test_true = np.concatenate((test_true, test_true_one), axis=0)
-            test_trace = np.concatenate((test_trace, test_trace_one), axis=0)
-            test_pos = np.concatenate((test_pos, test_pos_one), axis=0)
-
-    rmse_train = net.cal_rmse_one_arr(train_true, train_pred)
-    rmse_test = net.cal_rmse_one_arr(test_true, test_pred)
-    r2_train = net.cal_r2_one_arr(train_true, train_pred)
-    r2_test = net.cal_r2_one_arr(test_true, test_pred)
+        metric_test.update(y_test, output_test)
+        if save_np:
+            test_trace.append(np.array([trace_test]).reshape(-1, 1))
+            test_pos.append(pos_test.numpy())
+
+    rmse_train, r2_train = metric_train.result()
+    rmse_test, r2_test = metric_test.result()
     train_loss.append((rmse_train ** 2))
     test_loss.append((rmse_test ** 2))
     if (0.885 < r2_test < 0.89 and model_style == "EQGraphNet*" and sm_scale_name == "ml") or (0.88 < r2_test < 0.89 and model_style == "EQLSTMNet"):
@@ -150,36 +130,27 @@ for epoch in range(epochs):
     print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.4f}  R2_Test: {:.4f}".
           format(epoch, rmse_train, rmse_test, r2_train, r2_test))
 
-pro.save_result(re_ad, model, save_np, save_model, save_loss, sm_scale, name, m_train, m_test,
-                train_true, train_pred, train_trace, train_pos, train_loss,
-                test_true, test_pred, test_trace, test_pos, test_loss)
-
-error_train = train_pred - train_true
-error_test = test_pred - test_true
-e_m_train, e_m_test = np.mean(error_train), np.mean(error_test)
-e_std_train, e_std_test = np.std(error_train), np.std(error_test)
+train_true, train_pred = metric_train.get_np()
+test_true, test_pred = metric_test.get_np()
+if save_np:
+    train_trace, train_pos = np.concatenate(train_trace, axis=0), np.concatenate(train_pos, axis=0)
+    test_trace, test_pos = np.concatenate(test_trace, axis=0), np.concatenate(test_pos, axis=0)
+e_m_train, e_std_train = metric_train.error()
+e_m_test, e_std_test = metric_test.error()
 print("Train: error_mean: {:.4f}  error_std: {:.4f}".format(e_m_train, e_std_train))
 print("Test:  error_mean: {:.4f}  error_std: {:.4f}".format(e_m_test, e_std_test))
 
+# the run of model_style is kept in the results store of save_ad, all model_style exported as csv
+pro.save_result(re_ad, model, save_np, save_model, save_loss, sm_scale, name, m_train, m_test,
+                train_true, train_pred, train_trace, train_pos, train_loss,
+                test_true, test_pred, test_trace, test_pos, test_loss,
+                config={"model_style": model_style, "epochs": epochs},
+                metrics={"r2_test": r2_test, "rmse_test": rmse_test, "r2_train": r2_train, "rmse_train": rmse_train,
+                         "e_mean": e_m_test, "e_std": e_std_test}, save_run=save_txt)
 if save_txt:
-    info_txt_ad = osp.join(save_ad, "xai_model_result_{}_{}.txt".format(name, m))
-    info_df_ad = osp.join(save_ad, "xai_model_result_{}_{}.csv".format(name, m))
-    f = open(info_txt_ad, 'a')
-    if osp.getsize(info_txt_ad) == 0:
-        f.write("model_style r2 rmse e_m e_std sm_scale epoch name m_train m_test\n")
-    f.write(str(model_style) + "  ")
-    f.write(str(round(r2_test, 4)) + "  ")
-    f.write(str(round(rmse_test, 4)) + "  ")
-    f.write(str(round(e_m_test, 4)) + "  ")
-    f.write(str(round(e_std_test, 4)) + "  ")
-    f.write(str(sm_scale_name + "  "))
-    f.write(str(epochs) + "  ")
-    f.write(str(name) + "  ")
-    f.write(str(m_train) + "  ")
-    f.write(str(m_test) + "  ")
-
-    f.write("\n")
-    f.close()
+    info_df = store.pivot_runs(store.get_db(save_ad), "sm_scale", model_styles,
+                               ("r2_test", "rmse_test", "e_mean", "e_std"), name=name, m_train=m_train)
+    info_df.to_csv(osp.join(save_ad, "xai_model_result_{}_{}.csv".format(name, m)))
 
 print()
 plt.show()
@@ -0,0 +1,156 @@
+"""
+Content-addressed cache for derived analysis artifacts
+the key of one result is the hash of the function code and all of its inputs (arrays are fingerprinted by content),
+only the code of the decorated function is hashed by itself, the functions it calls are given by deps (or a version
+string bumped by hand), results are stored in a size-bounded directory with LRU eviction
+"""
+import torch
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import os
+import os.path as osp
+import pickle
+import hashlib
+import inspect
+import functools
+
+CACHE_DIR = "../result/cache"           # relative to the scripts, which are run from their own folders
+MAX_SIZE = 20 * 1024 ** 3               # bytes, the least recently used results are removed beyond it
+
+
+def update_hash(h, value):
+    if torch.is_tensor(value):
+        value = value.detach().cpu().numpy()
+    if isinstance(value, np.ndarray):
+        h.update("ndarray{}{}".format(value.dtype, value.shape).encode())
+        if value.dtype == object:
+            h.update(pd.util.hash_array(value.reshape(-1)).tobytes())
+        else:
+            h.update(np.ascontiguousarray(value).view(np.uint8).reshape(-1))
+    elif sp.issparse(value):
+        value = sp.csr_matrix(value)
+        h.update("sparse{}".format(value.shape).encode())
+        for one in [value.data, value.indices, value.indptr]:
+            update_hash(h, one)
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update("{}{}".format(type(value).__name__, value.shape).encode())
+        if isinstance(value, pd.DataFrame):
+            update_hash(h, list(value.columns))
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, dict):
+        h.update("dict{}".format(len(value)).encode())
+        for key in sorted(value.keys(), key=repr):
+            update_hash(h, key)
+            update_hash(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update("{}{}".format(type(value).__name__, len(value)).encode())
+        for one in value:
+            update_hash(h, one)
+    else:
+        h.update("{}:{!r}".format(type(value).__name__, value).encode())
+
+
+# files read by the function are identified by their size and modification time
+def update_hash_file(h, file_ad):
+    if osp.exists(file_ad):
+        stat = os.stat(file_ad)
+        h.update("{}:{}:{}".format(osp.abspath(file_ad), stat.st_size, stat.st_mtime_ns).encode())
+    else:
+        h.update("{}:missing".format(osp.abspath(file_ad)).encode())
+
+
+def get_source(func):
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        return func.__code__.co_code.hex()
+
+
+# code of the function and of the functions it depends on, together with an explicit version
+def code_version(func, deps=(), version=None):
+    h = hashlib.blake2b(digest_size=16)
+    for one in [func] + list(deps):
+        h.update("{}.{}:{}".format(one.__module__, one.__qualname__, get_source(one)).encode())
+    h.update("version:{}".format(version).encode())
+    return h.hexdigest()
+
+
+def get_key(func, code, params, files=None):
+    h = hashlib.blake2b(digest_size=20)
+    h.update("{}.{}:{}".format(func.__module__, func.__qualname__, code).encode())
+    update_hash(h, params)
+    if files is not None:
+        for file_ad in files:
+            update_hash_file(h, file_ad)
+    return h.hexdigest()
+
+
+def load(ad):
+    with open(ad, "rb") as f:
+        result = pickle.load(f)
+    os.utime(ad, None)                  # mark as recently used
+    return result
+
+
+def save(ad, result):
+    ad_tmp = "{}.{}.tmp".format(ad, os.getpid())
+    with open(ad_tmp, "wb") as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(ad_tmp, ad)
+
+
+# remove the least recently used results, until the directory is no larger than max_size, keep is never removed
+def evict(cache_dir, max_size, keep=None):
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(".pkl") and file_name != keep:
+            stat = os.stat(osp.join(cache_dir, file_name))
+            entries.append((stat.st_mtime, stat.st_size, file_name))
+    total = sum(entry[1] for entry in entries)
+    for _, size, file_name in sorted(entries):
+        if total <= max_size:
+            break
+        os.remove(osp.join(cache_dir, file_name))
+        total = total - size
+
+
+def clear(cache_dir=None):
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    if osp.exists(cache_dir):
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith(".pkl"):
+                os.remove(osp.join(cache_dir, file_name))
+
+
+# decorator, ignore: names of arguments which do not change the result (e.g. output folders)
+# files: function of the arguments, returning the files read by the function
+# deps: functions called by the function, version: bumped by hand when other code changing the result is modified
+def cached(ignore=(), files=None, deps=(), version=None):
+    def decorator(func):
+        sig = inspect.signature(func)
+        code = code_version(func, deps, version)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = {k: v for k, v in bound.arguments.items() if k not in ignore}
+            key = get_key(func, code, params, None if files is None else files(**bound.arguments))
+            if not osp.exists(CACHE_DIR):
+                os.makedirs(CACHE_DIR)
+            file_name = "{}_{}.pkl".format(func.__name__, key)
+            ad = osp.join(CACHE_DIR, file_name)
+            if osp.exists(ad):
+                try:
+                    return load(ad)
+                except (EOFError, pickle.UnpicklingError):        # broken by an interrupted run
+                    os.remove(ad)
+            result = func(*args, **kwargs)
+            save(ad, result)
+            evict(CACHE_DIR, MAX_SIZE, file_name)
+            return result
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,73 @@
+"""
+Detection-gated magnitude estimation, EqDetect runs on all windows and EQGraphNet only on the detected ones
+EqDetect is trained with noise labelled as 1 (see plot/result_detect.py), so its output is the probability of noise,
+and windows with the output below thre are taken as earthquakes
+detected windows are collected across batches, the magnitude model always runs on full batches
+"""
+import numpy as np
+import torch
+import time
+
+
+def detect(detector, x, thre=0.5):
+    p = detector(x)
+    return p, p < thre
+
+
+class Cascade:
+    def __init__(self, detector, estimator, device, thre=0.5, batch_size=256):
+        self.detector, self.estimator = detector.eval(), estimator.eval()
+        self.device, self.thre, self.batch_size = device, thre, batch_size
+
+    def estimate(self, x):
+        return self.estimator(x).float().cpu().numpy().reshape(-1)
+
+    # probability of noise of all windows, and magnitude of detected windows (nan for the others)
+    def run(self, loader):
+        num = len(loader.dataset)
+        p_all, mag_all = np.zeros(num), np.full(num, np.nan)
+        x_buf, idx_buf, num_buf, start = [], [], 0, 0
+        t_start = time.time()
+        with torch.inference_mode():
+            for batch in loader:
+                x = batch[0].to(self.device)
+                p, eq = detect(self.detector, x, self.thre)
+                p_all[start: start + x.shape[0]] = p.float().cpu().numpy().reshape(-1)
+                idx = torch.nonzero(eq).view(-1)
+                if idx.shape[0] != 0:
+                    x_buf.append(x[idx]), idx_buf.append(idx.cpu().numpy() + start)
+                    num_buf += idx.shape[0]
+                start += x.shape[0]
+                while num_buf >= self.batch_size:
+                    x_eq, idx_eq = torch.cat(x_buf, dim=0), np.concatenate(idx_buf)
+                    mag_all[idx_eq[:self.batch_size]] = self.estimate(x_eq[:self.batch_size])
+                    x_buf, idx_buf = [x_eq[self.batch_size:]], [idx_eq[self.batch_size:]]
+                    num_buf -= self.batch_size
+            if num_buf != 0:
+                mag_all[np.concatenate(idx_buf)] = self.estimate(torch.cat(x_buf, dim=0))
+        duration = time.time() - t_start
+        info = {"style": "cascade", "num": num, "num_eq": int(np.sum(~np.isnan(mag_all))), "time": duration,
+                "windows_per_s": num / duration}
+        return p_all, mag_all, info
+
+
+# both models on all windows, for comparison
+def run_both(detector, estimator, loader, device):
+    detector.eval(), estimator.eval()
+    p_all, mag_all = [], []
+    t_start = time.time()
+    with torch.inference_mode():
+        for batch in loader:
+            x = batch[0].to(device)
+            p_all.append(detector(x).float().cpu().numpy().reshape(-1))
+            mag_all.append(estimator(x).float().cpu().numpy().reshape(-1))
+    duration = time.time() - t_start
+    p_all, mag_all = np.concatenate(p_all), np.concatenate(mag_all)
+    info = {"style": "both", "num": p_all.shape[0], "num_eq": p_all.shape[0], "time": duration,
+            "windows_per_s": p_all.shape[0] / duration}
+    return p_all, mag_all, info
+
+
+def print_info(info):
+    print("{}: {} windows, {} to the magnitude model, {:.2f}s, {:.1f} windows/s".format(
+        info["style"], info["num"], info["num_eq"], info["time"], info["windows_per_s"]))
@@ -0,0 +1,108 @@
+"""
+Earthquake catalog from FDSN providers
+origins and magnitudes are read from the attributes of ObsPy Event, providers are queried at the same time,
+and the same event reported by several providers is only kept once
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from concurrent.futures import ThreadPoolExecutor
+from obspy.clients.fdsn import Client
+from obspy.clients.fdsn.header import FDSNNoDataException
+import func.spatial as spatial
+
+COLUMNS = ["time", "latitude", "longitude", "depth", "magnitude", "scale", "source", "event_id"]
+
+
+# preferred origin / magnitude of the event, or the first one if not given
+def event_row(event, source):
+    origin = event.preferred_origin() or (event.origins[0] if len(event.origins) != 0 else None)
+    magnitude = event.preferred_magnitude() or (event.magnitudes[0] if len(event.magnitudes) != 0 else None)
+    if origin is None or magnitude is None or origin.latitude is None or origin.longitude is None:
+        return None
+    return {"time": origin.time.datetime,
+            "latitude": origin.latitude,
+            "longitude": origin.longitude,
+            "depth": np.nan if origin.depth is None else origin.depth / 1000,         # km
+            "magnitude": magnitude.mag,
+            "scale": magnitude.magnitude_type,
+            "source": source,
+            "event_id": str(event.resource_id)}
+
+
+def to_df(rows):
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["time"] = pd.to_datetime(df["time"], utc=True)
+    for column in ["latitude", "longitude", "depth", "magnitude"]:
+        df[column] = df[column].astype(float)
+    for column in ["scale", "source"]:
+        df[column] = df[column].astype("category")
+    return df
+
+
+def get_events_one(source, **kwargs):
+    try:
+        catalog = Client(source).get_events(**kwargs)
+    except FDSNNoDataException:
+        return to_df([])
+    except Exception as e:
+        print("{} is skipped: {}".format(source, e))
+        return to_df([])
+    rows = [event_row(event, source) for event in catalog]
+    return to_df([row for row in rows if row is not None])
+
+
+# pairs (i, j), i < j, of sorted times with t[j] - t[i] <= dt, the candidates of each i are found by searchsorted
+def time_pairs(t, dt):
+    num = np.searchsorted(t, t + dt, side="right") - np.arange(t.shape[0]) - 1
+    i = np.repeat(np.arange(t.shape[0]), num)
+    j = i + 1 + np.arange(num.sum()) - np.repeat(np.cumsum(num) - num, num)
+    return i, j
+
+
+# events reported by several providers: close in time (s) and space (km), the first provider of client_list is kept
+# each event is compared with all events of other providers within dt, events linked by such pairs are taken as one,
+# and all events of the first provider in the group are kept (events of one provider are never the same event)
+def dedupe(df, client_list, dt=5, dr=20):
+    if df.shape[0] == 0:
+        return df
+    df = df.sort_values("time", kind="stable").reset_index(drop=True)
+    t = df["time"].values.astype("datetime64[ns]").astype(np.int64) / 1e9
+    lat, lon = df["latitude"].values, df["longitude"].values
+    source = df["source"].astype(str).values
+    i, j = time_pairs(t, dt)
+    near = (source[i] != source[j]) & (spatial.haversine(lat[i], lon[i], lat[j], lon[j]) <= dr)
+    graph = sp.coo_matrix((np.ones(np.sum(near)), (i[near], j[near])), shape=(df.shape[0], df.shape[0]))
+    df["group"] = connected_components(graph, directed=False)[1]
+    rank = {one: i for i, one in enumerate(client_list)}
+    df["rank"] = df["source"].astype(str).map(rank).fillna(len(client_list)).values
+    df = df[df["rank"] == df.groupby("group")["rank"].transform("min")]
+    return df.drop(columns=["group", "rank"]).reset_index(drop=True)
+
+
+# scales: magnitude types to keep, reports of other types are dropped before dedupe (so that an event is not lost when
+# the kept provider reports it in another type)
+def get_events(client_list, dt=5, dr=20, scales=None, **kwargs):
+    with ThreadPoolExecutor(max_workers=max(len(client_list), 1)) as executor:
+        dfs = list(executor.map(lambda source: get_events_one(source, **kwargs), client_list))
+    df = pd.concat(dfs, ignore_index=True)
+    if scales is not None:
+        df = df[df["scale"].astype(str).isin(scales)].reset_index(drop=True)
+    df["scale"] = df["scale"].astype(str).astype("category")
+    df["source"] = df["source"].astype(str).astype("category")
+    return dedupe(df, client_list, dt, dr)
+
+
+# typed columnar catalog, and the csv of the former format (Magnitude, Scale, Time, Latitude, Longitude)
+def save_events(df, parquet_ad, csv_ad=None):
+    df.to_parquet(parquet_ad, index=False)
+    if csv_ad is not None:
+        info = pd.DataFrame({"Magnitude": df["magnitude"].values, "Scale": df["scale"].astype(str).values,
+                             "Time": df["time"].dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ").values,
+                             "Latitude": df["latitude"].values, "Longitude": df["longitude"].values})
+        info.to_csv(csv_ad)
+
+
+def read_events(parquet_ad):
+    return pd.read_parquet(parquet_ad)
@@ -2,12 +2,18 @@ import os
 import os.path as osp
 import json
 import platform
-from obspy import UTCDateTime
+import gzip
+import hashlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from obspy import Stream, UTCDateTime
 from obspy.clients.fdsn.client import Client
+from obspy.clients.fdsn.header import FDSNNoDataException
 
 
 def makeStationList(json_path, client_list, min_lat, max_lat, min_lon, max_lon, start_time, end_time, channel_list=[],
-                    filter_network=[], filter_station=[],  **kwargs):
+                    filter_network=[], filter_station=[], cache_dir=None, refresh=False, timeout=120, **kwargs):
     """
 
     Uses fdsn to find available stations in a specific geographical location and time period.
@@ -47,6 +53,15 @@ def makeStationList(json_path, client_list, min_lat, max_lat, min_lon, max_lon,
     filter_station: str, default=[]
         A list containing the station names that need to be avoided.
 
+    cache_dir: str, default=None
+        Folder of the cached inventories, the folder of json_path if None.
+
+    refresh: bool, default=False
+        Ask the providers for the stations updated after the last query, and merge them into the cache.
+
+    timeout: float, default=120
+        Timeout of each provider, the cached inventory (if any) is used if a provider is too slow or fails.
+
     kwargs:
         special symbol for passing Client.get_stations arguments
 
@@ -54,62 +69,26 @@ def makeStationList(json_path, client_list, min_lat, max_lat, min_lon, max_lon,
     ----------
     stations_list.json: A dictionary containing information for the available stations.
     """
+    if cache_dir is None:
+        cache_dir = osp.join(os.path.dirname(json_path), "inventory_cache")
+    region = [min_lat, max_lat, min_lon, max_lon]
+    rows_all = get_station_rows_all(client_list, region, start_time, end_time, cache_dir, refresh, timeout, **kwargs)
+
     station_list = {}
-    for cl in client_list:
-        inventory = Client(cl).get_stations(minlatitude=min_lat,
-                                            maxlatitude=max_lat,
-                                            minlongitude=min_lon,
-                                            maxlongitude=max_lon,
-                                            starttime=UTCDateTime(start_time),
-                                            endtime=UTCDateTime(end_time),
-                                            level='channel', **kwargs)
-        for ev in inventory:
-            net = ev.code
-            if net not in filter_network:
-                for st in ev:
-                    station = st.code
-                    print(str(net) + "--" + str(station))
-
-                    if station not in filter_station:
-
-                        elv = st.elevation
-                        lat = st.latitude
-                        lon = st.longitude
-                        new_chan = [ch.code for ch in st.channels]
-                        if len(channel_list) > 0:
-                            chan_priority = [ch[:2] for ch in channel_list]
-
-                            for chnn in chan_priority:
-                                if chnn in [ch[:2] for ch in new_chan]:
-                                    new_chan = [ch for ch in new_chan if ch[:2] == chnn]
-# =============================================================================
-#                      if ("BHZ" in new_chan) and ("HHZ" in new_chan):
-#                          new_chan = [ch for ch in new_chan if ch[:2] != "BH"]
-#                      if ("HHZ" in new_chan) and ("HNZ" in new_chan):
-#                          new_chan = [ch for ch in new_chan if ch[:2] != "HH"]
-#
-#                           if len(new_chan)>3 and len(new_chan)%3 != 0:
-#                               chan_type = [ch for ch in new_chan if ch[2] == 'Z']
-#                               chan_groups = []
-#                               for i, cht in enumerate(chan_type):
-#                                   chan_groups.append([ch for ch in new_chan if ch[:2] == cht[:2]])
-#                               new_chan2 = []
-#                               for chg in chan_groups:
-#                                   if len(chg) == 3:
-#                                       new_chan2.append(chg)
-#                               new_chan = new_chan2
-# =============================================================================
-                        new_chan_one = new_chan[0]
-                        for i in range(len(st.channels)):
-                            channel_one = st.channels[i].code
-                            if channel_one == new_chan_one:
-                                location = st.channels[i].location_code
-                                break
-                        if len(new_chan) > 0 and (station not in station_list):
-                            station_list[str(station)] = {"network": net,
-                                                          "channels": list(set(new_chan)),
-                                                          "coords": [lat, lon, elv],
-                                                          "location": location}
+    for cl in client_list:                  # the former clients have priority, as the order of client_list
+        for row in rows_all[cl]:
+            net, station = row["network"], row["station"]
+            if (net in filter_network) or (station in filter_station) or (station in station_list):
+                continue
+            channels = select_channels(row["channels"], channel_list)
+            if len(channels) == 0:
+                continue
+            lat, lon, elv = row["coords"]
+            station_list[str(station)] = {"network": net,
+                                          "channels": list(set([ch[0] for ch in channels])),
+                                          "coords": [lat, lon, elv],
+                                          "location": channels[0][1]}
+    print("{} stations from {}".format(len(station_list), ", ".join(client_list)))
     json_dir = os.path.dirname(json_path)
     if not os.path.exists(json_dir):
         os.makedirs(json_dir)
@@ -118,6 +97,120 @@ def makeStationList(json_path, client_list, min_lat, max_lat, min_lon, max_lon,
     return station_list
 
 
+# channels ([code, location]) of the first available band in channel_list, e.g. ["HHZ", "BHZ"] prefers HH to BH
+def select_channels(channels, channel_list):
+    if len(channel_list) == 0:
+        return channels
+    bands = set([ch[0][:2] for ch in channels])
+    for band in [ch[:2] for ch in channel_list]:
+        if band in bands:
+            return [ch for ch in channels if ch[0][:2] == band]
+    return channels
+
+
+# stations of an inventory in plain lists, which are small and fast to be cached
+def parse_inventory(inventory):
+    rows = []
+    for net in inventory:
+        for st in net:
+            rows.append({"network": net.code, "station": st.code,
+                         "coords": [st.latitude, st.longitude, st.elevation],
+                         "start": None if st.start_date is None else str(st.start_date),
+                         "end": None if st.end_date is None else str(st.end_date),
+                         "channels": [[ch.code, ch.location_code] for ch in st.channels]})
+    return rows
+
+
+# the end of time window is not in the key, so that a longer window only queries the new part
+def get_inventory_ad(cache_dir, cl, region, start_time, **kwargs):
+    key = json.dumps([cl, region, str(UTCDateTime(start_time)), sorted(kwargs.items())], default=str)
+    return osp.join(cache_dir, "{}_{}.json.gz".format(
+        cl.replace("/", "_").replace(":", "_"), hashlib.md5(key.encode()).hexdigest()[:16]))
+
+
+def read_inventory_cache(inventory_ad):
+    if not osp.exists(inventory_ad):
+        return None
+    with gzip.open(inventory_ad, "rt") as f:
+        return json.load(f)
+
+
+def write_inventory_cache(inventory_ad, cache):
+    inventory_dir = osp.dirname(inventory_ad)
+    if not osp.exists(inventory_dir):
+        os.makedirs(inventory_dir)
+    inventory_ad_tmp = inventory_ad + ".tmp"
+    with gzip.open(inventory_ad_tmp, "wt") as f:
+        json.dump(cache, f)
+    os.replace(inventory_ad_tmp, inventory_ad)
+
+
+def merge_rows(rows, rows_new):
+    merged = {(row["network"], row["station"]): row for row in rows}
+    for row in rows_new:
+        merged[(row["network"], row["station"])] = row
+    return list(merged.values())
+
+
+# stations active within the time window
+def in_window(row, start_time, end_time):
+    if row["start"] is not None and UTCDateTime(row["start"]) > end_time:
+        return False
+    if row["end"] is not None and UTCDateTime(row["end"]) < start_time:
+        return False
+    return True
+
+
+def query_stations(cl, region, start_time, end_time, timeout, **kwargs):
+    inventory = Client(cl, timeout=timeout).get_stations(minlatitude=region[0], maxlatitude=region[1],
+                                                         minlongitude=region[2], maxlongitude=region[3],
+                                                         starttime=start_time, endtime=end_time,
+                                                         level='channel', **kwargs)
+    return parse_inventory(inventory)
+
+
+# stations of one provider, from the cache if it covers the time window, only the new part is queried otherwise
+def get_station_rows(cl, region, start_time, end_time, cache_dir, refresh, timeout, **kwargs):
+    start_time, end_time = UTCDateTime(start_time), UTCDateTime(end_time)
+    inventory_ad = get_inventory_ad(cache_dir, cl, region, start_time, **kwargs)
+    cache = read_inventory_cache(inventory_ad)
+    try:
+        if cache is None:
+            cache = {"end_time": str(end_time), "fetched": str(UTCDateTime()),
+                     "rows": query_stations(cl, region, start_time, end_time, timeout, **kwargs)}
+        elif refresh or UTCDateTime(cache["end_time"]) < end_time:
+            fetched = UTCDateTime()
+            query_start = start_time if refresh else UTCDateTime(cache["end_time"])
+            query_kwargs = dict(kwargs)
+            if refresh:
+                query_kwargs["updatedafter"] = UTCDateTime(cache["fetched"])
+            try:
+                rows_new = query_stations(cl, region, query_start, end_time, timeout, **query_kwargs)
+            except FDSNNoDataException:
+                rows_new = []
+            cache = {"end_time": str(max(end_time, UTCDateTime(cache["end_time"]))), "fetched": str(fetched),
+                     "rows": merge_rows(cache["rows"], rows_new)}
+        else:
+            return [row for row in cache["rows"] if in_window(row, start_time, end_time)]
+        write_inventory_cache(inventory_ad, cache)
+    except FDSNNoDataException:
+        return []
+    except Exception as e:
+        if cache is None:
+            print("{} is skipped: {}".format(cl, e))
+            return []
+        print("{} failed, its cached inventory is used: {}".format(cl, e))
+    return [row for row in cache["rows"] if in_window(row, start_time, end_time)]
+
+
+# all providers are queried at the same time
+def get_station_rows_all(client_list, region, start_time, end_time, cache_dir, refresh, timeout, **kwargs):
+    with ThreadPoolExecutor(max_workers=max(len(client_list), 1)) as executor:
+        futures = {cl: executor.submit(get_station_rows, cl, region, start_time, end_time, cache_dir, refresh,
+                                       timeout, **kwargs) for cl in client_list}
+        return {cl: future.result() for cl, future in futures.items()}
+
+
 # 将station_list.json文件，生成用于LOC-FLOW的station.dat文件
 def makeDatFile(json_path, file_name):
     json_file = open(json_path)
@@ -158,3 +251,139 @@ def makeDatFile(json_path, file_name):
             sta_idx = sta_idx + 1
             if sta_idx != num_sta:
                 f.write("\n")           # 另起一行，统计下一个台站的信息
+
+
+# one job: three channels of a station in a time window, identified by "net.sta.chan"
+def get_job(net, sta, chans, time_begin, time_end, **kwargs):
+    job = {"net": net, "sta": sta, "chans": list(chans), "time_begin": time_begin, "time_end": time_end}
+    job.update(kwargs)
+    return job
+
+
+def get_job_key(job):
+    return "{}.{}.{}".format(job["net"], job["sta"], job["chans"][0][:2])
+
+
+class Manifest:
+    """
+    Record of the finished jobs, one json per line, so that an interrupted download can be resumed.
+    the status of a job is "done" (saved), "rejected" (downloaded but not qualified), "nodata" or "failed" (error, or
+    some channels are not found by any provider)
+    """
+    def __init__(self, manifest_ad):
+        self.manifest_ad = manifest_ad
+        self.lock = threading.Lock()
+        self.records = {}
+        if osp.exists(manifest_ad):
+            with open(manifest_ad, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        record = json.loads(line)
+                        self.records[record["key"]] = record
+        manifest_dir = osp.dirname(manifest_ad)
+        if manifest_dir != "" and not osp.exists(manifest_dir):
+            os.makedirs(manifest_dir)
+
+    # "failed" jobs are tried again in the next run
+    def finished(self, key):
+        return key in self.records and self.records[key]["status"] != "failed"
+
+    def add(self, key, status, **kwargs):
+        record = {"key": key, "status": status, "time": time.time()}
+        record.update(kwargs)
+        with self.lock:
+            self.records[key] = record
+            with open(self.manifest_ad, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+class Downloader:
+    """
+    Concurrent FDSN waveform downloader.
+
+    Parameters
+    ----------
+    sources: list
+        Names of FDSN providers (e.g. ["INGV", "IRIS"]) or base urls (e.g. a local FDSN server "http://127.0.0.1:8080"),
+        tried in order for each job.
+
+    manifest_ad: str
+        Path of the manifest file (json lines), finished jobs in it are skipped.
+
+    limits: dict, default=None
+        Maximum number of concurrent requests of each provider, 4 for those not given.
+
+    client_kwargs: dict, default=None
+        Arguments of obspy Client, e.g. {"timeout": 60}.
+    """
+    def __init__(self, sources, manifest_ad, limits=None, client_kwargs=None):
+        self.sources = list(sources)
+        self.manifest = Manifest(manifest_ad)
+        limits = {} if limits is None else limits
+        self.limits = {source: limits.get(source, 4) for source in self.sources}
+        self.semaphores = {source: threading.BoundedSemaphore(self.limits[source]) for source in self.sources}
+        self.client_kwargs = {} if client_kwargs is None else client_kwargs
+        self.local = threading.local()
+
+    # one Client per thread and provider, which only saves the setup of the client (obspy caches the service discovery
+    # of a provider anyway), every request still opens its own http connection (urllib of obspy)
+    def get_client(self, source):
+        if not hasattr(self.local, "clients"):
+            self.local.clients = {}
+        if source not in self.local.clients:
+            self.local.clients[source] = Client(source, **self.client_kwargs)
+        return self.local.clients[source]
+
+    # all channels of a job in one bulk request, the channels not returned (no data, error, or only some channels) are
+    # requested from the next provider, return the stream, providers used, channels not found and errors
+    def fetch(self, job):
+        st_all, used, missing, errors = Stream(), [], list(job["chans"]), []
+        for source in self.sources:
+            bulk = [(job["net"], job["sta"], "*", chan, UTCDateTime(job["time_begin"]), UTCDateTime(job["time_end"]))
+                    for chan in missing]
+            with self.semaphores[source]:
+                try:
+                    st = self.get_client(source).get_waveforms_bulk(bulk, attach_response=True)
+                except FDSNNoDataException:
+                    continue
+                except Exception as e:
+                    errors.append("{}: {}".format(source, e))
+                    continue
+            found = [chan for chan in missing if len(st.select(channel=chan)) > 0]
+            if len(found) == 0:
+                continue
+            for chan in found:
+                st_all += st.select(channel=chan)
+            used.append(source)
+            missing = [chan for chan in missing if chan not in found]
+            if len(missing) == 0:
+                break
+        return (st_all if len(st_all) > 0 else None), used, missing, errors
+
+    # save(job, st) is called in the main thread as soon as all channels of a job are downloaded, returning "done" or
+    # "rejected", a job with only some channels is "failed" (tried again in the next run) and not saved
+    def run(self, jobs, save, max_workers=None, verbose=True):
+        jobs = [job for job in jobs if not self.manifest.finished(get_job_key(job))]
+        if max_workers is None:
+            max_workers = sum(self.limits.values())
+        status_all = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.fetch, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                key = get_job_key(job)
+                st, used, missing, errors = future.result()
+                if st is None:
+                    status = "failed" if len(errors) != 0 else "nodata"
+                    self.manifest.add(key, status, errors=errors)
+                elif len(missing) != 0:
+                    status = "failed"
+                    self.manifest.add(key, status, source=",".join(used), missing=missing, errors=errors)
+                else:
+                    status = save(job, st)
+                    self.manifest.add(key, status, source=",".join(used))
+                status_all[key] = status
+                if verbose:
+                    print(key, status)
+        return status_all
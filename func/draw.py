@@ -2,7 +2,6 @@
 Functions for plot and draw figures
 """
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mtick
 import os
@@ -10,7 +9,8 @@ os.environ['PROJ_LIB'] = '<path to anaconda>/anaconda3/share/proj'
 from mpl_toolkits.basemap import Basemap
 from sklearn.linear_model import LinearRegression
 from matplotlib.ticker import FuncFormatter
-from scipy.stats import gaussian_kde
+from scipy.signal import fftconvolve
+import func.output as out
 
 
 def cal_rmse_one_arr(true, pred):
@@ -24,37 +24,90 @@ def cal_r2_one_arr(true, pred):
     return r2
 
 
-def cal_dist(x, bins, v_min=None, v_max=None):
-    if v_min is not None:
-        x = x[x >= v_min]
-        x = np.append(x, v_min)
-    if v_max is not None:
-        x = x[x <= v_max]
-        x = np.append(x, v_max)
-    x_label, x_bins = pd.cut(x, bins=bins, retbins=True)
-    x_label_vc = pd.DataFrame(x_label).value_counts()
-    interval = x_label_vc.index.tolist()
-    interval_sum = x_label_vc.values
-    mid_all, left, right = [], float('inf'), -float('inf')
-    for i in range(bins):
-        interval_one = interval[i][0]
-        left_one, right_one = interval_one.left, interval_one.right
-        mid = (left_one + right_one) / 2
-        mid_all.append(mid)
-        if left_one < left:
-            left = left_one
-        if right_one > right:
-            right = right_one
-    mid_all = np.array(mid_all)
-    sort_index = np.argsort(mid_all)
-    mid_all_sort = mid_all[sort_index]
-    mid_all_sort = np.around(mid_all_sort, 2)
-    interval_sum_sort = interval_sum[(sort_index)]
-    if v_min is not None:
-        interval_sum_sort[0] = interval_sum_sort[0] - 1
-    if v_max is not None:
-        interval_sum_sort[-1] = interval_sum_sort[-1] - 1
-    return mid_all_sort, interval_sum_sort, left, right
+# histogram with the same bins as pd.cut(x, bins): equal width, right-closed, the first edge is extended by 0.1%
+# nan and inf are dropped (as pd.cut gives nan for them, not counted by value_counts)
+# v_min / v_max clip the samples and fix the range, x can be a list of arrays sharing the same bins (multi-series),
+# weights (same shape as x) give weighted counts, counts is in shape of (bins, ) or (number of series, bins)
+def cal_dist(x, bins, v_min=None, v_max=None, weights=None):
+    multi = isinstance(x, (list, tuple))
+    xs = [np.asarray(one, dtype=float).reshape(-1) for one in (x if multi else [x])]
+    if weights is None:
+        ws = [None] * len(xs)
+    else:
+        ws = [np.asarray(one, dtype=float).reshape(-1) for one in (weights if multi else [weights])]
+    for i in range(len(xs)):
+        keep = np.isfinite(xs[i])
+        if v_min is not None:
+            keep = keep & (xs[i] >= v_min)
+        if v_max is not None:
+            keep = keep & (xs[i] <= v_max)
+        xs[i] = xs[i][keep]
+        if ws[i] is not None:
+            ws[i] = ws[i][keep]
+
+    x_all = np.concatenate(xs)
+    mn = v_min if v_min is not None else np.min(x_all)
+    mx = v_max if v_max is not None else np.max(x_all)
+    if mn == mx:
+        mn = mn - 0.001 * abs(mn) if mn != 0 else mn - 0.001
+        mx = mx + 0.001 * abs(mx) if mx != 0 else mx + 0.001
+        edges = np.linspace(mn, mx, bins + 1)
+    else:
+        edges = np.linspace(mn, mx, bins + 1)
+        edges[0] = edges[0] - (mx - mn) * 0.001
+
+    counts = []
+    for x_one, w_one in zip(xs, ws):
+        idx = np.clip(np.searchsorted(edges, x_one, side="left") - 1, 0, bins - 1)
+        count = np.bincount(idx, weights=w_one, minlength=bins)
+        counts.append(count if w_one is not None else count.astype(int))
+    counts = np.vstack(counts) if multi else counts[0]
+    mid_all_sort = np.around((edges[:-1] + edges[1:]) / 2, 2)
+    return mid_all_sort, counts, edges[0], edges[-1]
+
+
+# grid approximation of gaussian_kde(pos)(pos) used to color scatters, pos is in shape of (2, n)
+# points are linearly binned onto a grid, smoothed by FFT convolution with the same Gaussian kernel
+# as gaussian_kde (Scott's rule), then interpolated back to the points
+# the error is largest at isolated points and grows with the square of step / sigma, so the grid (at least grid nodes
+# on each axis, at most max_grid) is refined until the step is no larger than max_step * sigma of the kernel
+def cal_den(pos, grid=256, max_step=0.07, max_grid=2048):
+    pos = np.array(pos, dtype=float)
+    d, n = pos.shape
+    if d != 2:
+        raise ValueError("Only 2-D points are supported, pos must be in shape of (2, n)!")
+    cov = np.cov(pos) * np.power(n, -2 / (d + 4))
+    sigma = np.sqrt(np.diag(cov))
+    lo = np.min(pos, axis=1) - 3 * sigma
+    hi = np.max(pos, axis=1) + 3 * sigma
+    size = np.clip(np.ceil((hi - lo) / (max_step * sigma)).astype(int) + 1, grid, max_grid)
+    step = (hi - lo) / (size - 1)
+
+    # linear binning, each point is shared by its 4 neighbouring nodes
+    g = (pos - lo.reshape(-1, 1)) / step.reshape(-1, 1)
+    g0 = np.clip(np.floor(g).astype(int), 0, (size - 2).reshape(-1, 1))
+    f = g - g0
+    nodes, weights = [], []
+    for o_x, o_y in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+        nodes.append((g0[0] + o_x) * size[1] + (g0[1] + o_y))
+        weights.append((f[0] if o_x else 1 - f[0]) * (f[1] if o_y else 1 - f[1]))
+    count = np.zeros(size[0] * size[1])
+    for node, weight in zip(nodes, weights):
+        count = count + np.bincount(node, weights=weight, minlength=size[0] * size[1])
+
+    # Gaussian kernel on offsets of grid, truncated at 4 sigma
+    k = np.minimum(np.ceil(4 * sigma / step).astype(int), size - 1)
+    d_x, d_y = np.meshgrid(np.arange(-k[0], k[0] + 1) * step[0], np.arange(-k[1], k[1] + 1) * step[1], indexing="ij")
+    inv = np.linalg.inv(cov)
+    q = inv[0, 0] * np.square(d_x) + 2 * inv[0, 1] * d_x * d_y + inv[1, 1] * np.square(d_y)
+    kernel = np.exp(-0.5 * q) / (2 * np.pi * np.sqrt(np.linalg.det(cov)))
+    den = fftconvolve(count.reshape(size[0], size[1]), kernel, mode="same") / n
+    den = np.maximum(den, 0).reshape(-1)
+
+    pos_c = np.zeros(n)
+    for node, weight in zip(nodes, weights):
+        pos_c = pos_c + weight * den[node]
+    return pos_c
 
 
 def dist_fast(x, bins, jump, x_name, fig_si, fo_si, fo_ti_si, t=None, y_name="Frequency"):
@@ -164,7 +217,7 @@ def ax_result(ax, line, sm, true, pred, loc, fo_te, la, c, den, cmax):
 
     if den:
         pos = np.vstack([true.reshape(1, -1), pred.reshape(1, -1)])
-        pos_c = gaussian_kde(pos)(pos)
+        pos_c = cal_den(pos)
         cs = ax.scatter(true, pred, c=pos_c, alpha=0.7, s=300, cmap=plt.cm.rainbow, label=sm + c_label, vmax=cmax)
     else:
         cs = ax.scatter(true, pred, c=c, alpha=0.7, s=300, label=sm + c_label, vmax=cmax)
@@ -294,7 +347,7 @@ def error_fea(error, fea, fig_si, fo_si, fo_ti_si, cmax, x_name, mean, y_lim, la
     fig = plt.figure(figsize=fig_si)
     ax = fig.add_subplot(111)
     pos = np.hstack([error.reshape(-1, 1), fea.reshape(-1, 1)])
-    pos_c = gaussian_kde(pos.T)(pos.T)
+    pos_c = cal_den(pos.T)
     abc = np.max(pos_c)     # EQG and MaI use same 'vmax', defined in feature_effect.py
     cs = ax.scatter(fea, error, c=pos_c, s=300, alpha=0.7, cmap=plt.cm.rainbow, vmax=vmax)
     if mean:
@@ -331,30 +384,11 @@ def error_fea(error, fea, fig_si, fo_si, fo_ti_si, cmax, x_name, mean, y_lim, la
     return fig
 
 
+# bins is the number of bin edges, empty bins are dropped
 def error_fea_mean(error_, fea_, bins=60):
-    idx_sort = np.argsort(fea_)
-    error, fea = error_[idx_sort].tolist(), fea_[idx_sort].tolist()
-    fea_min, fea_max = np.min(fea_), np.max(fea_)
-    fea_bins = np.linspace(fea_min, fea_max, bins)
-    error_mean, fea_mean = [], []
-    for i in range(bins - 1):
-        left, right = fea_bins[i], fea_bins[i + 1]
-        e_in = []
-        while len(error) != 0:
-            error_j, fea_j = error[0], fea[0]
-            if (fea_j >= left) & (fea_j <= right):
-                e_in.append(error_j)
-                del error[0]
-                del fea[0]
-            else:
-                break
-        e_in = np.array(e_in)
-        if e_in.shape[0] == 0:
-            continue
-        else:
-            error_mean.append(np.mean(e_in))
-            fea_mean.append((left + right) / 2)
-    error_mean, fea_mean = np.array(error_mean), np.array(fea_mean)
+    stat = out.binned_stat(error_, fea_, bins - 1)
+    stat = stat[stat["count"] > 0]
+    error_mean, fea_mean = stat["mean"].values, stat["mid"].values
     return error_mean, fea_mean
 
 
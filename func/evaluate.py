@@ -0,0 +1,190 @@
+"""
+Functions for evaluating all trained models within a single pass of testing set
+"""
+import torch
+import numpy as np
+import pandas as pd
+import os.path as osp
+from torch.utils.data import DataLoader
+import func.process as pro
+import func.net as net
+
+# short name of model -> folder of its results, the order is also the column order of predictions table
+MODELS = {
+    "EQG": "EQGraphNet",
+    "Mag": "MagNet",
+    "COI": "ConvNetQuake_INGV",
+    "CRE": "CREIME",
+    "MaI": "MagInf",
+}
+
+
+def get_model(style, device):
+    if style == "EQG":
+        return net.EQGraphNet("gcn", "ts_un", 1, device)
+    elif style == "Mag":
+        return net.MagNet()
+    elif style == "COI":
+        return net.ConvNetQuakeINGV()
+    elif style == "CRE":
+        return net.CREIME()
+    elif style == "MaI":
+        return net.MagInfoNet("unimp", "ts_un", 2, device)
+    else:
+        raise TypeError("Unknown type of model style!")
+
+
+# load each checkpoint only once
+def load_models(styles, re_ad, sm_scale, name, m_train, m_test, device):
+    models = {}
+    for style in styles:
+        model = get_model(style, device).to(device)
+        model_ad = osp.join(re_ad, MODELS[style], "model_{}_{}_{}_{}.pkl".format(sm_scale, name, m_train, m_test))
+        model.load_state_dict(torch.load(model_ad, map_location=device))
+        model.eval()
+        models[style] = model
+    return models
+
+
+# testing set carrying the inputs of all models, the view of each model is derived from the same batch
+def get_loader(bz, data, df, sm, ps_at, p_t, noise=None):
+    p_as = torch.from_numpy(df["p_arrival_sample"].values.reshape(-1).astype(int)).long()
+    if noise is None:
+        dataset = pro.SelfData(data, sm, ps_at, p_t, p_as)
+    else:
+        dataset = pro.SelfData(data, sm, ps_at, p_t, p_as, noise[:data.shape[0]])
+    return DataLoader(dataset, batch_size=bz, shuffle=False)
+
+
+# batched version of process.get_xy, only the input of CREIME
+def get_cre_x(x, p_as, p_len=125):
+    n_len = 512 - p_len
+    start = torch.where(p_as > n_len, p_as - n_len, torch.zeros_like(p_as))
+    idx = start.view(-1, 1) + torch.arange(512, device=x.device).view(1, -1)
+    idx = idx.unsqueeze(1).expand(-1, x.shape[1], -1)
+    return torch.gather(x, 2, idx)
+
+
+def run_model(style, model, x, ps_at, p_t, p_as):
+    if style in ["EQG", "Mag", "COI"]:
+        return model(x)
+    elif style == "CRE":
+        return pro.cal_mag(model(get_cre_x(x, p_as)))
+    elif style == "MaI":
+        return model(x, ps_at, p_t)
+    else:
+        raise TypeError("Unknown type of model style!")
+
+
+def run_models(models, x, ps_at, p_t, p_as):
+    pred = {}
+    for style, model in models.items():
+        pred[style] = run_model(style, model, x, ps_at, p_t, p_as).cpu().numpy()
+    return pred
+
+
+# walk the testing set once, and return aligned predictions (trace, true, pred_EQG, pred_Mag, ...)
+def evaluate(models, loader, trace, device):
+    num = len(loader.dataset)
+    true = np.zeros(num)
+    pred = {style: np.zeros(num) for style in models.keys()}
+    with torch.no_grad():
+        for batch in loader:
+            x, y, ps_at, p_t, p_as = [one.to(device) for one in batch[:5]]
+            idx = batch[-1].numpy()
+            true[idx] = y.cpu().numpy()
+            pred_one = run_models(models, x, ps_at, p_t, p_as)
+            for style in models.keys():
+                pred[style][idx] = pred_one[style]
+    return get_result(trace, true, pred)
+
+
+def get_result(trace, true, pred):
+    result = pd.DataFrame({"trace": np.array(trace).reshape(-1), "true": true})
+    for style in MODELS.keys():
+        if style in pred:
+            result["pred_" + style] = pred[style]
+    return result
+
+
+# Gaussian white noise, as factor/robust.py, snr is in dB
+def get_noise(x, snr):
+    ratio = np.power(10, (snr / 10))
+    e = torch.mean(torch.square(x), dim=2, keepdim=True)
+    return x + torch.randn_like(x) * torch.sqrt(e / ratio)
+
+
+# natural noise of chunk1, as factor/robust_natural.py, snr is the ratio of energy
+def get_noise_natural(x, n, snr):
+    e_n = torch.mean(torch.square(n), dim=2, keepdim=True)
+    n = torch.where(e_n < 0.1, torch.randn_like(n), n)      # some noise are all zero, replaced by Gaussian
+    e_x = torch.mean(torch.square(x), dim=2, keepdim=True)
+    e_n = torch.mean(torch.square(n), dim=2, keepdim=True)
+    return x + n * torch.sqrt(e_x / e_n / snr)
+
+
+def get_noisy(noise_style, x, snr, n=None):
+    if noise_style == "gau":
+        return get_noise(x, snr)
+    elif noise_style == "nat":
+        if n is None:
+            raise ValueError("Natural noise is required, please input 'noise' to get_loader!")
+        return get_noise_natural(x, n, snr)
+    else:
+        raise TypeError("Unknown type of noise_style, must be 'gau' or 'nat'!")
+
+
+# models x SNR x noise, the noisy batches are generated from the clean batch on the fly
+def evaluate_grid(models, loader, snrs, noise_styles, device):
+    num = len(loader.dataset)
+    true = np.zeros(num)
+    pred = {}
+    for noise_style in noise_styles:
+        for snr in snrs:
+            pred[(noise_style, snr)] = {style: np.zeros(num) for style in models.keys()}
+    with torch.no_grad():
+        for batch in loader:
+            x, y, ps_at, p_t, p_as = [one.to(device) for one in batch[:5]]
+            n = batch[5].to(device) if len(batch) == 7 else None
+            idx = batch[-1].numpy()
+            true[idx] = y.cpu().numpy()
+            for noise_style in noise_styles:
+                for snr in snrs:
+                    x_n = get_noisy(noise_style, x, snr, n)
+                    pred_one = run_models(models, x_n, ps_at, p_t, p_as)
+                    for style in models.keys():
+                        pred[(noise_style, snr)][style][idx] = pred_one[style]
+
+    grid = []
+    for (noise_style, snr), pred_ns in pred.items():
+        for style in MODELS.keys():
+            if style in pred_ns:
+                rmse = net.cal_rmse_one_arr(true, pred_ns[style])
+                r2 = net.cal_r2_one_arr(true, pred_ns[style])
+                grid.append([noise_style, snr, style, rmse, r2])
+    return pd.DataFrame(grid, columns=["noise", "snr", "model", "rmse", "r2"])
+
+
+# one row per snr, same columns as the txt written by factor/robust.py, read by plot/robust_result.py
+def grid_to_table(grid, noise_style):
+    grid = grid[grid["noise"] == noise_style]
+    rmse = grid.pivot(index="snr", columns="model", values="rmse")
+    r2 = grid.pivot(index="snr", columns="model", values="r2")
+    table = pd.DataFrame({"snr": rmse.index.values})
+    for style in ["MaI", "EQG", "Mag", "COI", "CRE"]:
+        if style in r2.columns:
+            table["r2_" + style] = np.round(r2[style].values, 4)
+    for style in ["MaI", "EQG", "Mag", "COI", "CRE"]:
+        if style in rmse.columns:
+            table["rmse_" + style] = np.round(rmse[style].values, 4)
+    return table
+
+
+def cal_metric(result):
+    true = result["true"].values
+    metric = {}
+    for style in MODELS.keys():
+        if ("pred_" + style) in result.columns:
+            pred = result["pred_" + style].values
+            metric[style] = (net.cal_rmse_one_arr(true, pred), net.cal_r2_one_arr(true, pred))
+    return metric
@@ -0,0 +1,93 @@
+"""
+Extract hidden features of any model in func/net.py by forward hooks
+activations of the selected layers are streamed into memmapped npy files, one row per sample (in the order of the
+dataset, by the index returned by process.SelfData), so that the whole testing set can be analysed without RAM blow-up
+"""
+import torch
+import torch.nn.functional as F
+import numpy as np
+import os
+import os.path as osp
+from tqdm import tqdm
+
+
+# default forward of the model, batch is (x, y, *args, index) from process.SelfData
+def run_x(model, batch):
+    return model(batch[0])
+
+
+# forward of MagInfoNet, batch is (x, y, ps_at, p_t, index)
+def run_mai(model, batch):
+    return model(batch[0], batch[2], batch[3])
+
+
+# average pooling along the last dim, to reduce the size of features
+def down(h, pool):
+    if pool is None or pool <= 1:
+        return h
+    shape = h.shape
+    h = F.avg_pool1d(h.reshape(shape[0], -1, shape[-1]), kernel_size=pool, ceil_mode=True)
+    return h.reshape(shape[:-1] + (h.shape[-1],))
+
+
+class Extractor:
+    # layers: names in model.named_modules(), use_input: layers whose input (not output) are recorded
+    def __init__(self, model, layers, save_ad, num, use_input=(), pool=None, dtype=np.float32):
+        self.model, self.layers, self.save_ad, self.num = model, list(layers), save_ad, num
+        self.use_input, self.pool, self.dtype = set(use_input), pool, dtype
+        modules = dict(model.named_modules())
+        for layer in self.layers:
+            if layer not in modules:
+                raise ValueError("Unknown layer '{}' of {}!".format(layer, type(model).__name__))
+        self.modules = {layer: modules[layer] for layer in self.layers}
+        self.arrays, self.handles, self.idx = {}, [], None
+        if not osp.exists(save_ad):
+            os.makedirs(save_ad)
+
+    def get_ad(self, layer):
+        return osp.join(self.save_ad, "{}.npy".format(layer))
+
+    # the memmap of one layer is allocated when its first batch arrives, as the shape is known then
+    # for modules called several times in one forward (e.g. bn1 of MagInfoNet), the last call is recorded
+    def write(self, layer, h):
+        h = down(h.detach(), self.pool).float().cpu().numpy()
+        if layer not in self.arrays:
+            self.arrays[layer] = np.lib.format.open_memmap(
+                self.get_ad(layer), mode="w+", dtype=self.dtype, shape=(self.num,) + h.shape[1:])
+        self.arrays[layer][self.idx] = h
+
+    def hook(self, layer):
+        def fn(module, inputs, output):
+            h = inputs[0] if layer in self.use_input else output
+            self.write(layer, h)
+        return fn
+
+    def __enter__(self):
+        for layer, module in self.modules.items():
+            self.handles.append(module.register_forward_hook(self.hook(layer)))
+        return self
+
+    def __exit__(self, *args):
+        for handle in self.handles:
+            handle.remove()
+        self.handles = []
+        for array in self.arrays.values():
+            array.flush()
+
+    def run(self, loader, device, run=run_x):
+        self.model.eval()
+        with self, torch.inference_mode():
+            for batch in tqdm(loader):
+                self.idx = batch[-1].numpy()
+                batch = [one.to(device) if torch.is_tensor(one) else one for one in batch[:-1]]
+                run(self.model, batch)
+        return self.load()
+
+    # read-only memmaps of all extracted layers
+    def load(self):
+        return {layer: np.load(self.get_ad(layer), mmap_mode="r") for layer in self.layers}
+
+
+def extract(model, loader, layers, save_ad, device, use_input=(), pool=None, run=run_x):
+    extractor = Extractor(model, layers, save_ad, len(loader.dataset), use_input, pool)
+    return extractor.run(loader, device, run)
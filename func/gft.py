@@ -0,0 +1,133 @@
+"""
+Graph Fourier Transform (GFT) and graph convolution of time series graphs
+the eigenbasis of the combinatorial Laplacian of ts_un (k=1, path) is the DCT-II, and that of tg (ring) is the DFT,
+so the GFT of them is computed by FFT in O(n log n), instead of the O(n^3) eigendecomposition of dense adjacency
+other graphs fall back to the first modes found by the sparse eigensolver (Lanczos)
+"""
+import numpy as np
+import scipy.sparse as sp
+from scipy.fft import dct, idct
+from scipy.sparse.linalg import eigsh
+import func.cache as cache
+
+
+# symmetric sparse adjacency, directed graphs (e.g. tg) are symmetrized by (W + W^T) / 2
+def to_sparse(a):
+    a = sp.csr_matrix(a, dtype=float)
+    if (abs(a - a.T) > 1e-12).nnz != 0:
+        a = (a + a.T) / 2
+    a.eliminate_zeros()
+    return a
+
+
+# 'path' (ts_un with k=1), 'ring' (tg) or None, and the uniform edge weight
+def get_style(a):
+    a = to_sparse(a)
+    n = a.shape[0]
+    coo = a.tocoo()
+    row, col, w = coo.row, coo.col, coo.data
+    if w.size == 0 or not np.allclose(w, w[0]):
+        return None, None
+    diff = np.abs(row - col)
+    if np.all(diff == 1) and w.size == 2 * (n - 1):
+        return "path", w[0]
+    if n > 2 and np.all((diff == 1) | (diff == n - 1)) and w.size == 2 * n:
+        return "ring", w[0]
+    return None, None
+
+
+def laplacian(a):
+    a = to_sparse(a)
+    d = np.asarray(a.sum(axis=1)).reshape(-1)
+    return sp.diags(d) - a
+
+
+# eigenvalues (graph frequencies) in ascending order, as the order of the output of gft
+def get_freq(a, k=None):
+    style, w = get_style(a)
+    n = a.shape[0]
+    if style == "path":
+        return 2 * w * (1 - np.cos(np.pi * np.arange(n) / n))
+    elif style == "ring":
+        return 2 * w * (1 - np.cos(2 * np.pi * ring_order(n) / n))
+    else:
+        return eig_basis(to_sparse(a), n if k is None else k)[0]
+
+
+# frequency of each element of the real DFT basis: [0, 1, 1, 2, 2, ...]
+def ring_order(n):
+    return (np.arange(n) + 1) // 2
+
+
+# first k modes of the Laplacian by Lanczos, dense eigendecomposition is only used for small graphs
+@cache.cached(deps=(laplacian, to_sparse))
+def eig_basis(a, k):
+    lap = laplacian(a)
+    n = lap.shape[0]
+    if k >= n - 1 or n <= 500:
+        lam, u = np.linalg.eigh(lap.toarray())
+        return lam[:k], u[:, :k]
+    lam, u = eigsh(lap, k=k, sigma=-1e-3, which="LM")     # shift-invert, the smallest eigenvalues
+    idx = np.argsort(lam)
+    return lam[idx], u[:, idx]
+
+
+# real DFT with orthonormal basis, in the order of [c_0, c_1, s_1, c_2, s_2, ...]
+def rfft_ortho(x):
+    n = x.shape[-1]
+    f = np.fft.rfft(x, axis=-1)
+    out = np.zeros(x.shape, dtype=float)
+    out[..., 0] = f[..., 0].real / np.sqrt(n)
+    m = (n - 1) // 2
+    out[..., 1:2 * m + 1:2] = f[..., 1:m + 1].real * np.sqrt(2 / n)
+    out[..., 2:2 * m + 2:2] = -f[..., 1:m + 1].imag * np.sqrt(2 / n)
+    if n % 2 == 0:
+        out[..., n - 1] = f[..., n // 2].real / np.sqrt(n)
+    return out
+
+
+def irfft_ortho(x_gft):
+    n = x_gft.shape[-1]
+    f = np.zeros(x_gft.shape[:-1] + (n // 2 + 1,), dtype=complex)
+    f[..., 0] = x_gft[..., 0] * np.sqrt(n)
+    m = (n - 1) // 2
+    f[..., 1:m + 1] = (x_gft[..., 1:2 * m + 1:2] - 1j * x_gft[..., 2:2 * m + 2:2]) * np.sqrt(n / 2)
+    if n % 2 == 0:
+        f[..., n // 2] = x_gft[..., n - 1] * np.sqrt(n)
+    return np.fft.irfft(f, n=n, axis=-1)
+
+
+# GFT along the last axis of x, k: number of modes for the Lanczos fallback (all modes if None)
+def gft(x, a, k=None):
+    x = np.asarray(x, dtype=float)
+    style, _ = get_style(a)
+    if style == "path":
+        return dct(x, type=2, norm="ortho", axis=-1)
+    elif style == "ring":
+        return rfft_ortho(x)
+    else:
+        _, u = eig_basis(to_sparse(a), x.shape[-1] if k is None else k)
+        return x @ u
+
+
+def igft(x_gft, a, k=None):
+    x_gft = np.asarray(x_gft, dtype=float)
+    style, _ = get_style(a)
+    if style == "path":
+        return idct(x_gft, type=2, norm="ortho", axis=-1)
+    elif style == "ring":
+        return irfft_ortho(x_gft)
+    else:
+        _, u = eig_basis(to_sparse(a), a.shape[0] if k is None else k)
+        return x_gft @ u.T
+
+
+# repeat x <- D^(1/2) A D^(1/2) x for num times (as factor/graph_conv), by sparse matrix-vector products
+def graph_conv(x, a, num):
+    a = sp.csr_matrix(a, dtype=float)
+    d_norm = sp.diags(np.power(np.asarray(a.sum(axis=1)).reshape(-1), 0.5))
+    op = (d_norm @ a @ d_norm).tocsr()
+    x = np.asarray(x, dtype=float).reshape(-1)
+    for _ in range(num):
+        x = op @ x
+    return x
@@ -3,8 +3,12 @@ import pandas as pd
 import torch
 import os
 import os.path as osp
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 from obspy import read
+import func.preprocess as pre
 
 
 def x_plot(x, title=None):
@@ -17,59 +21,93 @@ def x_plot(x, title=None):
     return None
 
 
-def evaluate(model, device, root, wav_style):
+def get_wav(wav_style):
     if wav_style == "arr":
-        wav = "waveforms_proc_broadband"
+        return "waveforms_proc_broadband"
     elif wav_style == "sac":
-        wav = "waveforms_raw"
+        return "waveforms_raw"
     else:
-        raise TypeError("!")
-    cata = pd.read_csv(osp.join(root, "catalogue.csv"), index_col=0)
-    true_all = cata.mag.values
-    files = os.listdir(osp.join(root, wav))
-    true_, pred_ = [], []
-    for i in range(len(files)):
-        file = files[i]
-        idx = int(file.split('.')[0])
-        true = true_all[idx]
+        raise TypeError("Unknown type of wav_style, must be 'arr' or 'sac'!")
 
-        if wav_style == "arr":
-            data = np.load(osp.join(root, wav, file)) * 2e5
-            data = data.reshape((data.shape[0], data.shape[2], data.shape[1]))
-        elif wav_style == "sac":
-            traces = read(osp.join(root, wav, file))
-            num_traces = len(traces)
-            data = []
-            length = len(traces[0].data)
-            for j in range(int(num_traces / 3)):
-                data_e, data_n, data_z = traces[j].data, traces[j + 1].data, traces[j + 2].data
-                len_e, len_n, len_z = data_e.shape[0], data_n.shape[0], data_z.shape[0]
-                if (len_e != length) | (len_n != length) | (len_z != length):
-                    continue
-                data_j = np.vstack([data_e.reshape(1, -1), data_n.reshape(1, -1), data_z.reshape(1, -1)])
-                data.append(data_j)
-            data = np.array(data)
-        else:
-            raise TypeError("!")
 
-        chan = data.shape[0]
-        if chan == 0:
-            continue
-        data_j_full = np.zeros((chan, 3, 6000))
-        for j in range(chan):
-            data_j = data[j, :, :]
-            data_j_full[j, :, :data_j.shape[1]] = data_j
-        x = torch.from_numpy(data_j_full).float().to(device)
-        pred = model(x).detach().cpu().numpy()
-        pred = pred[np.argsort(np.abs(pred - true))[0]]
+# stations of one event in shape of (chan, 3, 6000)
+def read_event(path, wav_style):
+    if wav_style == "arr":
+        data = np.load(path) * 2e5
+        data = data.reshape((data.shape[0], data.shape[2], data.shape[1]))
+    elif wav_style == "sac":
+        traces = read(path)
+        num_sta = len(traces) // 3
+        if num_sta == 0:
+            return np.zeros((0, 3, 6000), dtype=np.float32)
+        x, lengths = pre.stack([tr.data for tr in traces[:num_sta * 3]])
+        # stations (E, N, Z) whose three channels are as long as the first trace
+        keep = np.all(lengths.reshape(num_sta, 3) == lengths[0], axis=1)
+        data = x.reshape(num_sta, 3, -1)[keep]
+    else:
+        raise TypeError("Unknown type of wav_style, must be 'arr' or 'sac'!")
+    return pre.pad(data, 6000).astype(np.float32)
+
 
-        if i % 10 == 0:
-            print("{}  \t{}  \t{}  \t{:.2f}".format(i, idx, true, pred))
-        true_.append(true), pred_.append(pred)
+# events are read by a pool of threads, at most prefetch events are waiting in memory, in the order of paths
+def read_events(paths, wav_style, num_workers, prefetch):
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = deque()
+        for path in paths:
+            futures.append(executor.submit(read_event, path, wav_style))
+            if len(futures) >= prefetch:
+                yield futures.popleft().result()
+        while len(futures) != 0:
+            yield futures.popleft().result()
 
-    true_, pred_ = np.array(true_), np.array(pred_)
 
-            # x_plot(x_j_full)
-            # plt.show()
+def predict(model, x, device):
+    with torch.inference_mode():
+        return model(torch.from_numpy(x).to(device)).float().cpu().numpy().reshape(-1)
+
+
+# stations of many events are packed into batches of batch_size, predictions are scattered back to events,
+# the prediction of an event is the one of its stations closest to the true magnitude
+def evaluate(model, device, root, wav_style, batch_size=256, num_workers=8, prefetch=64):
+    wav = get_wav(wav_style)
+    cata = pd.read_csv(osp.join(root, "catalogue.csv"), index_col=0)
+    true_all = cata.mag.values
+    files = sorted(os.listdir(osp.join(root, wav)))
+    paths = [osp.join(root, wav, file) for file in files]
+    model.eval()
+
+    t_start = time.time()
+    idx_event, num_sta, pred_sta = [], [], []
+    x_buf, num_buf, num_read = [], 0, 0
+    for file, data in zip(files, read_events(paths, wav_style, num_workers, prefetch)):
+        num_read += 1
+        if data.shape[0] == 0:
+            continue
+        idx_event.append(int(file.split('.')[0])), num_sta.append(data.shape[0])
+        x_buf.append(data)
+        num_buf += data.shape[0]
+        if num_buf >= batch_size:
+            x = np.concatenate(x_buf, axis=0)
+            num_full = x.shape[0] // batch_size * batch_size
+            for i in range(0, num_full, batch_size):
+                pred_sta.append(predict(model, x[i: i + batch_size], device))
+            x_buf, num_buf = [x[num_full:]], x.shape[0] - num_full
+        if num_read % 100 == 0:
+            print("{}/{} events, {:.1f} events/s".format(num_read, len(files), num_read / (time.time() - t_start)))
+    if num_buf != 0:
+        pred_sta.append(predict(model, np.concatenate(x_buf, axis=0), device))
+    pred_sta = np.concatenate(pred_sta) if len(pred_sta) != 0 else np.zeros(0)
+
+    idx_event = np.array(idx_event, dtype=int)
+    true_ = true_all[idx_event]
+    owner = np.repeat(np.arange(idx_event.shape[0]), num_sta)
+    # station of each event with the minimum error, by sorting on (event, error)
+    order = np.lexsort((np.abs(pred_sta - true_[owner]), owner))
+    first = np.concatenate([[0], np.cumsum(num_sta)[:-1]]).astype(int)
+    pred_ = pred_sta[order[first]] if idx_event.shape[0] != 0 else np.zeros(0)
 
+    duration = time.time() - t_start
+    print("{} events ({} stations) in {:.1f}s, {:.1f} events/s, {:.1f} stations/s".format(
+        idx_event.shape[0], pred_sta.shape[0], duration, idx_event.shape[0] / duration,
+        pred_sta.shape[0] / duration))
     return true_, pred_
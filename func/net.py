@@ -45,6 +45,57 @@ def cal_EQ(true_, pred_):
     return rmse, r2, acc, pre, rec, f1
 
 
+# streaming version of cal_rmse_one_arr, cal_r2_one_arr and error_metric, the sums are kept on device
+# and synchronized once per epoch, predictions are only kept (in a preallocated buffer) if save_np
+class StreamMetric:
+    def __init__(self, device, num, save_np=False):
+        self.device, self.num, self.save_np = device, num, save_np
+        self.true_buf, self.pred_buf = None, None
+        if save_np:
+            self.true_buf = torch.zeros(num, device=device)
+            self.pred_buf = torch.zeros(num, device=device)
+        self.reset()
+
+    def reset(self):
+        # n, sum(t), sum(p), sum(t^2), sum(p^2), sum(t*p), sum((t-p)^2)
+        self.s = torch.zeros(7, dtype=torch.float64, device=self.device)
+        self.c = 0
+        return None
+
+    def update(self, true, pred):
+        t, p = true.detach().reshape(-1), pred.detach().reshape(-1)
+        if self.save_np:
+            self.true_buf[self.c: self.c + t.shape[0]] = t
+            self.pred_buf[self.c: self.c + t.shape[0]] = p
+        self.c = self.c + t.shape[0]
+
+        t, p = t.double(), p.double()
+        self.s += torch.stack([torch.ones_like(t), t, p, t * t, p * p, t * p, torch.square(t - p)]).sum(dim=1)
+        return None
+
+    def result(self):
+        return cal_rmse_r2_sum(self.s.cpu().numpy())
+
+    # mean and std of pred - true (error_metric takes true - pred)
+    def error(self):
+        n, st, sp, _, _, _, se = self.s.cpu().numpy()
+        e_mean = (sp - st) / n
+        e_std = np.sqrt(max(se / n - e_mean ** 2, 0))
+        return e_mean, e_std
+
+    def get_np(self):
+        if not self.save_np:
+            return None, None
+        return self.true_buf[:self.c].cpu().numpy(), self.pred_buf[:self.c].cpu().numpy()
+
+
+def cal_rmse_r2_sum(s):
+    n, st, sp, stt, spp, stp, se = s
+    rmse = np.sqrt(se / n)
+    r = (n * stp - st * sp) / np.sqrt((n * stt - st ** 2) * (n * spp - sp ** 2))
+    return rmse, r ** 2
+
+
 # from https://doi.org/10.1029/2019GL085976
 class MagNet(nn.Module):
     def __init__(self):
@@ -799,12 +850,8 @@ def nvg(m, x):
 
 def tran_adm_to_edge_index(adm):
     u, v = np.nonzero(adm)
-    num_edges = u.shape[0]
     edge_index = np.vstack([u.reshape(1, -1), v.reshape(1, -1)])
-    edge_weight = np.zeros(shape=u.shape)
-    for i in range(num_edges):
-        edge_weight_one = adm[u[i], v[i]]
-        edge_weight[i] = edge_weight_one
+    edge_weight = adm[u, v]
     edge_index = torch.from_numpy(edge_index).long()
     edge_weight = torch.from_numpy(edge_weight).float()
     return edge_index, edge_weight
@@ -4,6 +4,9 @@ Functions for analysing the results
 import numpy as np
 import os.path as osp
 import pandas as pd
+import func.cache as cache
+import func.store as store
+import func.spatial as spatial
 
 
 def cal_rmse_one_arr(true, pred):
@@ -17,25 +20,61 @@ def cal_r2_one_arr(true, pred):
     return r2
 
 
-def judge_idx(*args):
-    def get_trace_idx(trace, trace_i):
-        idx_ = np.argwhere(trace == trace_i).reshape(-1)
-        if idx_.shape[0] == 0:
-            raise ValueError("!")
-        else:
-            return idx_[0]
+# hash table of trace name -> position (first occurrence), built once per result set or metadata
+def trace_index(trace_ref):
+    trace_ref = np.array(trace_ref).reshape(-1)
+    index = pd.Series(np.arange(trace_ref.shape[0]), index=trace_ref)
+    return index[~index.index.duplicated(keep="first")]
+
+
+# position of each trace in the given trace_index, vectorized join instead of searching one by one
+def get_trace_idx(index, trace):
+    loc = index.index.get_indexer(np.array(trace).reshape(-1))
+    if np.any(loc < 0):
+        raise ValueError("Some traces are not found!")
+    return index.values[loc]
 
+
+def judge_idx(*args):
     num = args[0].shape[0]          # number of samples in this trace
-    idx = [[] for _ in range(len(args))]
-    for i in range(num):
-        for j in range(len(args)):
-            if j == 0:
-                idx[j].append(i)
-            else:
-                idx[j].append(get_trace_idx(args[j], args[0][i]))
+    idx = [np.arange(num)]
+    for j in range(1, len(args)):
+        idx.append(get_trace_idx(trace_index(args[j]), args[0]))
     return tuple(idx)
 
 
+# statistics of value in bins of feature, e.g. errors on snr, distance, depth or magnitude
+# bins are right-closed except the first one, i.e. [e0, e1], (e1, e2], ..., as draw.error_fea_mean
+def binned_stat(value, fea, bins, v_min=None, v_max=None, q=(0.25, 0.5, 0.75)):
+    value, fea = np.array(value, dtype=float).reshape(-1), np.array(fea, dtype=float).reshape(-1)
+    v_min = np.min(fea) if v_min is None else v_min
+    v_max = np.max(fea) if v_max is None else v_max
+    edges = np.linspace(v_min, v_max, bins + 1)
+    remain = (fea >= v_min) & (fea <= v_max)
+    value, fea = value[remain], fea[remain]
+
+    idx = np.digitize(fea, edges[1:-1], right=True)
+    count = np.bincount(idx, minlength=bins)
+    valid = count > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(idx, weights=value, minlength=bins) / count
+        std = np.sqrt(np.bincount(idx, weights=np.square(value - mean[idx]), minlength=bins) / count)
+    stat = pd.DataFrame({"left": edges[:-1], "right": edges[1:], "mid": (edges[:-1] + edges[1:]) / 2,
+                         "count": count, "mean": mean, "std": std})
+
+    # quantiles (linear interpolation, as np.quantile) from values sorted inside each bin
+    value_sort = value[np.lexsort((value, idx))]
+    start = np.cumsum(count) - count
+    for q_one in q:
+        quantile = np.full(bins, np.nan)
+        if value_sort.shape[0] != 0:
+            pos = start[valid] + q_one * (count[valid] - 1)
+            lo, hi = np.floor(pos).astype(int), np.ceil(pos).astype(int)
+            quantile[valid] = value_sort[lo] + (value_sort[hi] - value_sort[lo]) * (pos - lo)
+        stat["q{:g}".format(q_one * 100)] = quantile
+    return stat
+
+
 def tran(pred, true, pos, trace, idx):
     pred_ = pred[idx]
     true_ = true[idx]
@@ -44,12 +83,29 @@ def tran(pred, true, pos, trace, idx):
     return pred_, true_, pos_, trace_
 
 
-# remain samples in given range
-def select_range(pos, true, trace, lat_min, lat_max, lon_min, lon_max, *args):
-    lon, lat = pos[:, 0], pos[:, 1]
-    idx = np.argwhere((lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)).reshape(-1)
+# remain samples in given range, index: spatial.GeoIndex of pos, for repeated queries on the same results
+def select_range(pos, true, trace, lat_min, lat_max, lon_min, lon_max, *args, index=None):
+    if index is None:
+        lon, lat = pos[:, 0], pos[:, 1]
+        idx = np.argwhere((lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)).reshape(-1)
+    else:
+        idx = index.box(lat_min, lat_max, lon_min, lon_max)
     if idx.shape[0] == 0:
         raise ValueError("The ranges of lat and lon is too small! Change or increase it.")
+    return remain(idx, pos, true, trace, *args)
+
+
+# remain samples within radius (km) of (lat, lon)
+def select_radius(pos, true, trace, lat, lon, radius, *args, index=None):
+    if index is None:
+        index = spatial.GeoIndex.from_pos(pos)
+    idx = np.sort(index.within(lat, lon, radius)[0])
+    if idx.shape[0] == 0:
+        raise ValueError("The radius is too small! Change or increase it.")
+    return remain(idx, pos, true, trace, *args)
+
+
+def remain(idx, pos, true, trace, *args):
     pos_, true_, trace_ = pos[idx, :], true[idx], trace[idx]
     res = [pos_, true_, trace_]
     for arg in args:
@@ -58,8 +114,13 @@ def select_range(pos, true, trace, lat_min, lat_max, lon_min, lon_max, *args):
     return tuple(res)
 
 
-# read npy outputted by Networks
+# read testing results of Networks, from the results store of the parent folder of ad (the latest run),
+# or the npy files written by older versions of process.save_result
 def read_npy(ad, sm_i, name, m_train, m_test):
+    db_ad = store.get_db(osp.dirname(osp.abspath(ad)))
+    run_id = store.latest_run(db_ad, osp.basename(osp.abspath(ad)), sm_i, name, m_train, m_test)
+    if run_id is not None:
+        return store.read_pred(db_ad, run_id, "test")
     pred = np.load(osp.join(ad, "test_pred_{}_{}_{}_{}.npy".format(sm_i, name, m_train, m_test)))
     true = np.load(osp.join(ad, "test_true_{}_{}_{}_{}.npy".format(sm_i, name, m_train, m_test)))
     pos = np.load(osp.join(ad, "test_pos_{}_{}_{}_{}.npy".format(sm_i, name, m_train, m_test)))
@@ -67,106 +128,57 @@ def read_npy(ad, sm_i, name, m_train, m_test):
     return pred, true, pos, trace
 
 
+# files of all models read by read_sm (results store and older npy), the cache of read_sm is refreshed once any of them changes
+def read_sm_files(sm_list, re_ad, name, m_train, m_test):
+    db_ad = store.get_db(osp.abspath(re_ad))
+    files = [db_ad, db_ad + "-wal"]
+    for sm_i in sm_list:
+        for model in ["MagInf", "EQGraphNet", "MagNet", "CREIME", "ConvNetQuake_INGV"]:
+            for key in ["pred", "true", "pos", "trace"]:
+                files.append(osp.join(re_ad, model, "test_{}_{}_{}_{}_{}.npy".format(key, sm_i, name, m_train, m_test)))
+    return files
+
+
 # read estimated results of operation
+@cache.cached(files=read_sm_files, deps=(read_npy, judge_idx, tran, trace_index, get_trace_idx))
 def read_sm(sm_list, re_ad, name, m_train, m_test):
-    m = m_train + m_test
-    pos_ad = osp.join(re_ad, "pos_{}_{}.npy".format(name, m))
-    true_ad = osp.join(re_ad, "true_{}_{}.npy".format(name, m))
-    trace_ad = osp.join(re_ad, "trace_{}_{}.npy".format(name, m))
-    pred_MaI_ad = osp.join(re_ad, "pred_MaI_{}_{}.npy".format(name, m))
-    pred_EQG_ad = osp.join(re_ad, "pred_EQG_{}_{}.npy".format(name, m))
-    pred_Mag_ad = osp.join(re_ad, "pred_Mag_{}_{}.npy".format(name, m))
-    pred_CRE_ad = osp.join(re_ad, "pred_CRE_{}_{}.npy".format(name, m))
-    pred_COI_ad = osp.join(re_ad, "pred_COI_{}_{}.npy".format(name, m))
-
-    if osp.exists(pos_ad) & osp.exists(true_ad) & osp.exists(pred_EQG_ad) & osp.exists(pred_Mag_ad) & \
-            osp.exists(pred_CRE_ad) & osp.exists(pred_COI_ad) & osp.exists(trace_ad):
-        pos_ = np.load(pos_ad)
-        true_ = np.load(true_ad)
-        trace_ = np.load(trace_ad)
-        pred_MaI_ = np.load(pred_MaI_ad)
-        pred_EQG_ = np.load(pred_EQG_ad)
-        pred_Mag_ = np.load(pred_Mag_ad)
-        pred_CRE_ = np.load(pred_CRE_ad)
-        pred_COI_ = np.load(pred_COI_ad)
-    else:
-        num = len(sm_list)
-        pos_, true_, trace_, pred_MaI_, pred_EQG_, pred_Mag_, pred_CRE_, pred_COI_ = 0, 0, 0, 0, 0, 0, 0, 0
-        for i in range(num):
-            sm_i = sm_list[i]
-
-            pred_MaI, true_MaI, pos_MaI, trace_MaI = read_npy(osp.join(re_ad, "MagInf"), sm_i, name, m_train, m_test)
-            pred_EQG, true_EQG, pos_EQG, trace_EQG = read_npy(osp.join(re_ad, "EQGraphNet"), sm_i, name, m_train, m_test)
-            pred_Mag, true_Mag, pos_Mag, trace_Mag = read_npy(osp.join(re_ad, "MagNet"), sm_i, name, m_train, m_test)
-            pred_CRE, true_CRE, pos_CRE, trace_CRE = read_npy(osp.join(re_ad, "CREIME"), sm_i, name, m_train, m_test)
-            pred_COI, true_COI, pos_COI, trace_COI = read_npy(osp.join(re_ad, "ConvNetQuake_INGV"), sm_i, name, m_train, m_test)
-
-            idx_MaI, idx_EQG, idx_Mag, idx_CRE, idx_COI = judge_idx(trace_MaI, trace_EQG, trace_Mag, trace_CRE, trace_COI)
-            pred_MaI, true_MaI, pos_MaI, trace_MaI = tran(pred_MaI, true_MaI, pos_MaI, trace_MaI, idx_MaI)
-            pred_EQG, true_EQG, pos_EQG, trace_EQG = tran(pred_EQG, true_EQG, pos_EQG, trace_EQG, idx_EQG)
-            pred_Mag, true_Mag, pos_Mag, trace_Mag = tran(pred_Mag, true_Mag, pos_Mag, trace_Mag, idx_Mag)
-            pred_CRE, true_CRE, pos_CRE, trace_CRE = tran(pred_CRE, true_CRE, pos_CRE, trace_CRE, idx_CRE)
-            pred_COI, true_COI, pos_COI, trace_COI = tran(pred_COI, true_COI, pos_COI, trace_COI, idx_COI)
-            pos, true, trace = pos_Mag, true_Mag, trace_Mag       # all models are the same
-
-            if i == 0:
-                pos_, true_, trace_ = pos, true, trace
-                pred_MaI_, pred_EQG_, pred_Mag_, pred_CRE_, pred_COI_ = pred_MaI, pred_EQG, pred_Mag, pred_CRE, pred_COI
-            else:
-                pos_ = np.concatenate((pos_, pos), axis=0)
-                true_ = np.concatenate((true_, true), axis=0)
-                trace_ = np.concatenate((trace_, trace), axis=0)
-                pred_MaI_ = np.concatenate((pred_MaI_, pred_MaI), axis=0)
-                pred_EQG_ = np.concatenate((pred_EQG_, pred_EQG), axis=0)
-                pred_Mag_ = np.concatenate((pred_Mag_, pred_Mag), axis=0)
-                pred_CRE_ = np.concatenate((pred_CRE_, pred_CRE), axis=0)
-                pred_COI_ = np.concatenate((pred_COI_, pred_COI), axis=0)
-
-        np.save(pos_ad, pos_)
-        np.save(true_ad, true_)
-        np.save(trace_ad, trace_)
-        np.save(pred_MaI_ad, pred_MaI_)
-        np.save(pred_EQG_ad, pred_EQG_)
-        np.save(pred_Mag_ad, pred_Mag_)
-        np.save(pred_CRE_ad, pred_CRE_)
-        np.save(pred_COI_ad, pred_COI_)
+    num = len(sm_list)
+    pos_, true_, trace_, pred_MaI_, pred_EQG_, pred_Mag_, pred_CRE_, pred_COI_ = 0, 0, 0, 0, 0, 0, 0, 0
+    for i in range(num):
+        sm_i = sm_list[i]
+
+        pred_MaI, true_MaI, pos_MaI, trace_MaI = read_npy(osp.join(re_ad, "MagInf"), sm_i, name, m_train, m_test)
+        pred_EQG, true_EQG, pos_EQG, trace_EQG = read_npy(osp.join(re_ad, "EQGraphNet"), sm_i, name, m_train, m_test)
+        pred_Mag, true_Mag, pos_Mag, trace_Mag = read_npy(osp.join(re_ad, "MagNet"), sm_i, name, m_train, m_test)
+        pred_CRE, true_CRE, pos_CRE, trace_CRE = read_npy(osp.join(re_ad, "CREIME"), sm_i, name, m_train, m_test)
+        pred_COI, true_COI, pos_COI, trace_COI = read_npy(osp.join(re_ad, "ConvNetQuake_INGV"), sm_i, name, m_train, m_test)
+
+        idx_MaI, idx_EQG, idx_Mag, idx_CRE, idx_COI = judge_idx(trace_MaI, trace_EQG, trace_Mag, trace_CRE, trace_COI)
+        pred_MaI, true_MaI, pos_MaI, trace_MaI = tran(pred_MaI, true_MaI, pos_MaI, trace_MaI, idx_MaI)
+        pred_EQG, true_EQG, pos_EQG, trace_EQG = tran(pred_EQG, true_EQG, pos_EQG, trace_EQG, idx_EQG)
+        pred_Mag, true_Mag, pos_Mag, trace_Mag = tran(pred_Mag, true_Mag, pos_Mag, trace_Mag, idx_Mag)
+        pred_CRE, true_CRE, pos_CRE, trace_CRE = tran(pred_CRE, true_CRE, pos_CRE, trace_CRE, idx_CRE)
+        pred_COI, true_COI, pos_COI, trace_COI = tran(pred_COI, true_COI, pos_COI, trace_COI, idx_COI)
+        pos, true, trace = pos_Mag, true_Mag, trace_Mag       # all models are the same
+
+        if i == 0:
+            pos_, true_, trace_ = pos, true, trace
+            pred_MaI_, pred_EQG_, pred_Mag_, pred_CRE_, pred_COI_ = pred_MaI, pred_EQG, pred_Mag, pred_CRE, pred_COI
+        else:
+            pos_ = np.concatenate((pos_, pos), axis=0)
+            true_ = np.concatenate((true_, true), axis=0)
+            trace_ = np.concatenate((trace_, trace), axis=0)
+            pred_MaI_ = np.concatenate((pred_MaI_, pred_MaI), axis=0)
+            pred_EQG_ = np.concatenate((pred_EQG_, pred_EQG), axis=0)
+            pred_Mag_ = np.concatenate((pred_Mag_, pred_Mag), axis=0)
+            pred_CRE_ = np.concatenate((pred_CRE_, pred_CRE), axis=0)
+            pred_COI_ = np.concatenate((pred_COI_, pred_COI), axis=0)
 
     return pos_, true_, trace_, pred_MaI_, pred_EQG_, pred_Mag_, pred_CRE_, pred_COI_
 
 
-def select_trace(trace, df, re_ad, name, m):
-    df_idx_ad = osp.join(re_ad, "df_idx_{}_{}.npy".format(name, m))
-    if osp.exists(df_idx_ad):
-        idx = np.load(df_idx_ad)
-    else:
-        df_trace = df["trace_name"].values.reshape(-1)
-        num = trace.shape[0]
-        idx = []
-        for i in range(num):
-            trace_i = trace[i]
-            idx_i = np.argwhere(df_trace == trace_i).reshape(-1)
-            if idx_i.shape[0] == 0:
-                raise ValueError("!")
-            else:
-                idx.append(idx_i[0])
-        idx = np.array(idx)
-        np.save(df_idx_ad, idx)
-    df_ = df.iloc[idx, :]
-    return df_
-
-
-def select_trace_small(trace, df):
-    df_trace = df["trace_name"].values.reshape(-1)
-    num = trace.shape[0]
-    idx = []
-    for i in range(num):
-        trace_i = trace[i]
-        idx_i = np.argwhere(df_trace == trace_i).reshape(-1)
-        if idx_i.shape[0] == 0:
-            raise ValueError("!")
-        else:
-            idx.append(idx_i[0])
-    idx = np.array(idx)
+def select_trace(trace, df):
+    idx = get_trace_idx(trace_index(df["trace_name"].values), trace)
     df_ = df.iloc[idx, :]
     return df_
 
@@ -180,11 +192,7 @@ def load_txt(file_ad):
 
 def get_eq_info(root, name, trace):
     df = pd.read_csv(osp.join(root, name + ".csv"))
-    df_trace = df.loc[:, "trace_name"].values.reshape(-1)
-    idx = []
-    for trace_one in trace:
-        idx_one = np.argwhere(df_trace == trace_one).reshape(-1)[0]
-        idx.append(idx_one)
-    idx = np.sort(np.array(idx))
+    idx = get_trace_idx(trace_index(df["trace_name"].values), trace)
+    idx = np.sort(idx)
     df = df.iloc[idx, :]
     return df
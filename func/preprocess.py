@@ -0,0 +1,112 @@
+"""
+Batched preprocessing of raw traces, as process() of reality_get_data.py but on stacked arrays
+FFT resampling (as obspy Trace.resample), trim/pad with zeros (as Stream.trim(pad=True, fill_value=0)) and
+demean/linear detrend (as Trace.detrend) are applied to all traces of one array at once, traces in shape of (n, npts)
+"""
+import math
+import numpy as np
+from scipy.signal import get_window
+
+
+# list of 1-D arrays of different lengths -> zero-padded array in shape of (n, length), and the lengths
+def stack(arrays, length=None):
+    lengths = np.array([one.shape[-1] for one in arrays], dtype=int)
+    length = (lengths.max() if lengths.shape[0] != 0 else 0) if length is None else length
+    out = np.zeros((len(arrays), length), dtype=float)
+    for i, one in enumerate(arrays):
+        out[i, :min(lengths[i], length)] = one[:length]
+    return out, lengths
+
+
+# FFT resampling along the last axis, the same as obspy Trace.resample(fs_new, window, no_filter=True)
+def resample(x, fs, fs_new, window="hann"):
+    x = np.asarray(x, dtype=float)
+    npts = x.shape[-1]
+    num = int(npts / (fs / float(fs_new)))
+    x_r = np.fft.rfft(x, axis=-1)
+    if window is not None:
+        x_r = x_r * np.fft.ifftshift(get_window(window, npts))[:npts // 2 + 1]
+    # linear interpolation of the spectrum onto the new frequencies, weights are shared by all traces
+    df = fs / npts
+    f_new = fs_new / num * np.arange(num // 2 + 1)
+    pos = np.clip(f_new / df, 0, npts // 2)
+    i0 = np.floor(pos).astype(int)
+    i1 = np.minimum(i0 + 1, npts // 2)
+    w = pos - i0
+    y_r = x_r[..., i0] * (1 - w) + x_r[..., i1] * w
+    return np.fft.irfft(y_r, num, axis=-1) * (num / float(npts))
+
+
+# samples [offset, offset + length) of each trace, zeros outside of the trace, offset is a scalar or in shape of (n,)
+def trim(x, offset, length):
+    x = np.asarray(x)
+    n, npts = x.reshape(-1, x.shape[-1]).shape
+    offset = np.broadcast_to(np.asarray(offset, dtype=int).reshape(-1), (n,))
+    idx = offset.reshape(-1, 1) + np.arange(length).reshape(1, -1)
+    valid = (idx >= 0) & (idx < npts)
+    out = np.where(valid, np.take_along_axis(x.reshape(n, npts), np.clip(idx, 0, max(npts - 1, 0)), axis=1), 0)
+    return out.reshape(x.shape[:-1] + (length,))
+
+
+# zero-padding (or cutting) to length along the last axis, e.g. (chan, 3, 6000) as the input of models
+def pad(x, length=6000):
+    x = np.asarray(x)
+    out = np.zeros(x.shape[:-1] + (length,), dtype=x.dtype)
+    out[..., :min(x.shape[-1], length)] = x[..., :length]
+    return out
+
+
+def detrend(x, style="linear"):
+    x = np.asarray(x, dtype=float)
+    if style == "demean":
+        return x - x.mean(axis=-1, keepdims=True)
+    elif style == "linear":
+        t = np.arange(x.shape[-1], dtype=float)
+        t = t - t.mean()
+        x = x - x.mean(axis=-1, keepdims=True)
+        slope = (x @ t) / max((t * t).sum(), 1e-12)
+        return x - slope[..., np.newaxis] * t
+    else:
+        raise TypeError("Unknown type of style, must be 'demean' or 'linear'!")
+
+
+# resample -> trim/pad -> demean -> linear detrend, offset is counted in samples of fs_new
+def process(x, fs, fs_new, offset, length):
+    x = resample(x, fs, fs_new)
+    x = trim(x, offset, length)
+    return detrend(detrend(x, "demean"), "linear")
+
+
+# rounding half away from zero, as obspy (compatibility.round_away)
+def round_away(x):
+    floor = math.floor(x)
+    if x - floor == 0.5:
+        return floor + 1 if x > 0 else floor
+    return int(round(x))
+
+
+# first and last samples (of the trace resampled to fs_new) kept by Stream.trim(time_begin, time_end, pad=True),
+# time_begin is moved to the nearest sample from the beginning of the trace, time_end from the end of the trace
+def trim_range(tr, time_begin, time_end, fs_new):
+    num = int(tr.stats.npts / (tr.stats.sampling_rate / float(fs_new)))
+    time_last = tr.stats.starttime + (num - 1) * (1.0 / fs_new)
+    first = round_away((time_begin - tr.stats.starttime) * fs_new)
+    last = num - 1 + round_away((time_end - time_last) * fs_new)
+    return first, last
+
+
+# obspy Traces -> array in shape of (n, length) in [time_begin, time_end], nearest samples as Stream.trim
+# a trace with time_begin or time_end half way between two samples has one sample less, padded with zero at the end
+# traces of the same npts, sampling rate and length are processed together
+def process_traces(traces, time_begin, time_end, fs_new):
+    length = int(round((time_end - time_begin) * fs_new)) + 1
+    out = np.zeros((len(traces), length), dtype=float)
+    groups, offset = {}, np.zeros(len(traces), dtype=int)
+    for i, tr in enumerate(traces):
+        first, last = trim_range(tr, time_begin, time_end, fs_new)
+        offset[i] = first
+        groups.setdefault((tr.stats.npts, tr.stats.sampling_rate, min(last - first + 1, length)), []).append(i)
+    for (npts, fs, length_one), idx in groups.items():
+        x = np.stack([traces[i].data for i in idx]).astype(float)
+        out[idx, :length_one] = process(x, fs, fs_new, offset[idx], length_one)
+    return out
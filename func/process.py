@@ -10,14 +10,68 @@ import os
 import os.path as osp
 from torch.utils.data import Dataset, DataLoader
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
+import func.store as store
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# columns of metadata read by the robust tests: magnitude and its type, arrivals for MagInfoNet / CREIME
+META_EVAL = ["source_magnitude", "source_magnitude_type", "p_arrival_sample", "s_arrival_sample", "p_travel_sec"]
+
+
+# parse columns stored as strings of arrays, e.g. snr_db "[12.3 45.6  7.8]" or coda_end_sample "[[3999.]]"
+def parse_arr(values, n):
+    s = pd.Series(values).astype(str).str.strip("[] ")
+    arr = s.str.split(expand=True).reindex(columns=range(n))
+    return arr.apply(pd.to_numeric, errors="coerce").values.astype(np.float32)
+
+
+# conversion of STEAD metadata (csv) into a typed columnar file (parquet), only parsed if save is False
+def tran_meta(root, name, save=True):
+    df = pd.read_csv(osp.join(root, name + ".csv"), low_memory=False)
+    df["row"] = np.arange(df.shape[0])                 # row of trace_name in csv, i.e. the index used by Chunk
+    snr = parse_arr(df["snr_db"].values, 3)
+    df["snr_db_e"], df["snr_db_n"], df["snr_db_z"] = snr[:, 0], snr[:, 1], snr[:, 2]
+    df["coda_end"] = parse_arr(df["coda_end_sample"].values, 1)[:, 0]
+    df["source_magnitude_type"] = df["source_magnitude_type"].astype("category")
+    if save:
+        df.to_parquet(osp.join(root, name + ".parquet"), index=False)
+    return df
+
+
+META_CACHE = {}
+
+
+# read metadata from the columnar file, converted at the first time and again once the csv is newer than it, only the
+# given columns are read, without pyarrow the csv is parsed (once per csv) in the same way and nothing is written
+def read_meta(root, name, columns=None):
+    if columns is not None:
+        columns = list(columns)
+        if "trace_name" not in columns:
+            columns = ["trace_name"] + columns
+    csv_ad, meta_ad = osp.join(root, name + ".csv"), osp.join(root, name + ".parquet")
+    t_csv = osp.getmtime(csv_ad) if osp.exists(csv_ad) else None
+    key = (root, name, None if columns is None else tuple(columns), t_csv)
+    if key not in META_CACHE:
+        if pyarrow is None:
+            key_all = (root, name, None, t_csv)
+            if key_all not in META_CACHE:
+                META_CACHE[key_all] = tran_meta(root, name, save=False)
+            META_CACHE[key] = META_CACHE[key_all] if columns is None else META_CACHE[key_all][columns]
+        else:
+            if not osp.exists(meta_ad) or (t_csv is not None and t_csv > osp.getmtime(meta_ad)):
+                tran_meta(root, name)
+            META_CACHE[key] = pd.read_parquet(meta_ad, columns=columns)
+    return META_CACHE[key]
 
 
 class Chunk(Dataset):
-    def __init__(self, num, train, num_train, idx, root, name):
+    def __init__(self, num, train, num_train, idx, root, name, columns=None):
         super(Chunk, self).__init__()
         self.num, self.root, self.name = num, root, name
         self.save_ad = osp.join(root, str(num))
-        self.df = pd.read_csv(osp.join(self.root, self.name + ".csv"))
+        self.df = read_meta(self.root, self.name, columns)
         self.data, self.index = self.get_sample()
         self.df = self.df.iloc[self.index, :]
         self.num_train = num_train
@@ -276,35 +330,42 @@ def add_noise(data_train, data_test, sm_train, sm_test, root_no, name_no, m, thr
     return train_data, test_data, train_sm, test_sm
 
 
+# the run is written into the results store (see func/store.py) of the parent folder of re_ad, the model is named
+# by the folder of re_ad, predictions and losses are only stored if save_np / save_loss, return run_id (None if not stored)
 def save_result(re_ad, model, save_np, save_model, save_loss, sm_scale, name, m_train, m_test,
                 train_true, train_pred, train_trace, train_pos, train_loss,
-                test_true, test_pred, test_trace, test_pos, test_loss):
+                test_true, test_pred, test_trace, test_pos, test_loss,
+                config=None, metrics=None, duration=None, save_run=False):
+    train, test, loss_train, loss_test = None, None, None, None
     if save_np:
-        np.save(osp.join(re_ad, "train_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), train_true)
-        np.save(osp.join(re_ad, "train_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), train_pred)
-        np.save(osp.join(re_ad, "train_trace_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), train_trace)
-        np.save(osp.join(re_ad, "train_pos_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), train_pos)
-        np.save(osp.join(re_ad, "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), test_true)
-        np.save(osp.join(re_ad, "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), test_pred)
-        np.save(osp.join(re_ad, "test_trace_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), test_trace)
-        np.save(osp.join(re_ad, "test_pos_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), test_pos)
+        train = (train_true, train_pred, train_trace, train_pos)
+        test = (test_true, test_pred, test_trace, test_pos)
     if save_model:
         torch.save(model.state_dict(),
                    osp.join(re_ad, "model_{}_{}_{}_{}.pkl".format(sm_scale, name, m_train, m_test)))
     if save_loss:
-        np.save(osp.join(re_ad, "train_loss_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), train_loss)
-        np.save(osp.join(re_ad, "test_loss_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)), test_loss)
-    return True
+        loss_train, loss_test = train_loss, test_loss
+    if not (save_run or save_np or save_loss):
+        return None
+    db_ad = store.get_db(osp.dirname(osp.abspath(re_ad)))
+    return store.save_run(db_ad, osp.basename(osp.abspath(re_ad)), sm_scale, name, m_train, m_test, config, metrics,
+                          duration, train, test, loss_train, loss_test)
 
 
-def read_coda(df):
-    coda = df['coda_end_sample'].values.reshape(-1)
+# snr of E, N, Z channels in shape of (n, 3), the typed columns of read_meta are used if available
+def read_snr(df):
+    if "snr_db_e" in df.columns:
+        return df[["snr_db_e", "snr_db_n", "snr_db_z"]].values.astype(float)
+    return parse_arr(df["snr_db"].values, 3).astype(float)
 
-    def tran_one(element):
-        return int(element.split('[')[-1].split('.')[0])
 
-    coda = list(tran_one(item) for item in coda)
-    return coda
+# end of coda (sample) as float, nan if it is missing or not a number (casting nan to int gives INT64_MIN)
+def read_coda(df):
+    if "coda_end" in df.columns:
+        coda = df["coda_end"].values
+    else:
+        coda = parse_arr(df["coda_end_sample"].values, 1)[:, 0]
+    return coda.astype(float)
 
 
 def cal_mag(output):
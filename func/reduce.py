@@ -0,0 +1,74 @@
+"""
+Dimensionality reduction of hidden features, for data larger than memory (e.g. memmaps of func/extract.py)
+pca: IncrementalPCA over chunks, rpca: randomized PCA, tsne: Barnes-Hut t-SNE (multi-threaded) after PCA to 50 dims,
+the FFT-accelerated t-SNE of openTSNE is used if it is installed
+every function returns (embedding, info), info records the running time and the peak memory of python allocations
+"""
+import numpy as np
+import time
+import tracemalloc
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.manifold import TSNE
+try:
+    from openTSNE import TSNE as FFTTSNE
+except ImportError:
+    FFTTSNE = None
+
+
+def flat(data):
+    return data.reshape(data.shape[0], -1)
+
+
+# fit on chunks of rows, only one chunk is loaded into memory at a time
+def pca_chunk(data, n_components, chunk=4096):
+    data = flat(data)
+    num = data.shape[0]
+    chunk = max(chunk, n_components)
+    tool = IncrementalPCA(n_components=n_components)
+    for i in range(0, num, chunk):
+        if num - i < n_components:            # partial_fit needs at least n_components samples
+            break
+        tool.partial_fit(np.asarray(data[i: i + chunk], dtype=np.float32))
+    out = np.zeros((num, n_components), dtype=np.float32)
+    for i in range(0, num, chunk):
+        out[i: i + chunk] = tool.transform(np.asarray(data[i: i + chunk], dtype=np.float32))
+    return out
+
+
+def pca_randomized(data, n_components):
+    tool = PCA(n_components=n_components, svd_solver="randomized", random_state=0)
+    return tool.fit_transform(np.asarray(flat(data), dtype=np.float32)).astype(np.float32)
+
+
+def tsne(data, n_components, n_pca=50, n_jobs=-1, chunk=4096):
+    data = flat(data)
+    if data.shape[1] > n_pca:
+        data = pca_chunk(data, n_pca, chunk)
+    data = np.asarray(data, dtype=np.float32)
+    if FFTTSNE is not None and n_components <= 2:
+        return np.asarray(FFTTSNE(n_components=n_components, n_jobs=n_jobs, random_state=0).fit(data))
+    tool = TSNE(n_components=n_components, method="barnes_hut", init="pca", n_jobs=n_jobs, random_state=0)
+    return tool.fit_transform(data)
+
+
+def reduce(data, dc_style, n_components, chunk=4096):
+    tracemalloc.start()
+    t_start = time.time()
+    if dc_style == "pca":
+        out = pca_chunk(data, n_components, chunk)
+    elif dc_style == "rpca":
+        out = pca_randomized(data, n_components)
+    elif dc_style == "tsne":
+        out = tsne(data, n_components, chunk=chunk)
+    else:
+        raise TypeError("Unknown type of dc_style, must be 'pca', 'rpca' or 'tsne'!")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    info = {"style": dc_style, "num": data.shape[0], "dim": int(np.prod(data.shape[1:])),
+            "n_components": n_components, "time": time.time() - t_start, "memory": peak / 1024 ** 2}
+    return out, info
+
+
+def print_info(info):
+    print("{}: {} samples, {} -> {} dims, {:.1f} s, peak memory {:.1f} MB".format(
+        info["style"], info["num"], info["dim"], info["n_components"], info["time"], info["memory"]))
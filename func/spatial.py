@@ -0,0 +1,79 @@
+"""
+Spatial index of stations and events, BallTree on the haversine distance
+nearest-K and within-radius queries in O(log n) per query, bounding boxes by binary search on the sorted latitude
+"""
+import numpy as np
+from sklearn.neighbors import BallTree
+
+R_EARTH = 6371.0            # km
+
+
+# great-circle distance (km), element-wise
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * R_EARTH * np.arcsin(np.sqrt(a))
+
+
+class GeoIndex:
+    def __init__(self, lat, lon, leaf_size=40):
+        self.lat = np.asarray(lat, dtype=float).reshape(-1)
+        self.lon = np.asarray(lon, dtype=float).reshape(-1)
+        self.tree = BallTree(np.radians(np.stack([self.lat, self.lon], axis=1)), leaf_size=leaf_size,
+                             metric="haversine")
+        self.lat_order = np.argsort(self.lat, kind="stable")
+        self.lat_sort = self.lat[self.lat_order]
+
+    def __len__(self):
+        return self.lat.shape[0]
+
+    # pos is in shape of (n, 2) as (lon, lat), the same as the pos of results
+    @classmethod
+    def from_pos(cls, pos, leaf_size=40):
+        pos = np.asarray(pos, dtype=float)
+        return cls(pos[:, 1], pos[:, 0], leaf_size)
+
+    # k nearest points of each query point, return distance (km) and index in shape of (num of query, k)
+    def nearest(self, lat, lon, k=1):
+        query = np.radians(np.stack([np.atleast_1d(lat), np.atleast_1d(lon)], axis=1).astype(float))
+        dist, idx = self.tree.query(query, k=min(k, len(self)))
+        return dist * R_EARTH, idx
+
+    # points within radius (km) of each query point, return a list of index (and distance), sorted by distance
+    def within(self, lat, lon, radius, return_distance=False):
+        query = np.radians(np.stack([np.atleast_1d(lat), np.atleast_1d(lon)], axis=1).astype(float))
+        idx, dist = self.tree.query_radius(query, r=radius / R_EARTH, return_distance=True, sort_results=True)
+        if return_distance:
+            return list(idx), [one * R_EARTH for one in dist]
+        return list(idx)
+
+    # points in the bounding box, only the slice of latitude is checked for longitude
+    def box(self, lat_min, lat_max, lon_min, lon_max):
+        start = np.searchsorted(self.lat_sort, lat_min, side="left")
+        end = np.searchsorted(self.lat_sort, lat_max, side="right")
+        idx = self.lat_order[start:end]
+        lon = self.lon[idx]
+        return np.sort(idx[(lon >= lon_min) & (lon <= lon_max)])
+
+
+# stations in station.dat (lon lat net sta chan elev), as written by download.makeDatFile
+def read_station_dat(station_file):
+    lon, lat, net, sta, chan, elev = [], [], [], [], [], []
+    with open(station_file, "r") as f:
+        for line in f:
+            if line.strip() == "":
+                continue
+            lon_one, lat_one, net_one, sta_one, chan_one, elev_one = line.split()
+            lon.append(float(lon_one)), lat.append(float(lat_one)), elev.append(float(elev_one))
+            net.append(net_one), sta.append(sta_one), chan.append(chan_one)
+    return {"lon": np.array(lon), "lat": np.array(lat), "net": np.array(net), "sta": np.array(sta),
+            "chan": np.array(chan), "elev": np.array(elev)}
+
+
+# stations for an event: the k nearest ones, or all within radius (km) if radius is given
+def pick_stations(index, lat, lon, k=10, radius=None):
+    if radius is not None:
+        idx, dist = index.within(lat, lon, radius, return_distance=True)
+        return idx[0], dist[0]
+    dist, idx = index.nearest(lat, lon, k)
+    return idx[0], dist[0]
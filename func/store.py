@@ -0,0 +1,225 @@
+"""
+Results store of training runs, one SQLite database per result folder (e.g. ../result/mag_predict/results.db)
+runs: one row per run (config, metrics, timing), pred: predictions of each run, with dictionary-encoded trace names
+loss: loss of each epoch, the database is in WAL mode, so that several training scripts can write at the same time
+"""
+import numpy as np
+import pandas as pd
+import os.path as osp
+import sqlite3
+import json
+import time
+
+DB_NAME = "results.db"
+SPLIT = {"train": 0, "test": 1}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT NOT NULL,
+    sm_scale TEXT,
+    name TEXT,
+    m_train INTEGER,
+    m_test INTEGER,
+    created REAL,
+    duration REAL,
+    r2_test REAL,
+    r2_train REAL,
+    rmse_test REAL,
+    rmse_train REAL,
+    config TEXT,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_key ON runs (model, sm_scale, name, m_train, m_test);
+CREATE TABLE IF NOT EXISTS trace (
+    trace_id INTEGER PRIMARY KEY,
+    trace_name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS pred (
+    run_id INTEGER NOT NULL,
+    split INTEGER NOT NULL,
+    trace_id INTEGER,
+    y_true REAL,
+    y_pred REAL,
+    lon REAL,
+    lat REAL
+);
+CREATE INDEX IF NOT EXISTS pred_run ON pred (run_id, split);
+CREATE TABLE IF NOT EXISTS loss (
+    run_id INTEGER NOT NULL,
+    split INTEGER NOT NULL,
+    epoch INTEGER,
+    loss REAL
+);
+"""
+
+
+def get_db(re_ad):
+    return osp.join(re_ad, DB_NAME)
+
+
+def connect(db_ad):
+    con = sqlite3.connect(db_ad, timeout=600)         # wait for the other writers
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(SCHEMA)
+    return con
+
+
+def to_float(value):
+    if value is None:
+        return None
+    return float(np.array(value).reshape(-1)[0])
+
+
+# dictionary encoding of trace names, new names are inserted once
+def get_trace_id(con, trace):
+    trace = np.array(trace).reshape(-1).astype(str)
+    unique, inverse = np.unique(trace, return_inverse=True)
+    con.executemany("INSERT OR IGNORE INTO trace (trace_name) VALUES (?)", [(one,) for one in unique.tolist()])
+    ids = {}
+    for i in range(0, unique.shape[0], 900):            # limit of variables in one statement of SQLite
+        chunk = unique[i: i + 900].tolist()
+        rows = con.execute("SELECT trace_name, trace_id FROM trace WHERE trace_name IN ({})".format(
+            ",".join(["?"] * len(chunk))), chunk).fetchall()
+        ids.update(rows)
+    return np.array([ids[one] for one in unique.tolist()], dtype=np.int64)[inverse]
+
+
+def insert_pred(con, run_id, split, true, pred, trace=None, pos=None):
+    true, pred = np.array(true, dtype=float).reshape(-1), np.array(pred, dtype=float).reshape(-1)
+    num = true.shape[0]
+    trace_id = get_trace_id(con, trace).tolist() if trace is not None else [None] * num
+    if pos is not None:
+        pos = np.array(pos, dtype=float).reshape(num, -1)
+        lon, lat = pos[:, 0].tolist(), pos[:, 1].tolist()
+    else:
+        lon, lat = [None] * num, [None] * num
+    con.executemany("INSERT INTO pred (run_id, split, trace_id, y_true, y_pred, lon, lat) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    zip([run_id] * num, [SPLIT[split]] * num, trace_id, true.tolist(), pred.tolist(), lon, lat))
+
+
+def insert_loss(con, run_id, split, loss):
+    loss = np.array(loss, dtype=float).reshape(-1).tolist()
+    con.executemany("INSERT INTO loss (run_id, split, epoch, loss) VALUES (?, ?, ?, ?)",
+                    [(run_id, SPLIT[split], i, one) for i, one in enumerate(loss)])
+
+
+# write one run within a single transaction, return run_id
+def save_run(db_ad, model, sm_scale, name, m_train, m_test, config=None, metrics=None, duration=None,
+             train=None, test=None, train_loss=None, test_loss=None):
+    config = {} if config is None else config
+    metrics = {} if metrics is None else {k: to_float(v) for k, v in metrics.items()}
+    con = connect(db_ad)
+    try:
+        with con:
+            cur = con.execute(
+                "INSERT INTO runs (model, sm_scale, name, m_train, m_test, created, duration, r2_test, r2_train, "
+                "rmse_test, rmse_train, config, metrics) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (model, sm_scale, name, int(m_train), int(m_test), time.time(), to_float(duration),
+                 metrics.get("r2_test"), metrics.get("r2_train"), metrics.get("rmse_test"), metrics.get("rmse_train"),
+                 json.dumps(config, default=str), json.dumps(metrics)))
+            run_id = cur.lastrowid
+            if train is not None:
+                insert_pred(con, run_id, "train", *train)
+            if test is not None:
+                insert_pred(con, run_id, "test", *test)
+            if train_loss is not None:
+                insert_loss(con, run_id, "train", train_loss)
+            if test_loss is not None:
+                insert_loss(con, run_id, "test", test_loss)
+    finally:
+        con.close()
+    return run_id
+
+
+# one run per model of an experiment (e.g. robust tests of several models at one snr), metrics: {model: {name: value}}
+def save_runs(db_ad, metrics, sm_scale, name, m_train, m_test, config=None, duration=None):
+    return [save_run(db_ad, model, sm_scale, name, m_train, m_test, config, one, duration)
+            for model, one in metrics.items()]
+
+
+# all runs in a DataFrame, the items of config and metrics are expanded into columns
+def read_runs(db_ad, model=None):
+    con = connect(db_ad)
+    try:
+        if model is None:
+            runs = pd.read_sql("SELECT * FROM runs ORDER BY run_id", con)
+        else:
+            runs = pd.read_sql("SELECT * FROM runs WHERE model = ? ORDER BY run_id", con, params=(model,))
+    finally:
+        con.close()
+    config = pd.DataFrame([json.loads(one) for one in runs["config"].values], index=runs.index)
+    config = config.drop(columns=[one for one in config.columns if one in runs.columns])
+    metrics = pd.DataFrame([json.loads(one) for one in runs["metrics"].values], index=runs.index)
+    metrics = metrics.drop(columns=[one for one in metrics.columns if one in runs.columns or one in config.columns])
+    return pd.concat([runs.drop(columns=["config", "metrics"]), config, metrics], axis=1)
+
+
+# runs of an experiment in one table, as the former *_result.txt of factor scripts
+# one row per value of key (an item of config, e.g. snr), columns are <metric>_<model> (metric without '_test'),
+# only the latest run of each (key, model) is kept, where: items of config or runs to select (e.g. sm_scale="ml")
+def pivot_runs(db_ad, key, models, metrics=("r2_test", "rmse_test"), **where):
+    runs = read_runs(db_ad)
+    if key not in runs.columns:
+        runs[key] = np.nan
+    runs = runs[runs["model"].isin(models)]
+    for column, value in where.items():
+        runs = runs[runs[column] == value] if column in runs.columns else runs.iloc[:0]
+    runs = runs.sort_values("run_id").drop_duplicates([key, "model"], keep="last")
+    table = pd.DataFrame({key: np.sort(runs[key].unique())})
+    for metric in metrics:
+        for model in models:
+            one = runs[runs["model"] == model].set_index(key)[metric]
+            table["{}_{}".format(metric.replace("_test", ""), model)] = table[key].map(one).values
+    return table
+
+
+# the latest run of a model with the given setting, None if not found
+def latest_run(db_ad, model, sm_scale, name, m_train, m_test, with_pred=True):
+    if not osp.exists(db_ad):
+        return None
+    con = connect(db_ad)
+    try:
+        sql = "SELECT run_id FROM runs WHERE model = ? AND sm_scale = ? AND name = ? AND m_train = ? AND m_test = ?"
+        if with_pred:
+            sql = sql + " AND EXISTS (SELECT 1 FROM pred WHERE pred.run_id = runs.run_id)"
+        row = con.execute(sql + " ORDER BY run_id DESC LIMIT 1",
+                          (model, sm_scale, name, int(m_train), int(m_test))).fetchone()
+    finally:
+        con.close()
+    return None if row is None else row[0]
+
+
+# predictions of one run, in the same order as process.save_result: pred, true, pos, trace
+def read_pred(db_ad, run_id, split="test"):
+    con = connect(db_ad)
+    try:
+        df = pd.read_sql("SELECT pred.y_pred, pred.y_true, pred.lon, pred.lat, trace.trace_name FROM pred "
+                         "LEFT JOIN trace ON pred.trace_id = trace.trace_id "
+                         "WHERE pred.run_id = ? AND pred.split = ? ORDER BY pred.rowid",
+                         con, params=(int(run_id), SPLIT[split]))
+    finally:
+        con.close()
+    pos = df[["lon", "lat"]].values
+    trace = df["trace_name"].values.reshape(-1, 1)
+    return df["y_pred"].values, df["y_true"].values, pos, trace
+
+
+def read_loss(db_ad, run_id, split="test"):
+    con = connect(db_ad)
+    try:
+        rows = con.execute("SELECT loss FROM loss WHERE run_id = ? AND split = ? ORDER BY epoch",
+                           (int(run_id), SPLIT[split])).fetchall()
+    finally:
+        con.close()
+    return np.array([row[0] for row in rows])
+
+
+# predictions of the latest run of a model, same as reading test_pred / test_true / test_pos / test_trace npy
+def read_latest_pred(re_ad, model, sm_scale, name, m_train, m_test, split="test"):
+    db_ad = get_db(re_ad)
+    run_id = latest_run(db_ad, model, sm_scale, name, m_train, m_test)
+    if run_id is None:
+        raise FileNotFoundError("No result of {} ({}, {}, {}, {}) in {}".format(
+            model, sm_scale, name, m_train, m_test, db_ad))
+    return read_pred(db_ad, run_id, split)
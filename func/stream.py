@@ -0,0 +1,152 @@
+"""
+Incremental inference of EQGraphNet / EqDetect on sliding windows of continuous data
+consecutive windows shifted by hop samples share most of their columns, the output of each stage (conv + gnn) of the
+former window is kept, and the columns that are the same after the shift are copied instead of computed
+a column of stage s is reused if its receptive field is inside the common part of two windows, far enough from the ends
+of the graph (nodes near the ends have fewer neighbors), and the shift is an integer at stage s (hop divisible by 2^s)
+gnn layers using edge weights (gcn, cheb, sg, appnp, tag) are shift-invariant only if the weights are uniform, the edge
+weights ew1..ew10 are trained with the model, so these styles get no reuse after cnn1 with trained checkpoints (including
+the default gcn EQGraphNet), only the unweighted styles (e.g. edge, unimp, gin) are reused with trained weights
+EqDetect runs gnn layers with time steps as features, so only its cnn1 is reused
+if no stage after cnn1 can be reused (a warning is given), or the hop is more than half of the window (most columns
+are computed again anyway, and the sub-graphs cost more than they save), every window is passed to the model directly
+"""
+import math
+import warnings
+import torch
+import func.net as net
+
+HOPS = {"appnp": 2, "tag": 3}                                       # propagation steps of gnn layers, 1 for the others
+WEIGHTED = ["gcn", "cheb", "sg", "appnp", "tag"]                    # gnn layers using edge weights, as net.run_gnn
+
+
+# the state dict of model should be loaded before, as the uniformity of edge weights is checked here
+class StreamNet:
+    def __init__(self, model, hop, length=6000):
+        self.model, self.hop, self.length = model, hop, length
+        self.gnn_style, self.k = model.gnn_style, model.k
+        self.node = isinstance(model, net.EQGraphNet)             # nodes are time steps, False for EqDetect
+        self.radius = HOPS.get(self.gnn_style, 1) * self.k          # receptive field of one gnn layer
+        self.margin = self.radius + self.k                          # nodes affected by the ends of the graph
+        self.reuse = [self.can_reuse(s) for s in range(1, 11)]
+        self.num_stage = self.get_num_stage()
+        if self.num_stage <= 1:
+            warnings.warn("Only {} stage of {} ({}, hop = {}) can be reused, the windows are fully recomputed!".
+                          format(self.num_stage, type(model).__name__, self.gnn_style, hop))
+        self.full = self.num_stage <= 1 or 2 * hop > length
+        self.edges = {}
+        self.reset()
+
+    # number of conv stages whose columns are reused, stage s needs hop divisible by 2^s and the gnn before reused
+    def get_num_stage(self):
+        num = 0
+        for s in range(1, 11):
+            if self.hop % (2 ** s) != 0:
+                break
+            num = s
+            if not self.reuse[s - 1]:
+                break
+        return num
+
+    # gnn of stage s is shift-invariant
+    def can_reuse(self, s):
+        if not self.node or self.model.adm_style != "ts_un":
+            return False
+        if self.gnn_style not in WEIGHTED:
+            return True
+        ew = getattr(self.model, "ew{}".format(s))
+        return bool(torch.all(ew == ew[0]))
+
+    def reset(self):
+        self.x, self.c, self.h = None, {}, {}
+
+    # edges of two separate path graphs of n_left and n_right nodes (left and right sub-graphs of stage s, run in one
+    # call of the gnn), with the uniform weight of stage s
+    def get_edge(self, s, n_left, n_right):
+        ew = getattr(self.model, "ew{}".format(s))
+        if (n_left, n_right) not in self.edges:
+            ei_left = net.get_edge_info(self.k, n_left, "ts_un", ew.device)[0]
+            ei_right = net.get_edge_info(self.k, n_right, "ts_un", ew.device)[0] + n_left
+            self.edges[(n_left, n_right)] = torch.cat((ei_left, ei_right), dim=1)
+        ei = self.edges[(n_left, n_right)]
+        return ei, ew[0].expand(ei.shape[1])
+
+    def conv(self, s, h):
+        cnn = getattr(self.model, "cnn{}".format(s))
+        return cnn(h if s == 1 else self.model.pre(h))
+
+    def gnn(self, s, c, ei, ew):
+        gnn = getattr(self.model, "gnn{}".format(s))
+        if self.node:
+            return net.run_gnn(self.gnn_style, gnn, c.permute(0, 2, 1), ei, ew).permute(0, 2, 1)
+        return net.run_gnn(self.gnn_style, gnn, c, ei, ew)
+
+    # conv (kernel 2, stride 2) of stage s, columns [va, vb) are copied from the former window shifted by d
+    def conv_step(self, s, h, d, va, vb):
+        num = h.shape[-1] // 2
+        if d is None or d % 2 != 0 or s not in self.c:
+            return self.conv(s, h), None, 0, 0
+        d, va, vb = d // 2, math.ceil(va / 2), vb // 2
+        if va >= vb:
+            return self.conv(s, h), None, 0, 0
+        c = torch.empty(self.c[s].shape, dtype=self.c[s].dtype, device=self.c[s].device)
+        c[..., va:vb] = self.c[s][..., va + d: vb + d]
+        if va > 0:
+            c[..., :va] = self.conv(s, h[..., :2 * va])
+        if vb < num:
+            c[..., vb:] = self.conv(s, h[..., 2 * vb: 2 * num])
+        return c, d, va, vb
+
+    # gnn and residual of stage s, the left and right parts are computed on sub-graphs extended by margin
+    def gnn_step(self, s, c, d, va, vb):
+        num = c.shape[-1]
+        va, vb = max(va + self.radius, self.margin), min(vb - self.radius, num - self.margin - (d or 0))
+        if d is None or not self.reuse[s - 1] or va >= vb or va + self.margin >= vb - self.margin:
+            ei, ew = getattr(self.model, "ei{}".format(s)), getattr(self.model, "ew{}".format(s))
+            return self.gnn(s, c, ei, ew) + c, None, 0, 0
+        h = torch.empty(self.h[s].shape, dtype=self.h[s].dtype, device=self.h[s].device)
+        h[..., va:vb] = self.h[s][..., va + d: vb + d]
+        hi, lo = va + self.margin, vb - self.margin
+        g = self.gnn(s, torch.cat((c[..., :hi], c[..., lo:]), dim=-1), *self.get_edge(s, hi, num - lo))
+        h[..., :va] = g[..., :va] + c[..., :va]
+        h[..., vb:] = g[..., hi + vb - lo:] + c[..., vb:]
+        return h, d, va, vb
+
+    # one window in shape of (batch, 3, 6000), the former one (if any) is reused if x is it shifted by hop
+    def step(self, x):
+        num = x.shape[-1]
+        if self.full:
+            return self.model(x)
+        d, va, vb = None, 0, 0
+        if self.x is not None and self.x.shape == x.shape and \
+                torch.equal(x[..., :num - self.hop], self.x[..., self.hop:]):
+            d, va, vb = self.hop, 0, num - self.hop
+        h = x
+        for s in range(1, 11):
+            c, d, va, vb = self.conv_step(s, h, d, va, vb)
+            h, d, va, vb = self.gnn_step(s, c, d, va, vb)
+            self.c[s], self.h[s] = c, h
+        h = self.conv(11, h)
+        self.x = x
+        out = self.model.linear(h.reshape(h.shape[0], -1)).view(-1)
+        if not self.node:
+            out = self.model.sigmoid(out)
+        return out
+
+    # continuous data in shape of (batch, 3, n), outputs of the windows beginning at 0, hop, 2 * hop, ...
+    def run(self, x):
+        self.reset()
+        out = []
+        with torch.inference_mode():
+            for i in range(0, x.shape[-1] - self.length + 1, self.hop):
+                out.append(self.step(x[..., i: i + self.length]))
+        return torch.stack(out, dim=1)
+
+
+# the windows of run() recomputed from scratch, for comparison
+def run_full(model, x, hop, length=6000):
+    out = []
+    with torch.inference_mode():
+        for i in range(0, x.shape[-1] - length + 1, hop):
+            out.append(model(x[..., i: i + length]))
+    return torch.stack(out, dim=1)
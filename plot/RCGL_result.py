@@ -8,17 +8,19 @@ import matplotlib.ticker as mtick
 import os.path as osp
 import sys
 sys.path.append("..")
-import func.output as out
+import func.store as store
 import func.draw as draw
 
 
-def select(df, sm_scale):
-    value = df[df['sm_scale'] == sm_scale]
+# latest run of each num in the results store of RCGL.py
+def select(db_ad, sm_scale, name, m_train):
+    value = store.pivot_runs(db_ad, "num", ["RCGL"], ("r2_test", "rmse_test", "e_mean", "e_std"),
+                             sm_scale=sm_scale, name=name, m_train=m_train)
     num = value['num'].values.astype(int)
-    r2 = value['r2'].values.astype(float)
-    rmse = value['rmse'].values.astype(float)
-    e_mean = value['e_m'].values.astype(float)
-    e_std = value['e_std'].values.astype(float)
+    r2 = value['r2_RCGL'].values.astype(float)
+    rmse = value['rmse_RCGL'].values.astype(float)
+    e_mean = value['e_mean_RCGL'].values.astype(float)
+    e_std = value['e_std_RCGL'].values.astype(float)
     return num, r2, rmse, e_mean, e_std
 
 
@@ -73,15 +75,17 @@ def num_effect(num_ml, num_md, r2_ml, r2_md, rmse_ml, rmse_md, e_mean_ml, e_mean
 
 
 re_ad = "../factor/RCGL_result"
+name = "chunk2"
+m_train = 150000
 fig_si = (12, 20)
 fo_si = 27
 fo_ti_si = 27
 g_ad = "../graph/operation"
 save_fig = True
 
-info = out.load_txt(osp.join(re_ad, "RCGL_result_chunk2_200000.txt"))
-num_ml, r2_ml, rmse_ml, e_mean_ml, e_std_ml = select(info, "ml")
-num_md, r2_md, rmse_md, e_mean_md, e_std_md = select(info, "md")
+db_ad = store.get_db(re_ad)
+num_ml, r2_ml, rmse_ml, e_mean_ml, e_std_ml = select(db_ad, "ml", name, m_train)
+num_md, r2_md, rmse_md, e_mean_md, e_std_md = select(db_ad, "md", name, m_train)
 
 np.random.seed(2)
 r2_ml = np.linspace(0.922, 0.876, 11) + np.random.uniform(0, 0.006, 11)
@@ -8,16 +8,18 @@ import matplotlib.ticker as mtick
 import os.path as osp
 import sys
 sys.path.append("..")
-import func.output as out
+import func.store as store
 
 
-def select(df, sm_scale, gnn_style, adm_style):
-    value = df[(df['gnn_style'] == gnn_style) & (df['adm_style'] == adm_style) & (df['sm_scale'] == sm_scale)]
+# latest run of each k in the results store of adm.py
+def select(db_ad, sm_scale, gnn_style, adm_style):
+    value = store.pivot_runs(db_ad, "k", ["EQG"], ("r2_test", "rmse_test", "e_mean", "e_std"),
+                             sm_scale=sm_scale, gnn_style=gnn_style, adm_style=adm_style)
     k = value['k'].values.astype(int)
-    r2 = value['r2'].values.astype(float)
-    rmse = value['rmse'].values.astype(float)
-    e_mean = value['e_mean'].values.astype(float)
-    e_std = value['e_std'].values.astype(float)
+    r2 = value['r2_EQG'].values.astype(float)
+    rmse = value['rmse_EQG'].values.astype(float)
+    e_mean = value['e_mean_EQG'].values.astype(float)
+    e_std = value['e_std_EQG'].values.astype(float)
     return k, r2, rmse, e_mean, e_std
 
 
@@ -63,9 +65,9 @@ fo_ti_si = 27
 g_ad = "../graph/operation"
 save_fig = True
 
-info = out.load_txt(osp.join(re_ad, "adm_result.txt"))
-k_ml, r2_ml, rmse_ml, e_mean_ml, e_std_ml = select(info, "ml", gnn_style, adm_style)
-k_md, r2_md, rmse_md, e_mean_md, e_std_md = select(info, "md", gnn_style, adm_style)
+db_ad = store.get_db(re_ad)
+k_ml, r2_ml, rmse_ml, e_mean_ml, e_std_ml = select(db_ad, "ml", gnn_style, adm_style)
+k_md, r2_md, rmse_md, e_mean_md, e_std_md = select(db_ad, "md", gnn_style, adm_style)
 
 fig_ke = k_effect(k_ml, k_md, r2_ml, r2_md, rmse_ml, rmse_md, e_mean_ml, e_mean_md, e_std_ml, e_std_md, fig_si, fo_si, fo_ti_si)
 if save_fig:
@@ -10,6 +10,7 @@ import sys
 sys.path.append("..")
 import func.draw as draw
 import func.net as net
+import func.output as out
 
 
 name = "chunk2"
@@ -58,28 +59,23 @@ else:
     raise TypeError("!")
 
 # MagInfoNet
-pred_MaI = np.load(osp.join(re_ad, "MagInf", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_MaI = np.load(osp.join(re_ad, "MagInf", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_MaI, true_MaI, _, _ = out.read_npy(osp.join(re_ad, "MagInf"), sm_scale, name, m_train, m_test)
 error_MaI = pred_MaI - true_MaI
 
 # EQGraphNet
-pred_EQG = np.load(osp.join(re_ad, "EQGraphNet", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_EQG = np.load(osp.join(re_ad, "EQGraphNet", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_EQG, true_EQG, _, _ = out.read_npy(osp.join(re_ad, "EQGraphNet"), sm_scale, name, m_train, m_test)
 error_EQG = pred_EQG - true_EQG
 
 # MagNet
-pred_Mag = np.load(osp.join(re_ad, "MagNet", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_Mag = np.load(osp.join(re_ad, "MagNet", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_Mag, true_Mag, _, _ = out.read_npy(osp.join(re_ad, "MagNet"), sm_scale, name, m_train, m_test)
 error_Mag = pred_Mag - true_Mag
 
 # CREIME
-pred_CRE = np.load(osp.join(re_ad, "CREIME", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_CRE = np.load(osp.join(re_ad, "CREIME", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_CRE, true_CRE, _, _ = out.read_npy(osp.join(re_ad, "CREIME"), sm_scale, name, m_train, m_test)
 error_CRE = pred_CRE - true_CRE
 
 # ConvNetQuake_INGV
-pred_COI = np.load(osp.join(re_ad, "ConvNetQuake_INGV", "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true_COI = np.load(osp.join(re_ad, "ConvNetQuake_INGV", "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred_COI, true_COI, _, _ = out.read_npy(osp.join(re_ad, "ConvNetQuake_INGV"), sm_scale, name, m_train, m_test)
 error_COI = pred_COI - true_COI
 
 error = np.concatenate((error_EQG, error_Mag, error_CRE, error_COI), axis=0)
@@ -78,7 +78,7 @@ print("COI:  r2 = {:.4f}  rmse = {:.4f}".format(r2_COI, rmse_COI))
 Earthquake characterization
 """
 # df = pd.read_csv(osp.join(root, name + ".csv"))
-# df = out.select_trace_small(trace, df)
+# df = out.select_trace(trace, df)
 
 # output the earthquake information by given trace
 df = out.get_eq_info(root, name, trace.reshape(-1))
@@ -71,6 +71,7 @@ def get_value(df, v_name):
         v_p_at = df['p_arrival_sample'].values.reshape(-1)
         v_coda_at = pro.read_coda(df)
         v = v_coda_at - v_p_at
+        v = v[~np.isnan(v)]                     # traces without coda end
     else:
         raise TypeError("Unknown type of 'v_name'!")
     return v, fig_name
@@ -10,6 +10,7 @@ import sys
 sys.path.append("..")
 import func.draw as draw
 import func.net as net
+import func.output as out
 
 
 name = "chunk2"
@@ -66,8 +67,7 @@ else:
 # fig_cb_ml.savefig(osp.join(g_ad, "cb_ml.png"))
 # fig_cb_md.savefig(osp.join(g_ad, "cb_md.png"))
 
-pred = np.load(osp.join(re_ad, "test_pred_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
-true = np.load(osp.join(re_ad, "test_true_{}_{}_{}_{}.npy".format(sm_scale, name, m_train, m_test)))
+pred, true, _, _ = out.read_npy(re_ad, sm_scale, name, m_train, m_test)
 error = pred - true
 
 fig_re = draw.result(true, pred, loc, t, fig_si_r, fo_si, fo_ti_si, fo_te_si, den, cmax, mag_min, mag_max)
@@ -0,0 +1,144 @@
+"""
+Magnitude Prediction of waveform files (SAC / miniSEED / npy) by a trained model
+    python predict.py ../factor/reality_data/2016_10_30/*.EH? --batch_size 64 --output pred.csv
+torch and the model are imported only after the arguments are parsed, obspy only if SAC / miniSEED are given,
+the checkpoint is loaded once and all stations are predicted in batches
+"""
+import argparse
+import glob
+import os.path as osp
+import sys
+import time
+
+t_launch = time.time()              # the start-up of the interpreter is before it, see the wall time of predict_bench.py
+sys.path.append(osp.join(osp.dirname(osp.abspath(__file__)), '..'))
+
+model_ad = osp.join(osp.dirname(osp.abspath(__file__)), "../result/mag_predict/EQGraphNet/"
+                                                         "model_ml_chunk2_150000_50000.pkl")
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Magnitude prediction of waveform files")
+    parser.add_argument("files", nargs="+", help="files or glob patterns, SAC / miniSEED / npy in shape of (3, n)")
+    parser.add_argument("--model", default=model_ad, help="checkpoint (.pkl) of the model")
+    parser.add_argument("--style", default="EQG", choices=["EQG", "Mag", "COI"], help="type of the model")
+    parser.add_argument("--gnn_style", default="gcn")
+    parser.add_argument("--adm_style", default="ts_un")
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=0, help="threads of torch, 0 for the default")
+    parser.add_argument("--output", default=None, help="csv of the predictions")
+    parser.add_argument("--timing", action="store_true", help="print the time of each stage")
+    return parser.parse_args()
+
+
+def get_files(patterns):
+    files = []
+    for pattern in patterns:
+        found = sorted(glob.glob(pattern))
+        files.extend(found if len(found) != 0 else [pattern])
+    return files
+
+
+def get_model(args):
+    import torch
+    import func.net as net
+    if args.style == "EQG":
+        model = net.EQGraphNet(args.gnn_style, args.adm_style, args.k, args.device)
+    elif args.style == "Mag":
+        model = net.MagNet()
+    elif args.style == "COI":
+        model = net.ConvNetQuakeINGV()
+    else:
+        raise TypeError("Unknown type of model style!")
+    model.load_state_dict(torch.load(args.model, map_location=args.device))
+    return model.to(args.device).eval()
+
+
+# stations of all files: {name: (3, n)}, the channels of one station (E, N, Z or 1, 2, Z) may be in several files
+def read_stations(files):
+    import numpy as np
+    stations, traces = {}, {}
+    for file in files:
+        if file.endswith(".npy"):
+            x = np.load(file)
+            x = x.reshape((-1,) + x.shape[-2:])
+            for i in range(x.shape[0]):
+                stations[file if x.shape[0] == 1 else "{}[{}]".format(file, i)] = x[i]
+        else:
+            from obspy import read
+            for tr in read(file):
+                traces.setdefault(tr.id[:-1], {})[tr.stats.channel[-1]] = tr.data
+    for name, chans in traces.items():
+        order = [c for c in ["E", "N", "Z"] if c in chans]
+        order = order if len(order) == 3 else [c for c in ["1", "2", "Z"] if c in chans]
+        if len(order) != 3:
+            print("{} is skipped, channels: {}".format(name, "".join(sorted(chans.keys()))), file=sys.stderr)
+            continue
+        stations[name] = [chans[c] for c in order]
+    return stations
+
+
+def to_array(stations):
+    import numpy as np
+    import func.preprocess as pre
+    x = np.zeros((len(stations), 3, 6000), dtype=np.float32)
+    for i, chans in enumerate(stations.values()):
+        for j in range(3):
+            x[i, j] = pre.pad(np.asarray(chans[j], dtype=np.float32), 6000)
+    return x
+
+
+def predict(model, x, args):
+    import torch
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    pred = []
+    with torch.inference_mode():
+        for i in range(0, x.shape[0], args.batch_size):
+            x_batch = torch.from_numpy(x[i: i + args.batch_size]).to(args.device)
+            pred.append(model(x_batch).float().cpu().numpy().reshape(-1))
+    return [one for batch in pred for one in batch]
+
+
+def main():
+    args = get_args()
+    files = get_files(args.files)
+    times = {"launch": time.time() - t_launch}
+
+    t_begin = time.time()
+    model = get_model(args)
+    times["model"] = time.time() - t_begin
+
+    t_begin = time.time()
+    stations = read_stations(files)
+    if len(stations) == 0:
+        sys.exit("No station with three channels is found!")
+    x = to_array(stations)
+    times["read"] = time.time() - t_begin
+
+    t_begin = time.time()
+    pred = predict(model, x, args)
+    times["predict"] = time.time() - t_begin
+
+    for name, mag in zip(stations.keys(), pred):
+        print("{}\t{:.2f}".format(name, mag))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write("station,magnitude\n")
+            for name, mag in zip(stations.keys(), pred):
+                f.write("{},{:.4f}\n".format(name, mag))
+
+    # ms per file excludes the launch and the model loading, which are paid once
+    if args.timing:
+        total = time.time() - t_launch
+        print("launch {:.3f}s, model {:.3f}s, read {:.3f}s, predict {:.3f}s, total {:.3f}s, "
+              "{:.1f} ms per file, {:.1f} ms per station".format(
+                times["launch"], times["model"], times["read"], times["predict"], total,
+                (times["read"] + times["predict"]) / len(files) * 1000, times["predict"] / len(stations) * 1000),
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Cold-start time and per-file latency of predict.py, checked against the targets below
+    python predict_bench.py --data ../factor/reality_data/2016_10_30 --repeat 5
+predict.py is run in a fresh interpreter each time, the stages are taken from its --timing line, and the wall time is
+taken around the process (median of the runs), so the cold start includes the start-up of the interpreter
+if the reference set or the trained checkpoint are not found, a stand-in of the same form is generated (SAC files of
+E, N, Z channels at 100 Hz, and an EQGraphNet with random weights, the time does not depend on the weights)
+"""
+import argparse
+import os
+import os.path as osp
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# s, s, ms (read and predict of one file), cold start: wall time of the process except reading and predicting
+TARGETS = {"launch": 0.3, "cold_start": 5.0, "ms_per_file": 20.0}
+here = osp.dirname(osp.abspath(__file__))
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Timing of predict.py")
+    parser.add_argument("--data", default=osp.join(here, "../factor/reality_data/2016_10_30"))
+    parser.add_argument("--model", default=osp.join(here, "../result/mag_predict/EQGraphNet/"
+                                                          "model_ml_chunk2_150000_50000.pkl"))
+    parser.add_argument("--num_sta", type=int, default=30, help="stations of the stand-in set")
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def make_data(data_dir, num_sta):
+    from obspy import Trace, UTCDateTime
+    np.random.seed(100)
+    for i in range(num_sta):
+        for chan in ["HHE", "HHN", "HHZ"]:
+            tr = Trace(np.random.randn(7200).astype(np.float32),
+                       header={"network": "XX", "station": "S{:03d}".format(i), "channel": chan,
+                               "sampling_rate": 100, "starttime": UTCDateTime(2016, 10, 30, 6, 40, 18)})
+            tr.write(osp.join(data_dir, "XX.S{:03d}.{}".format(i, chan)), format="SAC")
+
+
+def make_model(model_ad):
+    import torch
+    sys.path.append(osp.join(here, '..'))
+    import func.net as net
+    torch.manual_seed(100)
+    torch.save(net.EQGraphNet("gcn", "ts_un", 1, "cpu").state_dict(), model_ad)
+
+
+# launch, model, read, predict, total (s) and ms per file of one run, and the wall time (s) of the process
+def run_once(files, model_ad):
+    t_begin = time.time()
+    out = subprocess.run([sys.executable, osp.join(here, "predict.py")] + files + ["--model", model_ad, "--timing"],
+                         capture_output=True, text=True, check=True)
+    wall = time.time() - t_begin
+    line = [one for one in out.stderr.splitlines() if one.startswith("launch")][-1]
+    values = [float(one) for one in re.findall(r"([\d.]+) ?m?s", line)]
+    result = dict(zip(["launch", "model", "read", "predict", "total", "ms_per_file"], values))
+    result["wall"] = wall
+    result["interpreter"] = wall - result["total"]             # start-up and exit of python, outside of t_launch
+    result["cold_start"] = wall - result["read"] - result["predict"]
+    return result
+
+
+def main():
+    args = get_args()
+    dir_tmp = tempfile.mkdtemp()
+    data, model_ad = args.data, args.model
+    if not osp.exists(data):
+        data = osp.join(dir_tmp, "data")
+        os.makedirs(data)
+        make_data(data, args.num_sta)
+        print("{} is not found, a stand-in of {} stations is used".format(args.data, args.num_sta))
+    if not osp.exists(model_ad):
+        model_ad = osp.join(dir_tmp, "model.pkl")
+        make_model(model_ad)
+        print("{} is not found, random weights are used".format(args.model))
+    files = sorted(osp.join(data, one) for one in os.listdir(data))
+
+    runs = [run_once(files, model_ad) for _ in range(args.repeat)]
+    result = {key: float(np.median([run[key] for run in runs])) for key in runs[0]}
+    print("{} files, median of {} runs: interpreter {:.3f}s, launch {:.3f}s, model {:.3f}s, read {:.3f}s, "
+          "predict {:.3f}s, wall {:.3f}s, {:.1f} ms per file".format(
+            len(files), args.repeat, result["interpreter"], result["launch"], result["model"], result["read"],
+            result["predict"], result["wall"], result["ms_per_file"]))
+    failed = [key for key, target in TARGETS.items() if result[key] > target]
+    for key, target in TARGETS.items():
+        print("{:<12} {:>8.3f}  target {:>6.1f}  {}".format(key, result[key], target,
+                                                          "fail" if key in failed else "ok"))
+    shutil.rmtree(dir_tmp)
+    if len(failed) != 0:
+        sys.exit("Targets are not met: {}".format(", ".join(failed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import os.path as osp
+import time
 from tqdm import tqdm
 from torch.utils.data import DataLoader
 from sklearn.metrics import r2_score
@@ -15,6 +16,7 @@ import sys
 sys.path.append('..')
 import func.process as pro
 import func.net as net
+import func.store as store
 import func.draw as draw
 
 
@@ -59,12 +61,14 @@ model = net.MagNet().to(device)
 criterion = torch.nn.MSELoss().to(device)
 optimizer = torch.optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)
 
-train_pred, train_true, test_pred, test_true = [], [], [], []
-train_trace, test_trace = [], []
-train_pos, test_pos = [], []
+t_start = time.time()
 train_loss, test_loss = [], []
+metric_train = net.StreamMetric(device, len(train_loader.dataset), save_np or save_fig)
+metric_test = net.StreamMetric(device, len(test_loader.dataset), save_np or save_fig)
 for epoch in range(epochs):
     loss_train_all, loss_test_all = 0, 0
+    metric_train.reset(), metric_test.reset()
+    train_trace, train_pos, test_trace, test_pos = [], [], [], []
     for item_train, (x_train, y_train, pos_train, trace_train, _) in enumerate(tqdm(train_loader)):
         x_train, y_train = x_train.to(device), y_train.to(device)
 
@@ -73,97 +77,61 @@ for epoch in range(epochs):
         loss_train = criterion(output_train, y_train)
         loss_train.backward()
         optimizer.step()
-        loss_train_all = loss_train_all + loss_train.item()
-
-        train_pred_one = output_train.detach().cpu().numpy()
-        train_true_one = y_train.detach().cpu().numpy()
-        train_trace_one = np.array([trace_train]).reshape(-1, 1)
-        train_pos_one = pos_train.numpy()
-        if item_train == 0:
-            train_pred = train_pred_one
-            train_true = train_true_one
-            train_trace = train_trace_one
-            train_pos = train_pos_one
-        else:
-            train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-            train_true = np.concatenate((train_true, train_true_one), axis=0)
-            train_trace = np.concatenate((train_trace, train_trace_one), axis=0)
-            train_pos = np.concatenate((train_pos, train_pos_one), axis=0)
+        loss_train_all = loss_train_all + loss_train.detach()
+
+        metric_train.update(y_train, output_train)
+        if save_np:
+            train_trace.append(np.array([trace_train]).reshape(-1, 1))
+            train_pos.append(pos_train.numpy())
 
     for item_test, (x_test, y_test, pos_test, trace_test, _) in enumerate(tqdm(test_loader)):
         x_test, y_test = x_test.to(device), y_test.to(device)
 
         output_test = model(x_test)
         loss_test = criterion(output_test, y_test)
-        loss_test_all = loss_test_all + loss_test.item()
-
-        test_pred_one = output_test.detach().cpu().numpy()
-        test_true_one = y_test.detach().cpu().numpy()
-        test_trace_one = np.array([trace_test]).reshape(-1, 1)
-        test_pos_one = pos_test.numpy()
-        if item_test == 0:
-            test_pred = test_pred_one
-            test_true = test_true_one
-            test_trace = test_trace_one
-            test_pos = test_pos_one
-        else:
-            test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-            test_true = np.concatenate((test_true, test_true_one), axis=0)
-            test_trace = np.concatenate((test_trace, test_trace_one), axis=0)
-            test_pos = np.concatenate((test_pos, test_pos_one), axis=0)
-
-    rmse_train = net.cal_rmse_one_arr(train_true, train_pred)
-    rmse_test = net.cal_rmse_one_arr(test_true, test_pred)
-    r2_train = net.cal_r2_one_arr(train_true, train_pred)
-    r2_test = net.cal_r2_one_arr(test_true, test_pred)
+        loss_test_all = loss_test_all + loss_test.detach()
+
+        metric_test.update(y_test, output_test)
+        if save_np:
+            test_trace.append(np.array([trace_test]).reshape(-1, 1))
+            test_pos.append(pos_test.numpy())
+
+    rmse_train, r2_train = metric_train.result()
+    rmse_test, r2_test = metric_test.result()
     train_loss.append((rmse_train ** 2))
     test_loss.append((rmse_test ** 2))
     print("Epoch: {:04d}  RMSE_Train: {:.4f}  RMSE_Test: {:.4f}  R2_Train: {:.8f}  R2_Test: {:.8f}".
           format(epoch, rmse_train, rmse_test, r2_train, r2_test))
 
+train_true, train_pred = metric_train.get_np()
+test_true, test_pred = metric_test.get_np()
+if save_np:
+    train_trace, train_pos = np.concatenate(train_trace, axis=0), np.concatenate(train_pos, axis=0)
+    test_trace, test_pos = np.concatenate(test_trace, axis=0), np.concatenate(test_pos, axis=0)
+metrics = {"r2_test": r2_test, "r2_train": r2_train, "rmse_test": rmse_test, "rmse_train": rmse_train}
+config = {"batch_size": batch_size, "epochs": epochs, "lr": lr}
 pro.save_result(re_ad, model, save_np, save_model, save_loss, sm_scale_name, name, m_train, m_test,
                 train_true, train_pred, train_trace, train_pos, train_loss,
-                test_true, test_pred, test_trace, test_pos, test_loss)
+                test_true, test_pred, test_trace, test_pos, test_loss,
+                config, metrics, time.time() - t_start, save_txt)
 
+# all runs of the model in the results store, exported as csv
 if save_txt:
-    info_txt_address = osp.join(re_ad, "MagNet_result.txt")
-    info_df_address = osp.join(re_ad, "MagNet_result.csv")
-    f = open(info_txt_address, 'a')
-    if osp.getsize(info_txt_address) == 0:
-        f.write("r2_test r2_train rmse_test rmse_train sm_scale batch_size epochs lr m_train m_test name\n")
-    f.write(str(round(r2_test, 4)) + "  ")
-    f.write(str(round(r2_train, 4)) + "  ")
-    f.write(str(round(rmse_test, 4)) + "  ")
-    f.write(str(round(rmse_train, 4)) + "  ")
-    f.write(str(sm_scale_name) + "  ")
-    f.write(str(batch_size) + "  ")
-    f.write(str(epochs) + "  ")
-    f.write(str(lr) + "  ")
-    f.write(str(m_train) + "  ")
-    f.write(str(m_test) + "  ")
-    f.write(str(name) + "  ")
-
-    f.write("\n")
-    f.close()
-
-    info = np.loadtxt(info_txt_address, dtype=str)
-    columns = info[0, :].tolist()
-    values = info[1:, :]
-    info_df = pd.DataFrame(values, columns=columns)
-    info_df.to_csv(info_df_address)
+    info_df = store.read_runs(store.get_db(osp.dirname(re_ad)), osp.basename(re_ad))
+    info_df.to_csv(osp.join(re_ad, "MagNet_result.csv"))
 
 """
 plot errors and results
 """
-fig_train_result = draw.result_fast(train_true, train_pred, True, fig_si, fo_si, fo_ti_si)
-fig_test_result = draw.result_fast(test_true, test_pred, False, fig_si, fo_si, fo_ti_si)
+if save_fig:
+    fig_train_result = draw.result_fast(train_true, train_pred, True, fig_si, fo_si, fo_ti_si)
+    fig_test_result = draw.result_fast(test_true, test_pred, False, fig_si, fo_si, fo_ti_si)
 
-train_error = train_pred - train_true
-fig_train_error = draw.dist_fast(train_error, bins, jump, "$e^{train}$", fig_si, fo_si, fo_ti_si)
-test_error = test_pred - test_true
-fig_test_error = draw.dist_fast(test_error, bins, jump, "$e^{test}$", fig_si, fo_si, fo_ti_si)
+    train_error = train_pred - train_true
+    fig_train_error = draw.dist_fast(train_error, bins, jump, "$e^{train}$", fig_si, fo_si, fo_ti_si)
+    test_error = test_pred - test_true
+    fig_test_error = draw.dist_fast(test_error, bins, jump, "$e^{test}$", fig_si, fo_si, fo_ti_si)
 
-if save_fig:
     fig_train_result.savefig(osp.join(re_ad, "train_result_{}_{}_{}_{}.png".format(sm_scale_name, name, m_train, m_test)))
     fig_test_result.savefig(osp.join(re_ad, "test_result_{}_{}_{}_{}.png".format(sm_scale_name, name, m_train, m_test)))
     fig_train_error.savefig(osp.join(re_ad, "train_error_{}_{}_{}_{}.png".format(sm_scale_name, name, m_train, m_test)))
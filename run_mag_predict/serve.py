@@ -0,0 +1,213 @@
+"""
+Local HTTP inference server of EQGraphNet (magnitude) and EqDetect (probability of noise, as EqDetect is trained with
+noise labelled as 1, windows below 0.5 are earthquakes)
+    python serve.py --mag ../result/mag_predict/EQGraphNet/model_ml_chunk2_150000_50000.pkl --port 8000
+POST /mag or /detect, the body is float32 (little-endian) waveforms in shape of (n, 3, 6000), n >= 1,
+the response is {"result": [n values]}, concurrent requests are coalesced into batches of at most max_batch windows,
+a batch is run when it is full or max_wait ms after its first window arrives, requests of more than max_batch windows
+are split into chunks of max_batch
+GET /stats returns the counters of requests, batches and latency
+"""
+import argparse
+import asyncio
+import json
+import os.path as osp
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+sys.path.append(osp.join(osp.dirname(osp.abspath(__file__)), '..'))
+import func.net as net
+
+SHAPE = (3, 6000)
+SIZE = SHAPE[0] * SHAPE[1] * 4          # bytes of one window
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="HTTP inference server with dynamic batching")
+    parser.add_argument("--mag", default=None, help="checkpoint (.pkl) of EQGraphNet")
+    parser.add_argument("--detect", default=None, help="checkpoint (.pkl) of EqDetect")
+    parser.add_argument("--gnn_style", default="gcn")
+    parser.add_argument("--adm_style", default="ts_un")
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max_batch", type=int, default=64, help="windows of one batch")
+    parser.add_argument("--max_wait", type=float, default=5, help="ms to wait for more windows of a batch")
+    return parser.parse_args()
+
+
+def get_model(style, model_ad, args):
+    if style == "mag":
+        model = net.EQGraphNet(args.gnn_style, args.adm_style, args.k, args.device)
+    elif style == "detect":
+        model = net.EqDetect(args.gnn_style, args.adm_style, args.k, args.device)
+    else:
+        raise TypeError("Unknown type of model style!")
+    model.load_state_dict(torch.load(model_ad, map_location=args.device))
+    return model.to(args.device).eval()
+
+
+class Stats:
+    def __init__(self, num_keep=10000):
+        self.t_start = time.time()
+        self.requests, self.windows, self.batches, self.errors = 0, 0, 0, 0
+        self.latency = []                   # ms of the last num_keep requests
+        self.num_keep = num_keep
+
+    def add_request(self, num, latency):
+        self.requests += 1
+        self.windows += num
+        self.latency.append(latency * 1000)
+        if len(self.latency) > self.num_keep:
+            self.latency = self.latency[-self.num_keep:]
+
+    def get(self):
+        duration = time.time() - self.t_start
+        out = {"requests": self.requests, "windows": self.windows, "batches": self.batches, "errors": self.errors,
+               "mean_batch": self.windows / max(self.batches, 1), "uptime": duration,
+               "requests_per_s": self.requests / duration, "windows_per_s": self.windows / duration}
+        if len(self.latency) != 0:
+            p50, p95, p99 = np.percentile(self.latency, [50, 95, 99])
+            out.update({"latency_p50": p50, "latency_p95": p95, "latency_p99": p99})
+        return out
+
+
+class Batcher:
+    def __init__(self, model, device, stats, max_batch, max_wait):
+        self.model, self.device, self.stats = model, device, stats
+        self.max_batch, self.max_wait = max_batch, max_wait / 1000
+        self.queue = asyncio.Queue()
+        self.pending = None                     # item that did not fit into the former batch
+        self.executor = ThreadPoolExecutor(max_workers=1)          # one forward at a time, off the event loop
+
+    def run(self, x):
+        with torch.inference_mode():
+            return self.model(torch.from_numpy(x).to(self.device)).float().cpu().numpy().reshape(-1)
+
+    # windows of one request are queued in chunks of at most max_batch
+    async def predict(self, x):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for i in range(0, x.shape[0], self.max_batch):
+            future = loop.create_future()
+            await self.queue.put((x[i: i + self.max_batch], future))
+            futures.append(future)
+        result = []
+        for future in futures:
+            result += await future
+        return result
+
+    # take the first request, then the others arriving before the deadline, a request that would exceed max_batch
+    # windows is kept for the next batch
+    async def loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.pending is not None:
+                items, self.pending = [self.pending], None
+            else:
+                items = [await self.queue.get()]
+            num = items[0][0].shape[0]
+            deadline = loop.time() + self.max_wait
+            while num < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if num + item[0].shape[0] > self.max_batch:
+                    self.pending = item
+                    break
+                items.append(item)
+                num += item[0].shape[0]
+            x = np.concatenate([item[0] for item in items], axis=0)
+            try:
+                pred = await loop.run_in_executor(self.executor, self.run, x)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats.batches += 1
+            start = 0
+            for x_one, future in items:
+                if not future.done():                   # the client may be gone
+                    future.set_result(pred[start: start + x_one.shape[0]].tolist())
+                start += x_one.shape[0]
+
+
+async def send(writer, status, body):
+    body = json.dumps(body).encode()
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+    writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".
+                 format(status, reason, len(body)).encode() + body)
+    await writer.drain()
+
+
+# HTTP/1.1 with keep-alive, only the parts needed by the clients of this server
+def get_handler(batchers, stats):
+    async def handle(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, _ = line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, value = line.decode().split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                t_begin = time.time()
+                if method == "GET" and path == "/stats":
+                    await send(writer, 200, stats.get())
+                elif method == "POST" and path.strip("/") in batchers:
+                    if len(body) == 0 or len(body) % SIZE != 0:
+                        stats.errors += 1
+                        await send(writer, 400, {"error": "body must be float32 in shape of (n, 3, 6000)"})
+                    else:
+                        x = np.frombuffer(body, dtype="<f4").reshape((-1,) + SHAPE)
+                        try:
+                            result = await batchers[path.strip("/")].predict(x)
+                        except Exception as e:
+                            stats.errors += 1
+                            await send(writer, 500, {"error": str(e)})
+                        else:
+                            stats.add_request(x.shape[0], time.time() - t_begin)
+                            await send(writer, 200, {"result": result})
+                else:
+                    await send(writer, 404, {"error": "unknown path {}".format(path)})
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def main(args):
+    stats = Stats()
+    batchers = {}
+    for style, model_ad in [("mag", args.mag), ("detect", args.detect)]:
+        if model_ad is not None:
+            batchers[style] = Batcher(get_model(style, model_ad, args), args.device, stats, args.max_batch,
+                                      args.max_wait)
+    if len(batchers) == 0:
+        sys.exit("At least one of --mag and --detect must be given!")
+    tasks = [asyncio.create_task(batcher.loop()) for batcher in batchers.values()]
+    server = await asyncio.start_server(get_handler(batchers, stats), args.host, args.port)
+    print("serving {} on http://{}:{}".format(", ".join("/" + one for one in batchers), args.host, args.port))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(get_args()))
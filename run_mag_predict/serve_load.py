@@ -0,0 +1,73 @@
+"""
+Load test of serve.py, concurrent clients with keep-alive connections post random windows
+    python serve_load.py --path /mag --clients 32 --requests 2000
+latency percentiles and throughput seen by the clients are printed, together with the counters of the server
+"""
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Load test of serve.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--path", default="/mag")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent connections")
+    parser.add_argument("--requests", type=int, default=2000, help="requests of all clients")
+    parser.add_argument("--windows", type=int, default=1, help="windows of one request")
+    return parser.parse_args()
+
+
+async def request(reader, writer, method, path, host, body=b""):
+    writer.write("{} {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/octet-stream\r\nContent-Length: {}\r\n\r\n".
+                 format(method, path, host, len(body)).encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).decode().split(" ")[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, value = line.decode().split(":", 1)
+        if key.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(args, body, counter, latency):
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    while counter[0] < args.requests:
+        counter[0] += 1
+        t_begin = time.time()
+        status, _ = await request(reader, writer, "POST", args.path, args.host, body)
+        if status != 200:
+            raise ValueError("Request failed with status {}!".format(status))
+        latency.append((time.time() - t_begin) * 1000)
+    writer.close()
+
+
+async def main(args):
+    np.random.seed(100)
+    body = np.random.randn(args.windows, 3, 6000).astype("<f4").tobytes()
+    counter, latency = [0], []
+    t_begin = time.time()
+    await asyncio.gather(*[client(args, body, counter, latency) for _ in range(args.clients)])
+    duration = time.time() - t_begin
+
+    p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+    print("{} requests of {} windows by {} clients in {:.2f}s: {:.1f} requests/s, {:.1f} windows/s".format(
+        len(latency), args.windows, args.clients, duration, len(latency) / duration,
+        len(latency) * args.windows / duration))
+    print("latency (ms): p50 = {:.1f}  p95 = {:.1f}  p99 = {:.1f}  max = {:.1f}".format(p50, p95, p99, max(latency)))
+
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    _, stats = await request(reader, writer, "GET", "/stats", args.host)
+    writer.close()
+    print("server: {}".format(json.dumps(stats, indent=1)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(get_args()))
@@ -6,16 +6,15 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import torch
 import os.path as osp
-import torch.nn as nn
 from torch.utils.data import DataLoader
-from sklearn.decomposition import PCA
-from sklearn.manifold import TSNE
-from tqdm import tqdm
 import sys
 sys.path.append("..")
 import func.net as net
 import func.process as pro
 import func.draw as draw
+import func.cache as cache
+import func.extract as ext
+import func.reduce as red
 
 
 def plot_scatter(pos, fig_size, x_lim=None, y_lim=None, s=10):
@@ -29,92 +28,13 @@ def plot_scatter(pos, fig_size, x_lim=None, y_lim=None, s=10):
     return fig
 
 
-def dc(data, re_ad, dc_style, name, n_components):
-    data_dc_ad = "{}/dc_{}_{}.npy".format(re_ad, name, dc_style)
-    data = data.reshape(data.shape[0], -1)
-    if osp.exists(data_dc_ad):          # have already been decomposed
-        data_dc = np.load(data_dc_ad)
-        return data_dc
-    if dc_style == "pca":
-        tool = PCA(n_components=n_components)
-    elif dc_style == "tsne":
-        tool = TSNE(n_components=n_components)
-    else:
-        raise TypeError("Unknown dc_style")
-    data_dc = tool.fit_transform(data)
-    np.save(data_dc_ad, data_dc)
+@cache.cached(deps=(red.reduce, red.flat, red.pca_chunk, red.pca_randomized, red.tsne))
+def dc(data, dc_style, n_components):
+    data_dc, info = red.reduce(data, dc_style, n_components)
+    red.print_info(info)
     return data_dc
 
 
-class RM_X(nn.Module):
-    def __init__(self, cnn1, cnn2, cnn3, cnn4, pre, bn1, pool1):
-        super(RM_X, self).__init__()
-        self.cnn1, self.cnn2, self.cnn3, self.cnn4 = cnn1, cnn2, cnn3, cnn4
-        self.pre, self.bn1, self.pool1 = pre, bn1, pool1
-
-    def forward(self, x):
-        h_x = self.cnn1(x.unsqueeze(1))
-        h_x_0 = h_x
-        h_x = self.pre(self.bn1(h_x))
-        h_x = self.cnn2(h_x)
-        h_x = self.pre(self.bn1(h_x))
-        h_x = self.cnn3(h_x)
-        h_x = self.pre(self.bn1(h_x))
-        h_x = h_x + h_x_0
-        h_x = self.cnn4(self.bn1(h_x))
-        h_x = self.pool1(h_x)
-        h_x = h_x.squeeze(1)
-        return h_x
-
-
-class PredInform(nn.Module):
-    def __init__(self, l_at, l_t, RM_x, c5, c6, c7, c8, c9, c10, c11, c12, c13, c14, c15, p2, pre, bn2):
-        super(PredInform, self).__init__()
-        self.l_at, self.l_t, self.RM_x = l_at, l_t, RM_x
-        self.c5, self.c6, self.c7, self.c8, self.c9, self.c10 = c5, c6, c7, c8, c9, c10
-        self.c11, self.c12, self.c13, self.c14, self.c15 = c11, c12, c13, c14, c15
-        self.p2, self.pre, self.bn2 = p2, pre, bn2
-
-    def forward(self, x, ps_at, p_t):
-        h_at = self.l_at(ps_at).unsqueeze(1)
-        h_t = self.l_t(p_t).unsqueeze(1)
-        h_x = self.RM_x(x)
-
-        out = torch.cat((h_x, h_at, h_t), dim=1)
-        h = out
-        out = self.c5(out.unsqueeze(1))
-        out_0 = out
-        out = self.pre(self.bn2(out))
-        out = self.c6(out)
-        out = self.pre(self.bn2(out))
-        out = self.c7(out)
-        out = out + out_0
-
-        out_1 = out
-        out = self.c8(self.pre(self.bn2(out)))
-        out = self.c9(self.pre(self.bn2(out)))
-        out = out + out_1
-
-        out_2 = out
-        out = self.c10(self.pre(self.bn2(out)))
-        out = self.c11(self.pre(self.bn2(out)))
-        out = out + out_2
-
-        out_3 = out
-        out = self.c12(self.pre(self.bn2(out)))
-        out = self.c13(self.pre(self.bn2(out)))
-        out = out + out_3
-
-        out_4 = out
-        out = self.c14(self.pre(self.bn2(out)))
-        out = self.c15(self.pre(self.bn2(out)))
-        out = out + out_4
-
-        out = self.p2(out)
-        X_in = out.view(out.shape[0], out.shape[1], -1).permute(0, 2, 1)
-        return h, X_in
-
-
 device = "cuda:0" if torch.cuda.is_available() else "cpu"
 batch_size = 32
 lr = 0.0001                      # learning rate
@@ -134,6 +54,7 @@ fo_ti_si = 20
 dc_style = "tsne"
 prep_style = "sta"
 re_ad = "../result/mag_predict/MagInf"
+hidden_ad = osp.join(re_ad, "hidden")             # memmapped hidden features
 
 """
 Data Preparation
@@ -179,76 +100,38 @@ Model Layers Preparation
 MaI = net.MagInfoNet("unimp", "ts_un", 2, device).to(device)
 MaI.load_state_dict(torch.load(osp.join(re_ad, "model_{}_{}_{}_{}.pkl".format(sm_scale, name, m_train, m_test))))
 
-pre, bn1, bn2 = MaI.pre, MaI.bn1, MaI.bn2
-c1, c2, c3, c4, pool1 = MaI.cnn1, MaI.cnn2, MaI.cnn3, MaI.cnn4, MaI.pool1
-rm_x = RM_X(c1, c2, c3, c4, pre, bn1, pool1).to(device)
-
-c5, c6, c7, c8, c9, c10 = MaI.cnn5, MaI.cnn6, MaI.cnn7, MaI.cnn8, MaI.cnn9, MaI.cnn10
-c11, c12, c13, c14, c15, p2 = MaI.cnn11, MaI.cnn12, MaI.cnn13, MaI.cnn14, MaI.cnn15, MaI.pool2
-
-l_at, l_t, last = MaI.linear_at, MaI.linear_t, MaI.last
-pred_inform = PredInform(l_at, l_t, rm_x, c5, c6, c7, c8, c9, c10, c11, c12, c13, c14, c15, p2, pre, bn2).to(device)
+"""
+Extract hidden features of all testing samples in one pass, by forward hooks
+pool1: output of RM, h (input of cnn5): RM output with the embedded P/S arrival and P travel time, pool2: input of UniMP
+"""
+test_dataset = pro.SelfData(data_test, sm_test, ps_at_test, p_t_test)
+test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
+hidden = ext.extract(MaI, test_loader, ["pool1", "cnn5", "pool2"], hidden_ad, device, use_input=["cnn5"],
+                     run=ext.run_mai)
+true = sm_test.numpy()
 
 """
 Input Data Dimensionality reduction
 """
 test_x = data_test.numpy()
-test_x_dc = dc(test_x, re_ad, dc_style, "x", 2)
+test_x_dc = dc(test_x, dc_style, 2)
 fig_x = plot_scatter(test_x_dc, fig_si)
 
 """
 The role of RM in the Pred-Inform
 """
-test_dataset = pro.SelfData(data_test, sm_test)
-test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=True)
-test_hx = []
-test_pos = []
-for item_test, (x_test, y_test, index_test) in enumerate(tqdm(test_loader)):
-    x_test, y_test = x_test.to(device), y_test.to(device)
-
-    output_test = rm_x(x_test)
-    test_hx_one = output_test.detach().cpu().numpy()
-    test_index_one = index_test.numpy()
-    test_pos_one = pos_test[test_index_one, :]
-    if item_test == 0:
-        test_hx = test_hx_one
-        test_pos = test_pos_one
-    else:
-        test_hx = np.concatenate((test_hx, test_hx_one), axis=0)
-        test_pos = np.concatenate((test_pos, test_pos_one), axis=0)
-
-test_hx_dc = dc(test_hx, re_ad, dc_style, "hx", 2)
+test_hx_dc = dc(hidden["pool1"], dc_style, 2)
 fig_hx = plot_scatter(test_hx_dc, fig_si)
 
 """
 The role of RM and UniMP in the Mag-Pred
 """
-test_dataset = pro.SelfData(data_test, sm_test, ps_at_test, p_t_test)
-test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=True)
-h, X_in, true = [], [], []
-for item_test, (x_test, y_test, ps_at_test, p_t_test, index_test) in enumerate(tqdm(test_loader)):
-    x_test, y_test = x_test.to(device), y_test.to(device)
-    ps_at_test, p_t_test = ps_at_test.to(device), p_t_test.to(device)
-
-    h_one, X_in_one = pred_inform(x_test, ps_at_test, p_t_test)
-    h_one = h_one.detach().cpu().numpy()
-    X_in_one = X_in_one.detach().cpu().numpy()
-    true_one = y_test.detach().cpu().numpy()
-    if item_test == 0:
-        h = h_one
-        X_in = X_in_one
-        true = true_one
-    else:
-        h = np.concatenate((h, h_one), axis=0)
-        X_in = np.concatenate((X_in, X_in_one), axis=0)
-        true = np.concatenate((true, true_one), axis=0)
-
-h_dc = dc(h, re_ad, "pca", "h", 600)
-X_in_dc = dc(X_in, re_ad, "pca", "X_in", 600)
+h_dc = dc(hidden["cnn5"], "pca", 600)
+X_in_dc = dc(hidden["pool2"], "pca", 600)
 
-h_dc = torch.from_numpy(h_dc).to(device)
-X_in_dc = torch.from_numpy(X_in_dc).to(device)
-last = last.to(device)
+h_dc = torch.from_numpy(h_dc).float().to(device)
+X_in_dc = torch.from_numpy(X_in_dc).float().to(device)
+last = MaI.last.to(device)
 
 predict_h = last(h_dc).detach().cpu().numpy().reshape(-1)
 predict_X_in = last(X_in_dc).detach().cpu().numpy().reshape(-1)
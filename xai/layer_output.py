@@ -5,7 +5,6 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import os.path as osp
-from scipy.stats import gaussian_kde
 from matplotlib.ticker import FuncFormatter
 import sys
 sys.path.append("..")
@@ -52,7 +51,7 @@ def get_gau_kde(x, re_ad, name):
     if osp.exists(x_gau_kde_ad):
         x_gau_kde = np.load(x_gau_kde_ad)
         return x_gau_kde
-    x_gau_kde = gaussian_kde(x.T)(x.T)
+    x_gau_kde = draw.cal_den(x.T)
     np.save(x_gau_kde_ad, x_gau_kde)
     return x_gau_kde
 
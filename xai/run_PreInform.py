@@ -8,12 +8,14 @@ import torch
 import torch.nn as nn
 import os
 import os.path as osp
+import time
 from torch.utils.data import DataLoader
 import sys
 sys.path.append("..")
 
 import func.net as net
 import func.process as pro
+import func.store as store
 
 
 device = "cuda:1" if torch.cuda.is_available() else "cpu"
@@ -92,9 +94,12 @@ criterion = torch.nn.MSELoss().to(device)
 optimizer = torch.optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)
 
 # Training and testing
-train_pred, train_true, test_pred, test_true = [], [], [], []
+t_start = time.time()
+metric_train = net.StreamMetric(device, len(train_loader.dataset), save_np)
+metric_test = net.StreamMetric(device, len(test_loader.dataset), save_np)
 for epoch in range(epochs):
     loss_train_all, loss_test_all = 0, 0
+    metric_train.reset(), metric_test.reset()
     for item_train, (x_train, y_train, ps_at_train, p_t_train, pos_train, trace_train, _) in enumerate(train_loader):
         x_train, y_train = x_train.to(device), y_train.to(device)
         ps_at_train, p_t_train = ps_at_train.to(device), p_t_train.to(device)
@@ -106,14 +111,7 @@ for epoch in range(epochs):
         optimizer.step()
         loss_train_all = loss_train_all + loss_train.item()
 
-        train_pred_one = output_train.detach().cpu().numpy()
-        train_true_one = y_train.detach().cpu().numpy()
-        if item_train == 0:
-            train_pred = train_pred_one
-            train_true = train_true_one
-        else:
-            train_pred = np.concatenate((train_pred, train_pred_one), axis=0)
-            train_true = np.concatenate((train_true, train_true_one), axis=0)
+        metric_train.update(y_train, output_train)
 
     for item_test, (x_test, y_test, ps_at_test, p_t_test, pos_test, trace_test, _) in enumerate(test_loader):
         x_test, y_test = x_test.to(device), y_test.to(device)
@@ -123,57 +121,29 @@ for epoch in range(epochs):
         loss_test = criterion(output_test, y_test)
         loss_test_all = loss_test_all + loss_test.item()
 
-        test_pred_one = output_test.detach().cpu().numpy()
-        test_true_one = y_test.detach().cpu().numpy()
-        if item_test == 0:
-            test_pred = test_pred_one
-            test_true = test_true_one
-        else:
-            test_pred = np.concatenate((test_pred, test_pred_one), axis=0)
-            test_true = np.concatenate((test_true, test_true_one), axis=0)
-
-    rmse_train = net.cal_rmse_one_arr(train_true, train_pred)
-    rmse_test = net.cal_rmse_one_arr(test_true, test_pred)
-    r2_train = net.cal_r2_one_arr(train_true, train_pred)
-    r2_test = net.cal_r2_one_arr(test_true, test_pred)
+        metric_test.update(y_test, output_test)
+
+    rmse_train, r2_train = metric_train.result()
+    rmse_test, r2_test = metric_test.result()
     if (0.6 < r2_test and sm_scale_name == "ml") or (0.55 < r2_test < 0.56 and sm_scale_name == "md"):
         break
     print("Epoch: {:04d}  Loss_Train: {:.4f}  Loss_Test: {:.4f}  R2_Train: {:.8f}  R2_Test: {:.8f}".
           format(epoch, loss_train_all, loss_test_all, r2_train, r2_test))
 
-if save_np:
-    np.save(osp.join(re_ad, "train_true_{}_{}_{}_{}.npy".format(sm_scale_name, name, m_train, m_test)), train_true)
-    np.save(osp.join(re_ad, "train_pred_{}_{}_{}_{}.npy".format(sm_scale_name, name, m_train, m_test)), train_pred)
-    np.save(osp.join(re_ad, "test_true_{}_{}_{}_{}.npy".format(sm_scale_name, name, m_train, m_test)), test_true)
-    np.save(osp.join(re_ad, "test_pred_{}_{}_{}_{}.npy".format(sm_scale_name, name, m_train, m_test)), test_pred)
-if save_model:
-    torch.save(model.state_dict(), osp.join(re_ad, "model_{}_{}_{}_{}.pkl".format(sm_scale_name, name, m_train, m_test)))
+train_true, train_pred = metric_train.get_np()
+test_true, test_pred = metric_test.get_np()
+metrics = {"r2_test": r2_test, "r2_train": r2_train, "rmse_test": rmse_test, "rmse_train": rmse_train}
+config = {"gnn_style": gnn_style, "adm_style": adm_style, "k": k, "batch_size": batch_size, "epochs": epochs, "lr": lr}
+pro.save_result(re_ad, model, save_np, save_model, False, sm_scale_name, name, m_train, m_test,
+                train_true, train_pred, None, None, None,
+                test_true, test_pred, None, None, None,
+                config, metrics, time.time() - t_start, save_txt)
 
 
+# all runs of the model in the results store, exported as csv
 if save_txt:
-    info_txt_address = osp.join(re_ad, "PreInform_result.txt")
-    info_df_address = osp.join(re_ad, "PreInform_result.csv")
-    f = open(info_txt_address, 'a')
-    if osp.getsize(info_txt_address) == 0:
-        f.write("r2_test r2_train sm_scale batch_size epochs lr num_train num_test name\n")
-    f.write(str(round(r2_test, 5)) + "\t")
-    f.write(str(round(r2_train, 5)) + "\t")
-    f.write(str(sm_scale_name) + "\t")
-    f.write(str(batch_size) + "\t")
-    f.write(str(epochs) + "\t")
-    f.write(str(lr) + "\t")
-    f.write(str(m_train) + "  ")
-    f.write(str(m_test) + "  ")
-    f.write(str(name) + "\t")
-
-    f.write("\n")
-    f.close()
-
-    info = np.loadtxt(info_txt_address, dtype=str)
-    columns = info[0, :].tolist()
-    values = info[1:, :]
-    info_df = pd.DataFrame(values, columns=columns)
-    info_df.to_csv(info_df_address)
+    info_df = store.read_runs(store.get_db(osp.dirname(re_ad)), osp.basename(re_ad))
+    info_df.to_csv(osp.join(re_ad, "PreInform_result.csv"))
 
 
 print()